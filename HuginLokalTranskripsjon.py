@@ -1,17 +1,30 @@
+import hashlib
 import os
 import sys
 import time
-import base64
 import logging
 import re
+import signal
+import threading
 import warnings
 import dotenv
-from docx import Document
 
 # Ignorer advarsler
 warnings.filterwarnings("ignore")
 
 from lib import hugintranskriptlib as htl
+from lib import metrikker
+from lib.blob_lib import hent_blob_lager
+from lib.hendelseko import EVENT_QUEUE, hent_hendelseko
+from lib.jobbregister import (
+    ACKNOWLEDGED, DOWNLOADED, NEW, PUBLISHED, SUMMARIZED, TRANSCRIBED, UPLOADED,
+    er_ferdig_med, formater_statistikk, hent_jobbregister
+)
+from lib.pipeline import Pipeline, Steg
+from lib.planlegger import PLANLEGGING, POLICIES, estimer_varighet, sorter_jobber
+from lib.transkripsjon_sp_lib import hent_graph_klient
+from lib.transkripsjonscache import hent_transkripsjonscache
+from lib.varselsamler import Varselsamler
 
 # Sørg for at logs-mappen eksisterer
 os.makedirs("./logs", exist_ok=True)
@@ -47,6 +60,10 @@ def validate_environment():
     if missing_vars:
         logger.error(f"Mangler påkrevde miljøvariabler: {', '.join(missing_vars)}")
         sys.exit(1)
+
+    if PLANLEGGING not in POLICIES:
+        logger.error(f"Ukjent HUGIN_SCHEDULE_POLICY '{PLANLEGGING}' (bruk {', '.join(POLICIES)})")
+        sys.exit(1)
     
     logger.info("Alle påkrevde miljøvariabler validert")
 
@@ -65,6 +82,14 @@ def sanitize_filename(filename):
     
     return sanitized
 
+def lokalt_navn(blob_name, etag, safe_filename):
+    """
+    Unikt navn for jobbens lokale filer: filnavnet uten filtype pluss en kort hash av blob-navn og ETag,
+    så opptak med samme navn (møte.mp3 og møte.m4a, samme fil i to mapper, ny opplasting) ikke deler filer
+    """
+    hash_ = hashlib.sha1(f"{blob_name}\0{etag}".encode("utf-8")).hexdigest()[:10]
+    return f"{safe_filename.rsplit('.', 1)[0]}_{hash_}"
+
 def get_file_extension(filename):
     """Henter filtype med sikker grensesjekking"""
     if not filename or '.' not in filename:
@@ -78,272 +103,733 @@ def get_file_extension(filename):
 
 # Last miljøvariabler
 dotenv.load_dotenv()
-validate_environment()
-
 
-# Hent validerte miljøvariabler
+# Hent miljøvariabler (valideres i main())
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
 
-try:
-    logger.info("=" * 80)
-    logger.info("🚀 STARTER HUGIN TRANSKRIPSJONSTJENESTE")
-    logger.info(f"Tjeneste startet på: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info("=" * 80)
-    
-    # Sørg for at påkrevde mapper eksisterer
-    os.makedirs("./blobber", exist_ok=True)
-    os.makedirs("./ferdig_tekst", exist_ok=True)
-    os.makedirs("./oppsummeringer", exist_ok=True)
-    logger.info("✅ Påkrevde mapper opprettet/verifisert (blobber, ferdig_tekst, oppsummeringer)")
-    
-    # Hent blob-liste
+# Hvor ofte daemon-modus sjekker Azure Storage for nye filer (sekunder)
+POLL_INTERVAL = int(os.getenv("HUGIN_POLL_INTERVAL", "60"))
+
+# Med hendelseskø (HUGIN_EVENT_QUEUE): hvor ofte hele containeren likevel listes, så filer
+# uten hendelse (tapt hendelse, opplastet før abonnementet, feilet tidligere) blir plukket opp
+RECONCILE_INTERVAL = int(os.getenv("HUGIN_RECONCILE_INTERVAL", "3600"))
+
+
+# Antall samtidige arbeidere per steg og maks antall ventende filer mellom stegene
+PIPELINE_WORKERS = {
+    "nedlasting": int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "2")),
+    "konvertering": int(os.getenv("PIPELINE_CONVERT_WORKERS", "2")),
+    "transkripsjon": 1,  # MLX kjører på hovedtråden
+    "oppsummering": int(os.getenv("PIPELINE_SUMMARY_WORKERS", "1")),
+    "publisering": int(os.getenv("PIPELINE_PUBLISH_WORKERS", "2")),
+}
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+# Maks antall dekodede opptak i minnet samtidig (ca. 230 MB per time lyd). Konverteringen venter
+# på ledig plass, så køen foran transkripsjonen ikke fylles med flere fullengdes opptak.
+PIPELINE_DECODED_AUDIO = int(os.getenv("PIPELINE_DECODED_AUDIO", "1"))
+_lyd_plasser = threading.BoundedSemaphore(max(1, PIPELINE_DECODED_AUDIO))
+
+# Maks antall filer denne noden tar i én runde (0 = ingen grense). Resten blir liggende til
+# neste runde eller til andre noder som deler samme container.
+MAX_JOBS_PER_RUN = int(os.getenv("HUGIN_MAX_JOBS_PER_RUN", "0"))
+
+# Maks antall forsøk per opptak før det blir liggende urørt for manuell oppfølging
+MAX_ATTEMPTS = int(os.getenv("HUGIN_MAX_ATTEMPTS", "5"))
+
+
+def hopp_over(jobb):
+    """Markerer at et steg allerede var fullført i en tidligere kjøring, så tiden ikke registreres"""
+    jobb["steg_hoppet_over"] = True
+    return jobb
+
+
+def steg_last_ned(jobb):
+    """Gjør krav på bloben og laster den ned (hoppes over hvis jobben gjenopptas etter nedlasting)"""
+    filename = jobb["blob_name"]
+    safe_filename = jobb["safe_filename"]
+
+    # Krav tas først når nedlastingssteget har kapasitet, så noden ikke holder på mer enn den rekker
+    blob_lager = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
+    if not blob_lager.claim(filename, jobb["etag"]):
+        logger.info(f"⏭️  {safe_filename} behandles av en annen node - hopper over")
+        jobb["annen_node"] = True
+        return None
+
+    jobb["attempts"] = jobb.get("attempts", 0) + 1
+    hent_jobbregister().lagre(jobb)
+
+    if er_ferdig_med(jobb, DOWNLOADED):
+        logger.info(f"♻️  Gjenopptar {safe_filename} etter tilstand '{jobb['state']}' (forsøk {jobb['attempts']})")
+        return hopp_over(jobb)
+
+    logger.info(f"📥 [{jobb['nr']}/{jobb['antall']}] Laster ned fil: {safe_filename}")
+
+    # Metadata kommer fra blob-listingen
+    if 'upn' in jobb["metadata"]:
+        logger.info(f"👤 Bruker: {jobb['metadata']['upn']}")
+
+    # Last ned blob. Bloben blir liggende i Azure Storage til jobben er kvittert.
+    download_path = f"./blobber/{jobb['base_name']}.{jobb['file_extension']}"
+    logger.info(f"⬇️  Laster ned til: {download_path}")
+    start_time = time.time()
+    htl.download_blob(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, filename, download_path,
+                      size=jobb["size"], etag=jobb["etag"])
+    metrikker.NEDLASTING_SEKUNDER.observer(time.time() - start_time)
+    metrikker.NEDLASTET_BYTES.inc(jobb["size"] or 0)
+    logger.info(f"✅ Nedlasting fullført: {safe_filename}")
+    jobb["local_file_path"] = download_path
+
+    hent_jobbregister().lagre(jobb, DOWNLOADED)
+    return jobb
+
+
+def slipp_lyd(jobb):
+    """Slipper jobbens dekodede lyd og gir plassen videre til neste opptak som skal dekodes"""
+    jobb.pop("_lyd", None)
+    if jobb.pop("_lyd_plass", False):
+        _lyd_plasser.release()
+
+
+def steg_konverter(jobb):
+    """Dekoder lyden (også fra video) til 16 kHz mono i minnet, klar for transkripsjon"""
+    if er_ferdig_med(jobb, TRANSCRIBED):
+        return hopp_over(jobb)
+
+    safe_filename = jobb["safe_filename"]
+    file_extension = jobb["file_extension"]
+    local_file_path = jobb["local_file_path"]
+
+    logger.info(f"📄 Filtype: {file_extension}")
+
+    # Sjekk om filen eksisterer lokalt
+    if not os.path.exists(local_file_path):
+        logger.error(f"❌ Nedlastet fil ikke funnet: {local_file_path}")
+        return None
+
+    file_size = os.path.getsize(local_file_path)
+    logger.info(f"📊 Filstørrelse: {file_size/1024/1024:.1f} MB")
+
+    # ffmpeg strømmer samplene rett inn i minnet; ingen mellomliggende WAV-fil
+    _lyd_plasser.acquire()
+    jobb["_lyd_plass"] = True
+    logger.info(f"🎬 Dekoder lyd fra {safe_filename}...")
+    start_time = time.time()
+    jobb["_lyd"] = htl.last_lyd(local_file_path, varighet=htl.lydvarighet(local_file_path))
+    metrikker.FFMPEG_SEKUNDER.observer(time.time() - start_time)
+    jobb["audio_duration"] = len(jobb["_lyd"]) / htl.SAMPLE_RATE
+    logger.info(f"⏱️  Lydlengde: {jobb['audio_duration']/60:.1f} minutter")
+
+    # Samme lyd transkribert med samme modell før (f.eks. lastet opp på nytt)? Da går jobben rett til publisering.
+    jobb["cache_nokkel"] = htl.cache_nokkel(jobb["_lyd"])
+    treff = hent_transkripsjonscache().hent(jobb["cache_nokkel"])
+    if treff:
+        bruk_cache(jobb, treff)
+    return jobb
+
+
+def bruk_cache(jobb, treff):
+    """Gjenoppretter transkripsjon og eventuelt sammendrag fra cachen i stedet for å lage dem på nytt"""
+    base_name = jobb["base_name"]
+    slipp_lyd(jobb)
+
+    txt_file_path = f"./ferdig_tekst/{base_name}.txt"
+    with open(txt_file_path, "w", encoding="utf-8") as f:
+        f.write(f"{treff['text']}\n" if treff["text"] else "")
+    jobb["txt_file_path"] = txt_file_path
+    hent_jobbregister().lagre(jobb, TRANSCRIBED)
+    logger.info(f"🗄️  Transkripsjon hentet fra cache: {jobb['safe_filename']}")
+
+    if treff.get("summary") and treff.get("summary_model") == htl.SUMMARY_MODEL:
+        jobb["summary_files"] = htl.lagre_sammendrag(base_name, treff["summary"])
+        hent_jobbregister().lagre(jobb, SUMMARIZED)
+        logger.info(f"🗄️  AI-sammendrag hentet fra cache: {jobb['safe_filename']}")
+
+
+def steg_transkriber(jobb):
+    """Transkriberer lydfilen til tekst"""
+    if er_ferdig_med(jobb, TRANSCRIBED):
+        return hopp_over(jobb)
+
+    safe_filename = jobb["safe_filename"]
+    base_name = jobb["base_name"]
+
+    # Transkriber. Lyden slippes når transkripsjonen er ferdig, og først da kan neste opptak dekodes.
+    logger.info(f"🎤 Starter transkripsjon: {safe_filename}")
+    start_time = time.time()
+    lyd = jobb.pop("_lyd", None)
+    try:
+        result = htl.transkriber("./blobber/", os.path.basename(jobb["local_file_path"]), lyd=lyd,
+                                 utnavn=base_name)
+    finally:
+        del lyd
+        slipp_lyd(jobb)
+    duration = time.time() - start_time
+    logger.info(f"✅ Transkripsjon fullført på {duration:.1f} sekunder")
+    metrikker.ASR_SEKUNDER.observer(duration)
+    if jobb.get("audio_duration"):
+        metrikker.ASR_RTF.observer(duration / jobb["audio_duration"])
+        metrikker.LYD_SEKUNDER.inc(jobb["audio_duration"])
+
+    # Konverter SRT til tekst kun hvis SRT-fil eksisterer
+    srt_file_path = f"./ferdig_tekst/{base_name}.srt"
+    if os.path.exists(srt_file_path):
+        logger.info(f"📝 Genererer ren tekst fra SRT-fil...")
+        htl.srt_til_tekst(f"{base_name}.srt")
+        logger.info(f"✅ Ren tekst generert: {base_name}.txt")
+        jobb["srt_file_path"] = srt_file_path
+
+    txt_file_path = f"./ferdig_tekst/{base_name}.txt"
+    if not os.path.exists(txt_file_path):
+        logger.error(f"Transkribert tekstfil ikke funnet: {txt_file_path}")
+        return None
+    jobb["txt_file_path"] = txt_file_path
+
+    if jobb.get("cache_nokkel"):
+        hent_transkripsjonscache().lagre_transkripsjon(jobb["cache_nokkel"], result)
+
+    hent_jobbregister().lagre(jobb, TRANSCRIBED)
+    return jobb
+
+
+def steg_oppsummer(jobb):
+    """Genererer AI-sammendrag med Ollama"""
+    if er_ferdig_med(jobb, SUMMARIZED):
+        return hopp_over(jobb)
+
+    logger.info(f"🤖 Starter AI-sammendrag generering: {jobb['safe_filename']}")
+    ai_summary_start = time.time()
+    summary_stats = {}
+    summary_files = htl.create_ai_summary(jobb["base_name"], stats=summary_stats)
+    ai_summary_duration = time.time() - ai_summary_start
+    if summary_stats.get("requests"):
+        jobb["summary_stats"] = summary_stats
+        metrikker.OLLAMA_TOKENS.inc(summary_stats.get("prompt_tokens", 0), type="prompt")
+        metrikker.OLLAMA_TOKENS.inc(summary_stats.get("eval_tokens", 0), type="eval")
+        if summary_stats.get("tokens_per_second"):
+            metrikker.OLLAMA_TOKENS_PER_SEKUND.observer(summary_stats["tokens_per_second"])
+
+    if summary_files:
+        logger.info(f"✅ AI-sammendrag generert på {ai_summary_duration:.1f} sekunder")
+        metrikker.OPPSUMMERING_SEKUNDER.observer(ai_summary_duration)
+        logger.info(f"📄 AI-sammendrag filer: {list(summary_files.keys())}")
+        if jobb.get("cache_nokkel"):
+            with open(summary_files["txt"], "r", encoding="utf-8") as f:
+                hent_transkripsjonscache().lagre_sammendrag(jobb["cache_nokkel"], f.read(), htl.SUMMARY_MODEL)
+    else:
+        logger.warning(f"⚠️  AI-sammendrag ikke generert (Ollama ikke tilgjengelig eller feil)")
+
+    jobb["summary_files"] = summary_files
+
+    hent_jobbregister().lagre(jobb, SUMMARIZED)
+    return jobb
+
+
+def steg_publiser(jobb):
+    """Laster opp til SharePoint og deler filene med brukeren. Varselet sendes samlet per bruker."""
+    if er_ferdig_med(jobb, UPLOADED):
+        # Allerede varslet i en tidligere kjøring? Da gjenstår bare kvitteringen.
+        mottaker = None if er_ferdig_med(jobb, PUBLISHED) else jobb["metadata"].get("upn")
+        varsler.legg_til(mottaker, jobb)
+        return hopp_over(jobb)
+
+    safe_filename = jobb["safe_filename"]
+    summary_files = jobb["summary_files"]
+
+    logger.info("📤 Laster opp til SharePoint...")
+    if 'upn' in jobb["metadata"]:
+        recipient = jobb["metadata"]["upn"]
+        logger.info(f"📧 Deles med: {recipient}")
+
+        # DOCX bygges i minnet og lastes opp direkte, uten filkopier på disk
+        transcribed_files = {
+            'docx': lag_docx(jobb["txt_file_path"])
+        }
+        if summary_files.get('txt'):
+            summary_files = {'docx': lag_docx(summary_files['txt'], avsnitt=True)}
+
+        # Last opp og del (inkludert AI-sammendrag hvis tilgjengelig). Lenkene lagres, så en
+        # jobb som feiler ved varslingen ikke lastes opp på nytt.
+        lenker = htl.last_opp_og_del(recipient, transcribed_files, summary_files, safe_filename)
+
+        if not lenker:
+            # Jobben feiler og opptaket blir liggende, så publiseringen kan prøves på nytt
+            raise RuntimeError(f"Kunne ikke laste opp {safe_filename} for {recipient}")
+
+        jobb["lenker"] = lenker
+        summary_msg = " (med AI-sammendrag)" if lenker.get('sammendrag') else ""
+        logger.info(f"✅ Lastet opp og delt med {recipient}{summary_msg}")
+    else:
+        logger.warning(f"⚠️  Ingen bruker (UPN) funnet i metadata for {safe_filename}")
+
+    hent_jobbregister().lagre(jobb, UPLOADED)
+    varsler.legg_til(jobb["metadata"].get("upn"), jobb)
+    return jobb
+
+
+def send_varsler(grupper):
+    """Sender én e-post per bruker med lenkene til alle brukerens ferdige opptak"""
+    return htl.send_samlede_varsler({upn: [jobb["lenker"] for jobb in jobber] for upn, jobber in grupper.items()})
+
+
+def fullfor_varsel(jobb, ok, feil):
+    """Kvitterer jobben når varselet er sendt, eller slipper den så varslingen prøves på nytt"""
+    if not ok:
+        frigi_jobb(jobb, "varsling", feil)
+        return
     try:
-        logger.info("🔍 Sjekker Azure Blob Storage for nye filer...")
-        filnavn = htl.list_blobs(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
-        logger.info(f"📁 Fant {len(filnavn)} filer å behandle")
-        if filnavn:
-            logger.info(f"📋 Filer funnet: {', '.join(filnavn)}")
+        if not er_ferdig_med(jobb, PUBLISHED):
+            hent_jobbregister().lagre(jobb, PUBLISHED)
+        steg_kvitter(jobb)
     except Exception as e:
-        logger.error(f"❌ Kunne ikke liste filer fra Azure Storage: {e}")
+        # Varselet er sendt (PUBLISHED), så neste forsøk kvitterer bare
+        frigi_jobb(jobb, "kvittering", e)
         raise
-    
-    if not filnavn:
-        logger.info("ℹ️  Ingen filer funnet for behandling - avslutter")
-        logger.info("=" * 80)
-        sys.exit(0)
-    
-    metadata = []
+    metrikker.FULLFORTE.inc()
 
-    # Nedlastingsfase - med individuell feilhåndtering
-    logger.info("⬇️  STARTER NEDLASTINGSFASE")
-    logger.info("-" * 50)
-    
-    for i, filename in enumerate(filnavn, 1):
+
+def lag_docx(txt_file_path, avsnitt=False):
+    """Leser en tekstfil og bygger DOCX-innholdet i minnet"""
+    with open(txt_file_path, "r", encoding="utf-8") as f:
+        return htl.lag_docx(f.read(), avsnitt=avsnitt)
+
+
+def steg_kvitter(jobb):
+    """Sletter opptaket fra Azure Storage og rydder opp lokale filer når resultatet er levert"""
+    safe_filename = jobb["safe_filename"]
+
+    htl.delete_blob(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, jobb["blob_name"])
+    logger.info(f"🗑️  Slettet fra Azure Storage: {safe_filename}")
+    hent_jobbregister().lagre(jobb, ACKNOWLEDGED)
+
+    rydd_opp(jobb)
+
+    logger.info(f"✅ FIL FULLFØRT: {safe_filename}")
+    return jobb
+
+
+def rydd_opp(jobb):
+    """Fjerner lokale filer som hører til jobben"""
+    logger.info("🧹 Starter opprydding av midlertidige filer...")
+    cleanup_files = [
+        jobb.get("local_file_path"),
+        jobb.get("txt_file_path"),
+        jobb.get("srt_file_path"),
+    ]
+
+    # Legg til AI-sammendrag filer for opprydding hvis de eksisterer
+    summary_files = jobb.get("summary_files") or {}
+    cleanup_files.append(summary_files.get('txt'))
+
+    cleaned_count = 0
+    for file_path in cleanup_files:
         try:
-            # Rens filnavn
-            safe_filename = sanitize_filename(filename)
-            logger.info(f"📥 [{i}/{len(filnavn)}] Behandler fil: {safe_filename}")
-            
-            # Hent metadata
-            logger.info(f"📋 Henter metadata for {safe_filename}")
-            file_metadata = htl.get_blob_metadata(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, filename)
-            metadata.append(file_metadata)
-            
-            if 'upn' in file_metadata:
-                logger.info(f"👤 Bruker: {file_metadata['upn']}")
-            
-            # Last ned blob
-            download_path = f"./blobber/{safe_filename}"
-            logger.info(f"⬇️  Laster ned til: {download_path}")
-            htl.download_blob(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, filename, download_path)
-            logger.info(f"✅ Nedlasting fullført: {safe_filename}")
-            
-            # Slett fra blob-lagring
-            htl.delete_blob(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, filename)
-            logger.info(f"🗑️  Slettet fra Azure Storage: {safe_filename}")
-            
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+                cleaned_count += 1
+                logger.debug(f"🗑️  Fjernet: {file_path}")
         except Exception as e:
+            logger.error(f"❌ Kunne ikke fjerne fil {file_path}: {e}")
+
+    logger.info(f"🧹 Opprydding fullført - fjernet {cleaned_count} filer")
+
+
+def frigi_jobb(jobb, steg_navn, feil):
+    """Slipper kravet på bloben når en jobb feiler, så den kan plukkes opp igjen senere"""
+    slipp_lyd(jobb)
+    if jobb.get("annen_node"):
+        return
+    metrikker.STEG_FEIL.inc(steg=steg_navn)
+    hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME).release(jobb["blob_name"])
+    hent_jobbregister().registrer_feil(jobb, steg_navn, feil)
+
+    # Først når siste forsøk er brukt opp er feilen endelig; da får brukeren beskjed én gang
+    upn = jobb["metadata"].get("upn")
+    if upn and steg_navn in ("publisering", "varsling") and jobb.get("attempts", 0) >= MAX_ATTEMPTS:
+        logger.error(f"❌ {jobb['safe_filename']} kunne ikke leveres etter {jobb['attempts']} forsøk - varsler {upn}")
+        htl.send_feilvarsel(upn)
+
+
+def registrer_steg(jobb, steg_navn, start, varighet, ok):
+    """Lagrer veggtid per steg i jobbregisteret"""
+    if jobb.pop("steg_hoppet_over", False) or jobb.get("annen_node"):
+        return
+    metrikker.STEG_SEKUNDER.observer(varighet, steg=steg_navn)
+    hent_jobbregister().registrer_steg(jobb, steg_navn, start, varighet, ok)
+
+
+# Ferdige jobber venter her til brukerens varsel sendes; alt som gjenstår sendes når runden er ferdig
+varsler = Varselsamler(send_varsler, fullfor_varsel)
+
+
+def lag_pipeline():
+    """Setter sammen behandlingsstegene med konfigurert samtidighet"""
+    return Pipeline([
+        Steg("nedlasting", steg_last_ned, PIPELINE_WORKERS["nedlasting"]),
+        Steg("konvertering", steg_konverter, PIPELINE_WORKERS["konvertering"]),
+        Steg("transkripsjon", steg_transkriber, hovedtraad=True),
+        Steg("oppsummering", steg_oppsummer, PIPELINE_WORKERS["oppsummering"]),
+        Steg("publisering", steg_publiser, PIPELINE_WORKERS["publisering"]),
+    ], kostorrelse=PIPELINE_QUEUE_SIZE, ved_feil=frigi_jobb, etter_steg=registrer_steg)
+
+
+# Lokale filer som må finnes for å kunne gjenoppta en jobb etter hver tilstand
+GJENOPPTAK_KREVER = {
+    DOWNLOADED: lambda jobb: [jobb.get("local_file_path")],
+    TRANSCRIBED: lambda jobb: [jobb.get("txt_file_path")],
+    # Et registrert sammendrag lastes opp sammen med transkripsjonen, så også det må finnes
+    SUMMARIZED: lambda jobb: [jobb.get("txt_file_path")] + (
+        [jobb["summary_files"]["txt"]] if (jobb.get("summary_files") or {}).get("txt") else []),
+}
+
+# Tilstanden jobben faller tilbake til når filene for en tilstand mangler, så bare det tapte lages på nytt
+GJENOPPTAK_TILBAKE = {
+    SUMMARIZED: TRANSCRIBED,
+}
+
+
+def mangler_filer(jobb):
+    """True hvis en lokal fil jobben trenger for å fortsette fra sin tilstand ikke finnes"""
+    krever = GJENOPPTAK_KREVER.get(jobb.get("state"))
+    return bool(krever) and not all(sti and os.path.exists(sti) for sti in krever(jobb))
+
+
+def gjenoppta(jobb):
+    """
+    Henter lagret tilstand for en blob-versjon fra jobbregisteret.
+
+    Returns:
+        dict: Lagret jobb hvis den kan gjenopptas, ellers None (jobben starter på nytt)
+    """
+    lagret = hent_jobbregister().hent(jobb["blob_name"], jobb["etag"])
+    if not lagret:
+        return None
+
+    while mangler_filer(lagret) and lagret["state"] in GJENOPPTAK_TILBAKE:
+        tilbake = GJENOPPTAK_TILBAKE[lagret["state"]]
+        logger.warning(f"⚠️  Lokale filer for {jobb['safe_filename']} etter '{lagret['state']}' mangler "
+                       f"- gjenopptar etter '{tilbake}'")
+        lagret["state"] = tilbake
+        lagret.pop("summary_files", None)
+
+    if mangler_filer(lagret):
+        logger.warning(f"⚠️  Lokale filer for {jobb['safe_filename']} mangler - starter jobben på nytt")
+        # Behold antall forsøk, så en jobb som stadig feiler fortsatt stoppes av MAX_ATTEMPTS
+        jobb["attempts"] = lagret.get("attempts", 0)
+        return None
+
+    # Behold ferske verdier fra listingen
+    lagret.update({k: jobb[k] for k in ("nr", "antall", "created", "metadata", "size")})
+    return lagret
+
+
+def lag_jobber(blobs):
+    """Lager én jobb per blob, og hopper over filer med ugyldig navn eller uten filtype"""
+    jobber = []
+    for i, blob in enumerate(blobs, 1):
+        filename = blob["name"]
+        try:
+            safe_filename = sanitize_filename(filename)
+        except ValueError as e:
             logger.error(f"❌ Kunne ikke behandle fil {filename}: {e}")
             continue
 
-    # Behandlingsfase - med individuell feilhåndtering
-    logger.info("")
-    logger.info("🔄 STARTER BEHANDLINGSFASE")
-    logger.info("-" * 50)
-    
-    successful_files = []
-    for i, filename in enumerate(filnavn, 1):
+        file_extension = get_file_extension(safe_filename)
+        if not file_extension:
+            logger.warning(f"⚠️  Hopper over fil uten filtype: {safe_filename}")
+            continue
+
+        jobber.append({
+            "nr": i,
+            "antall": len(blobs),
+            "blob_name": filename,
+            "size": blob["size"],
+            "etag": blob["etag"],
+            "created": blob["created"].timestamp() if blob.get("created") else None,
+            "metadata": blob["metadata"],
+            "safe_filename": safe_filename,
+            "file_extension": file_extension,
+            "base_name": lokalt_navn(filename, blob["etag"], safe_filename),
+            "state": NEW,
+        })
+        jobber[-1] = gjenoppta(jobber[-1]) or jobber[-1]
+
+        if jobber[-1].get("attempts", 0) >= MAX_ATTEMPTS:
+            logger.error(f"❌ {safe_filename} har feilet {jobber[-1]['attempts']} ganger "
+                         f"(sist i steg '{jobber[-1].get('error_stage')}': {jobber[-1].get('error')}) - hopper over")
+            jobber.pop()
+
+    jobber = planlegg(jobber)
+
+    if MAX_JOBS_PER_RUN and len(jobber) > MAX_JOBS_PER_RUN:
+        logger.info(f"ℹ️  Tar {MAX_JOBS_PER_RUN} av {len(jobber)} filer i denne runden")
+        jobber = jobber[:MAX_JOBS_PER_RUN]
+    return jobber
+
+
+def planlegg(jobber):
+    """Estimerer lydlengden til hver jobb og sorterer jobbene etter HUGIN_SCHEDULE_POLICY"""
+    lydrater = hent_jobbregister().lydrater()
+    for jobb in jobber:
+        jobb["estimated_duration"] = estimer_varighet(jobb, lydrater, probe=htl.lydvarighet)
+
+    jobber = sorter_jobber(jobber)
+    for nr, jobb in enumerate(jobber, 1):
+        jobb["nr"] = nr
+    if len(jobber) > 1:
+        logger.info(f"🗂️  Rekkefølge ({PLANLEGGING}): " + ", ".join(
+            f"{jobb['safe_filename']} (~{jobb['estimated_duration']/60:.0f} min)" for jobb in jobber))
+    return jobber
+
+
+def kjor_runde(blob_navn=None):
+    """
+    Kjører én behandlingsrunde: lister blobs og sender alle filer gjennom pipelinen.
+
+    Args:
+        blob_navn: Bare disse blobene (fra hendelseskøen) i stedet for å liste containeren
+
+    Returns:
+        int: Antall filer funnet i denne runden
+    """
+    runde_start = time.time()
+    metrikker.RUNDER.inc()
+    try:
+        logger.info("=" * 80)
+        logger.info("🚀 STARTER HUGIN TRANSKRIPSJONSTJENESTE")
+        logger.info(f"Tjeneste startet på: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info("=" * 80)
+
+        # Sørg for at påkrevde mapper eksisterer
+        os.makedirs("./blobber", exist_ok=True)
+        os.makedirs("./ferdig_tekst", exist_ok=True)
+        os.makedirs("./oppsummeringer", exist_ok=True)
+        logger.info("✅ Påkrevde mapper opprettet/verifisert (blobber, ferdig_tekst, oppsummeringer)")
+
+        blob_lager = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
+        blob_lager.nullstill_teller()
+        graph = hent_graph_klient()
+        graph.nullstill_teller()
+        varsler.nullstill()
+
+        # Utløpte transkripsjoner slettes fra cachen uansett om det er nye filer
+        cache = hent_transkripsjonscache()
+        cache.nullstill_teller()
+        cache.rydd()
+
+        # Hent blob-liste med metadata i samme kall
         try:
-            safe_filename = sanitize_filename(filename)
-            file_extension = get_file_extension(safe_filename)
-            
-            logger.info(f"🔄 [{i}/{len(filnavn)}] Behandler fil: {safe_filename}")
-            
-            if not file_extension:
-                logger.warning(f"⚠️  Hopper over fil uten filtype: {safe_filename}")
-                continue
-            
-            logger.info(f"📄 Filtype: {file_extension}")
-            
-            # Sjekk om filen eksisterer lokalt
-            local_file_path = f"./blobber/{safe_filename}"
-            if not os.path.exists(local_file_path):
-                logger.error(f"❌ Nedlastet fil ikke funnet: {local_file_path}")
-                continue
-            
-            file_size = os.path.getsize(local_file_path)
-            logger.info(f"📊 Filstørrelse: {file_size/1024/1024:.1f} MB")
-            
-            # Konverter video til lyd hvis nødvendig
-            transcription_filename = safe_filename
-            if file_extension in ["mp4", "mov", "avi", "m4a"]:
-                logger.info(f"🎬 Media-fil oppdaget - konverterer til lyd...")
-                base_name = safe_filename.rsplit('.', 1)[0]
-                audio_path = f"./blobber/{base_name}.wav"
-                htl.konverter_til_lyd(local_file_path, audio_path)
-                transcription_filename = f"{base_name}.wav"
-                logger.info(f"✅ Media konvertert til lyd: {transcription_filename}")
-            
-            # Transkriber
-            logger.info(f"🎤 Starter transkripsjon med MLX...")
-            start_time = time.time()
-            htl.transkriber("./blobber/", transcription_filename)
-            end_time = time.time()
-            duration = end_time - start_time
-            logger.info(f"✅ Transkripsjon fullført på {duration:.1f} sekunder")
-
-            # Generer AI-sammendrag
-            logger.info(f"🤖 Starter AI-sammendrag generering...")
-            ai_summary_start = time.time()
-            base_name = safe_filename.rsplit('.', 1)[0]
-            summary_files = htl.create_ai_summary(base_name)
-            ai_summary_duration = time.time() - ai_summary_start
-
-            if summary_files:
-                logger.info(f"✅ AI-sammendrag generert på {ai_summary_duration:.1f} sekunder")
-                logger.info(f"📄 AI-sammendrag filer: {list(summary_files.keys())}")
+            if blob_navn is None:
+                logger.info("🔍 Sjekker Azure Blob Storage for nye filer...")
+                blobs = htl.list_blobs_with_metadata(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
             else:
-                logger.warning(f"⚠️  AI-sammendrag ikke generert (Ollama ikke tilgjengelig eller feil)")
-
-            # Konverter SRT til tekst kun hvis SRT-fil eksisterer
-            base_name = safe_filename.rsplit('.', 1)[0]
-            srt_file_path = f"./ferdig_tekst/{base_name}.srt"
-            if os.path.exists(srt_file_path):
-                logger.info(f"📝 Genererer ren tekst fra SRT-fil...")
-                htl.srt_til_tekst(f"{base_name}.srt")
-                logger.info(f"✅ Ren tekst generert: {base_name}.txt")
-            else:
-                logger.info(f"ℹ️  Hopper over SRT-til-tekst konvertering (ingen SRT-fil opprettet)")
-            
-            # Kod fil til base64
-            txt_file_path = f"./ferdig_tekst/{base_name}.txt"
-            if not os.path.exists(txt_file_path):
-                logger.error(f"Transkribert tekstfil ikke funnet: {txt_file_path}")
-                continue
-            
-            # Sjekk filstørrelse før base64-koding
-            try:
-                file_size = os.path.getsize(txt_file_path)
-                max_size = 20 * 1024 * 1024  # 20MB grense før base64-koding
-                
-                if file_size > max_size:
-                    logger.warning(f"Tekstfil for stor ({file_size/1024/1024:.1f}MB). Sender uten vedlegg for {safe_filename}")
-                    base64file = None
-                else:
-                    with open(txt_file_path, "rb") as file:
-                        base64file = base64.b64encode(file.read()).decode('utf-8')
-                        logger.info(f"Kodet {safe_filename} til base64 ({file_size/1024:.1f}KB)")
-            except Exception as e:
-                logger.error(f"Kunne ikke kode {safe_filename} til base64: {e}")
-                base64file = None
-            
-            # Opprett docx-fil fra transkripsjonen
-            transcribed_docx_path = f"./ferdig_tekst/{base_name}.docx"
-            
+                # Blober som allerede er behandlet og slettet er borte og hoppes over
+                logger.info(f"🔔 Henter {len(blob_navn)} filer fra hendelseskøen...")
+                blobs = [blob for blob in map(blob_lager.hent_blob, blob_navn) if blob]
+            filnavn = [blob["name"] for blob in blobs]
+            logger.info(f"📁 Fant {len(filnavn)} filer å behandle")
+            if filnavn:
+                logger.info(f"📋 Filer funnet: {', '.join(filnavn)}")
+        except Exception as e:
+            logger.error(f"❌ Kunne ikke liste filer fra Azure Storage: {e}")
+            raise
+
+        if not filnavn:
+            logger.info("ℹ️  Ingen filer funnet for behandling - avslutter")
+            logger.info("=" * 80)
+            registrer_runde(runde_start, [], [])
+            return 0
+
+        # Ollama laster modellen mens filene lastes ned og transkriberes, så første sammendrag slipper lastetiden
+        threading.Thread(target=htl.warm_up_model, args=(htl.SUMMARY_MODEL,), name="ollama-forvarming", daemon=True).start()
+
+        # Behandlingsfase - filene går gjennom stegene samtidig, med individuell feilhåndtering
+        logger.info("🔄 STARTER BEHANDLING (nedlasting → konvertering → transkripsjon → oppsummering → publisering → samlet varsling og kvittering)")
+        logger.info("-" * 50)
+
+        pipeline = lag_pipeline()
+        metrikker.KO_DYBDE.sett_funksjon(pipeline.kodybde)
+        _, feilede = pipeline.kjor(lag_jobber(blobs))
+
+        # Varsler som fortsatt venter sendes nå; først da er jobbene ferdige
+        ferdige, feilet_varsling = varsler.tom()
+        feilede += [(jobb, "varsling", feil) for jobb, feil in feilet_varsling]
+        successful_files = [jobb["safe_filename"] for jobb in ferdige]
+
+        # Filer som en annen node allerede har gjort krav på er ikke feil
+        andre_noder = {jobb["blob_name"] for jobb, _, _ in feilede if jobb.get("annen_node")}
+        feilede = [(jobb, steg_navn, feil) for jobb, steg_navn, feil in feilede if not jobb.get("annen_node")]
+
+        for jobb, steg_navn, feil in feilede:
+            logger.error(f"❌ FEIL ved behandling av {jobb['blob_name']} i steg '{steg_navn}': {feil or 'hoppet over'}")
+
+        # Avslutning og sammendrag
+        logger.info("")
+        logger.info("🏁 TRANSKRIPSJONSTJENESTE FULLFØRT")
+        logger.info("=" * 80)
+        logger.info(f"📊 SAMMENDRAG:")
+        logger.info(f"   • Totalt filer funnet: {len(filnavn)}")
+        logger.info(f"   • Filer behandlet vellykket: {len(successful_files)}")
+        logger.info(f"   • Filer behandlet av andre noder: {len(andre_noder)}")
+        logger.info(f"   • Filer med feil: {len(feilede)}")
+        logger.info(f"   • Varsler sendt: {varsler.antall_varsler}")
+
+        if successful_files:
+            logger.info(f"✅ Vellykkede filer: {', '.join(successful_files)}")
+
+        failed_files = [jobb["blob_name"] for jobb, _, _ in feilede]
+        if failed_files:
+            logger.info(f"❌ Feilede filer: {', '.join(failed_files)}")
+
+        for linje in pipeline.rapport():
+            logger.info(linje)
+        logger.info(f"☁️  Azure Storage-forespørsler: {blob_lager.rapport()}")
+        logger.info(f"📨 Graph-forespørsler: {graph.rapport()}")
+        struping = graph.http.rapport()
+        if struping:
+            logger.info("🚦 Graph nye forsøk og struping:")
+            for linje in struping:
+                logger.info(linje)
+        for linje in cache.rapport():
+            logger.info(linje)
+        for linje in formater_statistikk(hent_jobbregister().statistikk(siden=pipeline.start_tid)):
+            logger.info(linje)
+
+        registrer_runde(runde_start, successful_files, failed_files, andre_noder)
+        logger.info(f"⏰ Tjeneste avsluttet: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info("=" * 80)
+        return len(filnavn)
+
+    except Exception as e:
+        logger.error("💥 KRITISK FEIL I HUGIN TRANSKRIPSJONSTJENESTE")
+        logger.error("=" * 80)
+        logging.exception(f"Kritisk feil oppstod: {e}")
+        logger.error("=" * 80)
+        return 0
+
+
+def registrer_runde(runde_start, vellykkede, feilede, andre_noder=()):
+    """Oppdaterer metrikkene for siste runde, så et fall i gjennomstrømning kan varsles"""
+    metrikker.SISTE_RUNDE.sett(time.time())
+    metrikker.SISTE_RUNDE_SEKUNDER.sett(time.time() - runde_start)
+    metrikker.SISTE_RUNDE_FILER.sett(len(vellykkede), utfall="ok")
+    metrikker.SISTE_RUNDE_FILER.sett(len(feilede), utfall="feil")
+    metrikker.SISTE_RUNDE_FILER.sett(len(andre_noder), utfall="annen_node")
+
+
+def kjor_hendelser(ko, hendelser):
+    """
+    Kjører en runde for blobene i et sett hendelser og sletter meldingene som er ferdige.
+
+    En melding er ferdig når bloben er borte (behandlet og slettet) eller meldingen er mottatt
+    MAX_ATTEMPTS ganger. Ellers blir den synlig igjen etter HUGIN_QUEUE_VISIBILITY_SECONDS og
+    bloben prøves på nytt - også hvis noden krasjet midt i runden.
+
+    Returns:
+        int: Antall filer funnet i runden
+    """
+    metrikker.HENDELSER.inc(sum(len(meldinger) for meldinger in hendelser.values()))
+    antall = kjor_runde(list(hendelser))
+
+    blob_lager = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
+    for navn, meldinger in hendelser.items():
+        if max(m.dequeue_count for m in meldinger) >= MAX_ATTEMPTS or blob_lager.hent_blob(navn) is None:
+            ko.slett(meldinger)
+    logger.info(f"📬 Hendelseskø: {ko.rapport()}")
+    return antall
+
+
+def serve(poll_interval=POLL_INTERVAL):
+    """
+    Langtkjørende arbeidermodus.
+
+    Tunge biblioteker importeres og Whisper-modellen lastes én gang ved oppstart,
+    deretter sjekkes Azure Storage jevnlig og nye filer behandles med varm modell.
+    Med HUGIN_EVENT_QUEUE venter noden i stedet på BlobCreated-hendelser fra køen, og
+    lister hele containeren bare ved oppstart og hvert HUGIN_RECONCILE_INTERVAL. sekund.
+    Avsluttes ryddig på SIGTERM/SIGINT etter at pågående runde er ferdig.
+    """
+    stopp = threading.Event()
+
+    def _stopp(signum, frame):
+        logger.info(f"🛑 Mottok signal {signum} - avslutter etter pågående runde")
+        stopp.set()
+
+    signal.signal(signal.SIGTERM, _stopp)
+    signal.signal(signal.SIGINT, _stopp)
+
+    logger.info("🔁 Starter Hugin i daemon-modus")
+    metrikker.start_server()
+    oppstart = time.time()
+    htl.last_modell()
+    logger.info(f"🔥 Modell lastet og klar på {time.time() - oppstart:.1f} sekunder")
+
+    ko = None
+    if EVENT_QUEUE:
+        ko = hent_hendelseko(AZURE_STORAGE_CONNECTION_STRING, EVENT_QUEUE, AZURE_STORAGE_CONTAINER_NAME)
+        ko.opprett()
+        logger.info(f"📬 Venter på hendelser fra køen '{EVENT_QUEUE}', lister containeren hvert "
+                    f"{RECONCILE_INTERVAL}. sekund")
+    else:
+        logger.info(f"⏱️  Sjekker etter nye filer hvert {poll_interval}. sekund")
+
+    neste_listing = 0.0
+    while not stopp.is_set():
+        hendelser = {}
+        if ko is not None and time.time() < neste_listing:
             try:
-                with open(txt_file_path, "r", encoding='utf-8') as file:
-                    text = file.read()
-                    doc = Document()
-                    doc.add_paragraph(text)
-                    doc.save(transcribed_docx_path)
-                logger.info(f"✅ Opprettet DOCX-fil for transkripsjon: {base_name}.docx")
+                hendelser = ko.vent(neste_listing - time.time(), stopp)
             except Exception as e:
-                logger.error(f"❌ Kunne ikke opprette DOCX for transkripsjon {safe_filename}: {e}")
+                logger.error(f"❌ Kunne ikke lese hendelseskøen: {e}")
+                stopp.wait(poll_interval)
                 continue
-            
-            # Send varsler med SharePoint nedlastingslenker
-            logger.info("📧 Varsler med SharePoint-lenker...")
-            try:
-                if i-1 < len(metadata) and 'upn' in metadata[i-1]:
-                    recipient = metadata[i-1]["upn"]
-                    logger.info(f"📧 Varsler til: {recipient}")
-
-                    # Opprett transcribed_files dict for sendNotification
-                    transcribed_files = {
-                        'docx': transcribed_docx_path
-                    }
-
-                    # Send varsler med SharePoint-lenker (inkludert AI-sammendrag hvis tilgjengelig)
-                    success = htl.sendNotificationWithSummary(recipient, transcribed_files, summary_files, safe_filename)
-
-                    if success:
-                        summary_msg = " (med AI-sammendrag)" if summary_files else ""
-                        logger.info(f"✅ Varsel med SharePoint-lenker sendt til {recipient}{summary_msg}")
-                    else:
-                        logger.error(f"❌ Kunne ikke sende varsel til {recipient}")
-                else:
-                    logger.warning(f"⚠️  Ingen bruker (UPN) funnet i metadata for {safe_filename}")
-            except Exception as e:
-                logger.error(f"❌ Kunne ikke sende varsel for {safe_filename}: {e}")
-            
-            # Rydd opp filer
-            logger.info("🧹 Starter opprydding av midlertidige filer...")
-            cleanup_files = [
-                local_file_path,
-                txt_file_path,
-                transcribed_docx_path
-            ]
-
-            # Legg til AI-sammendrag filer for opprydding hvis de eksisterer
-            if summary_files:
-                if summary_files.get('txt'):
-                    cleanup_files.append(summary_files['txt'])
-                if summary_files.get('docx'):
-                    cleanup_files.append(summary_files['docx'])
-            
-            # Rydd også opp SRT-filer hvis de eksisterer
-            srt_file_path = f"./ferdig_tekst/{base_name}.srt"
-            if os.path.exists(srt_file_path):
-                cleanup_files.append(srt_file_path)
-            
-            # Rydd opp lydfiler hvis de ble opprettet
-            if file_extension in ["mp4", "mov", "avi", "m4a"]:
-                audio_file_path = f"./blobber/{base_name}.wav"
-                if os.path.exists(audio_file_path):
-                    cleanup_files.append(audio_file_path)
-            
-            cleaned_count = 0
-            for file_path in cleanup_files:
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        cleaned_count += 1
-                        logger.debug(f"🗑️  Fjernet: {file_path}")
-                except Exception as e:
-                    logger.error(f"❌ Kunne ikke fjerne fil {file_path}: {e}")
-            
-            logger.info(f"🧹 Opprydding fullført - fjernet {cleaned_count} filer")
-            
-            successful_files.append(safe_filename)
-            logger.info(f"✅ FIL FULLFØRT: {safe_filename}")
-            logger.info("-" * 30)
-            
+            if not hendelser:
+                continue
+
+        try:
+            if hendelser:
+                antall = kjor_hendelser(ko, hendelser)
+            else:
+                neste_listing = time.time() + RECONCILE_INTERVAL
+                antall = kjor_runde()
         except Exception as e:
-            logger.error(f"❌ FEIL ved behandling av {filename}: {e}")
-            continue
-    
-    # Avslutning og sammendrag
-    logger.info("")
-    logger.info("🏁 TRANSKRIPSJONSTJENESTE FULLFØRT")
-    logger.info("=" * 80)
-    logger.info(f"📊 SAMMENDRAG:")
-    logger.info(f"   • Totalt filer funnet: {len(filnavn)}")
-    logger.info(f"   • Filer behandlet vellykket: {len(successful_files)}")
-    logger.info(f"   • Filer med feil: {len(filnavn) - len(successful_files)}")
-    
-    if successful_files:
-        logger.info(f"✅ Vellykkede filer: {', '.join(successful_files)}")
-    
-    failed_files = [f for f in filnavn if sanitize_filename(f) not in successful_files]
-    if failed_files:
-        logger.info(f"❌ Feilede filer: {', '.join(failed_files)}")
-    
-    logger.info(f"⏰ Tjeneste avsluttet: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info("=" * 80)
-
-except Exception as e:
-    logger.error("💥 KRITISK FEIL I HUGIN TRANSKRIPSJONSTJENESTE")
-    logger.error("=" * 80)
-    logging.exception(f"Kritisk feil oppstod: {e}")
-    logger.error("=" * 80)
+            logger.error(f"❌ Runde feilet: {e}")
+            antall = 0
+
+        if ko is None:
+            if antall:
+                logger.info(f"💤 Runde ferdig ({antall} filer) - venter {poll_interval} sekunder")
+            stopp.wait(poll_interval)
+
+    logger.info("👋 Hugin daemon stoppet")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    modus = argv[0] if argv else "once"
+
+    if modus == "stats":
+        # Statistikk fra jobbregisteret, valgfritt begrenset til siste N timer
+        timer = float(argv[1]) if len(argv) > 1 else None
+        siden = time.time() - timer * 3600 if timer else None
+        for linje in formater_statistikk(hent_jobbregister().statistikk(siden=siden)):
+            print(linje)
+        return 0
+
+    validate_environment()
+
+    if modus == "serve":
+        serve()
+    elif modus == "once":
+        kjor_runde()
+        # Cron/launchd: metrikkene skrives til fil for node_exporter sin textfile-collector
+        metrikker.skriv_tekstfil()
+    else:
+        logger.error(f"Ukjent modus: {modus} (bruk 'once', 'serve' eller 'stats')")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: talegjenkjenning per backend
+Transkriberer testfiles/audio_king.mp3 med hver backend og rapporterer modell-lastetid,
+real-time factor (transkripsjonstid / lydlengde) og ordfeilrate (WER).
+
+WER måles mot en referansetranskripsjon (--referanse fil, eller testfiles/audio_king.txt
+hvis den finnes). Uten referanse brukes første backend som fasit, og WER blir da
+avviket mellom backendene.
+
+Bruk:
+    python benchmark_asr.py [backend ...] [--referanse fil]
+    python benchmark_asr.py mlx faster-whisper
+    HUGIN_CPU_THREADS=8 HUGIN_BEAM_SIZE=5 python benchmark_asr.py faster-whisper
+"""
+
+import os
+import re
+import sys
+import time
+
+TEST_PATH = "./testfiles/"
+TEST_FILE = "audio_king.mp3"
+REFERANSE = "./testfiles/audio_king.txt"
+
+
+def normaliser(tekst):
+    """Lowercase words without punctuation, for WER"""
+    return re.sub(r"[^\w\s]", " ", tekst.lower()).split()
+
+
+def wer(referanse, hypotese):
+    """Word error rate: (substitutions + deletions + insertions) / reference words"""
+    ref = normaliser(referanse)
+    hyp = normaliser(hypotese)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    forrige = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        rad = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            rad[j] = min(forrige[j] + 1, rad[j - 1] + 1, forrige[j - 1] + (r != h))
+        forrige = rad
+    return forrige[-1] / len(ref)
+
+
+def main():
+    args = sys.argv[1:]
+    referansefil = REFERANSE
+    if "--referanse" in args:
+        i = args.index("--referanse")
+        referansefil = args[i + 1]
+        del args[i:i + 2]
+    navn = args or ["mlx", "faster-whisper"]
+
+    lydfil = os.path.join(TEST_PATH, TEST_FILE)
+    if not os.path.exists(lydfil):
+        print(f"❌ Test file not found: {lydfil}")
+        return 1
+
+    sys.path.append('./lib')
+    from asr_backends import hent_backend
+    from lyd import SAMPLE_RATE, last_lyd
+
+    varighet = len(last_lyd(lydfil)) / SAMPLE_RATE
+    print(f"🎵 {lydfil}: {varighet:.1f} s lyd")
+
+    referanse = None
+    if os.path.exists(referansefil):
+        with open(referansefil, "r", encoding="utf-8") as f:
+            referanse = f.read()
+        print(f"📄 Referanse: {referansefil}")
+
+    resultater = []
+    for backend_navn in navn:
+        print()
+        print(f"🤖 {backend_navn}")
+        print("=" * 50)
+        try:
+            backend = hent_backend(backend_navn)
+            t = time.time()
+            backend.last()
+            lastetid = time.time() - t
+        except (ImportError, FileNotFoundError, ValueError) as e:
+            print(f"   ⚠️  Hopper over: {e}")
+            continue
+
+        t = time.time()
+        resultat = backend.transkriber(lydfil)
+        tid = time.time() - t
+        print(f"   Modell-lasting: {lastetid:.2f} s")
+        print(f"   Transkripsjon:  {tid:.2f} s (RTF {tid / varighet:.3f})")
+        print(f"   Tekst: {resultat['text'][:120]}...")
+        resultater.append((backend_navn, lastetid, tid, resultat["text"]))
+
+    if not resultater:
+        print("❌ Ingen backend kunne kjøres")
+        return 1
+
+    if referanse is None:
+        referanse = resultater[0][3]
+        print(f"\nℹ️  Ingen referansetranskripsjon, WER måles mot {resultater[0][0]}")
+
+    print()
+    print("📊 RESULTAT")
+    print("=" * 50)
+    print(f"   {'Backend':<16} {'Lasting':>9} {'Tid':>8} {'RTF':>7} {'WER':>7}")
+    for backend_navn, lastetid, tid, tekst in resultater:
+        print(f"   {backend_navn:<16} {lastetid:>8.2f}s {tid:>7.2f}s {tid / varighet:>7.3f} {wer(referanse, tekst):>6.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hele flyten ende til ende med lokale stand-ins
+Legger N syntetiske opptak av valgfri lengde i Azurite og kjører én ekte runde av
+HuginLokalTranskripsjon (kjor_runde) mot stub Graph (fra test_graph.py), stub Ollama
+(fra test_oppsummering.py) og stub-backenden for talegjenkjenning. Rapporterer filer per
+time, latens per steg som histogram, tid fra rundestart til kvittering per fil, topp-RSS
+og bytes skrevet til disk, slik at regresjoner fanges før utrulling.
+
+Runden kjøres i en egen prosess med egen arbeidsmappe, så RSS og diskskriving kun gjelder
+tjenesten, og ingenting havner i blobber/, ferdig_tekst/, jobber/ eller cache/ i repoet.
+
+Start Azurite først:
+    docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+
+Bruk:
+    python benchmark_ende_til_ende.py [antall_filer] [minutter_per_fil] [--rtf 0.02] [--json resultat.json]
+"""
+
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+# Standard utviklingskonto for Azurite
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+CONNECTION_STRING = os.getenv("BENCHMARK_STORAGE_CONNECTION_STRING", AZURITE_CONNECTION_STRING)
+CONTAINER = "benchmark-ende-til-ende"
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# Øvre grenser (sekunder) for histogramkurvene
+BOTTER = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+
+def lag_opptak(sti, nr, minutter):
+    """Syntetisk opptak: en tone per fil (så cachen ikke treffer) med 1,5 s pause hvert 7. sekund"""
+    lyd = f"aevalsrc=0.3*sin(2*PI*{300 + nr}*t)*gt(mod(t\\,7)\\,1.5):s=16000:d={minutter * 60}"
+    subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-f", "lavfi", "-i", lyd,
+                    "-c:a", "aac", "-b:a", "32k", sti], check=True)
+
+
+def skrevne_bytes():
+    """Bytes this process has caused to be written to storage (Linux), or None"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            for linje in f:
+                if linje.startswith("write_bytes:"):
+                    return int(linje.split()[1])
+    except OSError:
+        pass
+    # Andre plattformer: blokkoperasjoner á 512 bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_oublock * 512 or None
+
+
+def kjor_barn(arbeidsmappe):
+    """Kjøres i egen prosess: starter stubbene, kjører én runde og skriver målingene som JSON"""
+    os.chdir(arbeidsmappe)
+    sys.path[:0] = [REPO, os.path.join(REPO, "lib")]
+
+    # Stubbene setter GRAPH_URL, OLLAMA_HOST osv. når de importeres, før tjenesten importeres
+    import test_graph
+    import test_oppsummering
+    test_graph.start_stub()
+    test_oppsummering.start_stub()
+
+    import HuginLokalTranskripsjon as hugin
+
+    skrevet_for = skrevne_bytes()
+    start = time.time()
+    hugin.validate_environment()
+    antall = hugin.kjor_runde()
+    varighet = time.time() - start
+    skrevet_etter = skrevne_bytes()
+
+    db = sqlite3.connect(os.getenv("HUGIN_JOB_DB", "./jobber/jobber.db"))
+    steg = {}
+    for stage, duration in db.execute("SELECT stage, duration FROM stage_timings WHERE ok = 1"):
+        steg.setdefault(stage, []).append(duration)
+    kvittert = [r[0] - start for r in db.execute("SELECT updated FROM jobs WHERE state = 'acknowledged'")]
+
+    # ru_maxrss er i bytes på macOS og i KB på Linux
+    faktor = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({
+        "filer": antall,
+        "ferdige": len(kvittert),
+        "varighet": varighet,
+        "steg": steg,
+        "kvittert_etter": kvittert,
+        "graph_rundturer": len(test_graph.StubGraph.rundturer),
+        "eposter": len(test_graph.StubGraph.eposter),
+        "ollama_foresporsler": len(test_oppsummering.StubOllama.foresporsler),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * faktor / 1024 / 1024,
+        "skrevet_mb": (skrevet_etter - skrevet_for) / 1024 / 1024 if skrevet_for is not None else None,
+    }))
+
+
+def histogram(verdier):
+    """Text histogram over BOTTER, one line per non-empty bucket"""
+    linjer = []
+    nedre = 0.0
+    for ovre in BOTTER + [float("inf")]:
+        antall = sum(1 for v in verdier if nedre <= v < ovre)
+        if antall:
+            etikett = f"< {ovre:g}s" if ovre != float("inf") else f">= {nedre:g}s"
+            linjer.append(f"      {etikett:>9} {'█' * max(1, round(40 * antall / len(verdier)))} {antall}")
+        nedre = ovre
+    return linjer
+
+
+def main():
+    sys.path.append(os.path.join(REPO, "lib"))
+    from jobbregister import _persentil
+
+    args = sys.argv[1:]
+
+    def verdi(flagg, standard):
+        return args[args.index(flagg) + 1] if flagg in args else standard
+
+    rtf = verdi("--rtf", "0.02")
+    json_sti = verdi("--json", None)
+    posisjonelle = [a for i, a in enumerate(args) if not a.startswith("--") and not (i and args[i - 1].startswith("--"))]
+    antall_filer = int(posisjonelle[0]) if posisjonelle else 10
+    minutter = float(posisjonelle[1]) if len(posisjonelle) > 1 else 5
+
+    from azure.storage.blob import BlobServiceClient
+
+    service = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    container = service.get_container_client(CONTAINER)
+    if not container.exists():
+        container.create_container()
+    for blob in container.list_blobs():
+        container.delete_blob(blob.name)
+
+    arbeidsmappe = tempfile.mkdtemp(prefix="hugin-benchmark-")
+    print(f"⬆️  Legger inn {antall_filer} opptak à {minutter:g} min...")
+    opplastet = 0
+    for nr in range(antall_filer):
+        sti = os.path.join(arbeidsmappe, f"opptak_{nr:04d}.m4a")
+        lag_opptak(sti, nr, minutter)
+        opplastet += os.path.getsize(sti)
+        with open(sti, "rb") as f:
+            container.upload_blob(os.path.basename(sti), f, metadata={"upn": f"bruker{nr % 3}@example.com"})
+        os.remove(sti)
+
+    miljo = dict(os.environ,
+                 AZURE_STORAGE_CONNECTION_STRING=CONNECTION_STRING,
+                 AZURE_STORAGE_CONTAINER_NAME=CONTAINER,
+                 HUGIN_ASR_BACKEND="stub",
+                 HUGIN_STUB_RTF=rtf,
+                 HUGIN_NOTIFY_WINDOW_SECONDS="0",
+                 HUGIN_JOB_DB=os.path.join(arbeidsmappe, "jobber", "jobber.db"),
+                 HUGIN_CACHE_DIR=os.path.join(arbeidsmappe, "cache"),
+                 OLLAMA_MODEL="stubmodell")
+
+    print(f"🚀 Kjører én runde (stub ASR med RTF {rtf}) i {arbeidsmappe}")
+    prosess = subprocess.run([sys.executable, __file__, "--barn", arbeidsmappe], env=miljo,
+                             capture_output=True, text=True)
+    if prosess.returncode != 0:
+        print(prosess.stderr[-4000:])
+        return 1
+    resultat = json.loads(prosess.stdout.strip().splitlines()[-1])
+
+    lyd_timer = antall_filer * minutter / 60
+    print()
+    print("📊 RESULTAT")
+    print("=" * 60)
+    print(f"   Filer:              {resultat['ferdige']} av {antall_filer} kvittert "
+          f"({lyd_timer:.1f} t lyd, {opplastet / 1024 / 1024:.1f} MB)")
+    print(f"   Varighet:           {resultat['varighet']:.1f} s")
+    print(f"   Filer per time:     {resultat['ferdige'] / resultat['varighet'] * 3600:.0f}")
+    print(f"   Topp-RSS:           {resultat['rss_mb']:.0f} MB")
+    if resultat["skrevet_mb"] is not None:
+        print(f"   Skrevet til disk:   {resultat['skrevet_mb']:.1f} MB")
+    print(f"   Graph-rundturer:    {resultat['graph_rundturer']} ({resultat['eposter']} e-poster)")
+    print(f"   Ollama-forespørsler: {resultat['ollama_foresporsler']}")
+    kvittert = resultat["kvittert_etter"]
+    if kvittert:
+        print(f"   Tid til kvittering: p50 {_persentil(kvittert, 50):.1f}s | p95 {_persentil(kvittert, 95):.1f}s | "
+              f"maks {max(kvittert):.1f}s")
+    print()
+    print("⏱️  LATENS PER STEG")
+    for stage, tider in resultat["steg"].items():
+        print(f"   • {stage:<14} n={len(tider):<4} p50 {_persentil(tider, 50):.2f}s | "
+              f"p95 {_persentil(tider, 95):.2f}s | maks {max(tider):.2f}s")
+        for linje in histogram(tider):
+            print(linje)
+
+    if json_sti:
+        with open(json_sti, "w", encoding="utf-8") as f:
+            json.dump(dict(resultat, antall_filer=antall_filer, minutter=minutter, rtf=float(rtf)), f, indent=2)
+        print(f"\n💾 Resultat lagret i {json_sti}")
+
+    return 0 if resultat["ferdige"] == antall_filer else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--barn":
+        kjor_barn(sys.argv[2])
+    else:
+        sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: flere noder som deler én container (Azurite)
+Legger inn N små blobs, starter K arbeiderprosesser som gjør krav på filer med blob-lease
+slik HuginLokalTranskripsjon gjør, og sjekker at hver fil blir behandlet nøyaktig én gang.
+Én av arbeiderne krasjer etter å ha tatt sitt første krav, for å verifisere at kravet
+utløper og filen blir plukket opp av en annen node.
+
+Start Azurite først:
+    docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+
+Bruk:
+    python benchmark_flere_noder.py [antall_filer] [antall_noder]
+"""
+
+import collections
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Standard utviklingskonto for Azurite
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+CONNECTION_STRING = os.getenv("BENCHMARK_STORAGE_CONNECTION_STRING", AZURITE_CONNECTION_STRING)
+CONTAINER = "benchmark-flere-noder"
+BEHANDLINGSTID = 0.5  # sekunder "transkripsjon" per fil
+
+
+def node(nodenavn, resultatfil, krasj):
+    """Én arbeiderprosess: list, gjør krav, last ned, 'behandle', registrer og slett"""
+    os.environ.setdefault("BLOB_LEASE_SECONDS", "15")
+    sys.path.append('./lib')
+    from blob_lib import BlobLager
+
+    lager = BlobLager(CONNECTION_STRING, CONTAINER)
+    arbeidsmappe = tempfile.mkdtemp(prefix=f"{nodenavn}-")
+
+    while True:
+        blobs = lager.list_blobs()
+        if not blobs:
+            break
+
+        for blob in blobs:
+            if not lager.claim(blob["name"], blob["etag"]):
+                continue
+
+            if krasj:
+                # Simulerer en node som dør midt i jobben uten å slippe kravet
+                os._exit(1)
+
+            sti = os.path.join(arbeidsmappe, blob["name"])
+            lager.download(blob["name"], sti, size=blob["size"], etag=blob["etag"])
+            time.sleep(BEHANDLINGSTID)
+
+            with open(resultatfil, "a", encoding="utf-8") as f:
+                f.write(f"{blob['name']} {nodenavn}\n")
+            lager.delete(blob["name"])
+            os.remove(sti)
+
+        time.sleep(1)
+
+    print(f"{nodenavn}: {lager.rapport()}")
+
+
+def main():
+    antall_filer = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    antall_noder = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    from azure.storage.blob import BlobServiceClient
+
+    service = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    container = service.get_container_client(CONTAINER)
+    if not container.exists():
+        container.create_container()
+    for blob in container.list_blobs():
+        container.delete_blob(blob.name)
+
+    print(f"⬆️  Legger inn {antall_filer} filer...")
+    navn = [f"opptak_{i:04d}.mp3" for i in range(antall_filer)]
+    for n in navn:
+        container.upload_blob(n, os.urandom(64 * 1024), metadata={"upn": "test@example.com"})
+
+    resultatfil = tempfile.mktemp(suffix=".txt")
+    start = time.time()
+
+    # Én ekstra node som krasjer etter første krav
+    prosesser = [subprocess.Popen([sys.executable, __file__, "--node", "krasj", resultatfil, "1"])]
+    time.sleep(1)
+    for i in range(antall_noder):
+        prosesser.append(subprocess.Popen([sys.executable, __file__, "--node", f"node{i + 1}", resultatfil, "0"]))
+    for p in prosesser:
+        p.wait()
+    varighet = time.time() - start
+
+    with open(resultatfil, "r", encoding="utf-8") as f:
+        linjer = [linje.split() for linje in f if linje.strip()]
+    os.remove(resultatfil)
+
+    behandlet = collections.Counter(n for n, _ in linjer)
+    per_node = collections.Counter(node for _, node in linjer)
+    duplikater = [n for n, antall in behandlet.items() if antall > 1]
+    mistet = [n for n in navn if n not in behandlet]
+    gjenstaende = [b.name for b in container.list_blobs()]
+
+    print()
+    print("📊 RESULTAT")
+    print("=" * 50)
+    print(f"   Filer:            {antall_filer} på {antall_noder} noder (+1 som krasjet)")
+    print(f"   Varighet:         {varighet:.1f} s")
+    print(f"   Fordeling:        {dict(sorted(per_node.items()))}")
+    print(f"   Behandlet 2+ ganger: {len(duplikater)} {duplikater if duplikater else ''}")
+    print(f"   Mistet:           {len(mistet)} {mistet if mistet else ''}")
+    print(f"   Igjen i container: {len(gjenstaende)}")
+
+    ok = not duplikater and not mistet and not gjenstaende
+    print(f"   {'✅ Hver fil behandlet nøyaktig én gang' if ok else '❌ Feil i koordineringen'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 4 and sys.argv[1] == "--node":
+        node(sys.argv[2], sys.argv[3], sys.argv[4] == "1")
+        sys.exit(0)
+    sys.exit(main())
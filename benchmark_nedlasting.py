@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark: strømmende blob-nedlasting mot Azurite
+Laster opp en syntetisk blob av valgfri størrelse, laster den ned med download_blob()
+i en egen prosess og rapporterer hastighet og topp-RSS. Med --avbryt drepes første
+nedlasting underveis for å verifisere at den fortsetter fra siste fullførte segment.
+
+Start Azurite først:
+    docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+
+Bruk:
+    python benchmark_nedlasting.py [størrelse_gb] [--avbryt]
+"""
+
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Standard utviklingskonto for Azurite
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+CONNECTION_STRING = os.getenv("BENCHMARK_STORAGE_CONNECTION_STRING", AZURITE_CONNECTION_STRING)
+CONTAINER = "benchmark-nedlasting"
+BLOB_NAME = "syntetisk_opptak.mp4"
+BLOKK = 4 * 1024 * 1024
+
+
+class SyntetiskData:
+    """Fil-lignende kilde som genererer deterministiske bytes uten å holde dem i minnet"""
+
+    def __init__(self, storrelse):
+        self.storrelse = storrelse
+        self.posisjon = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, n=-1):
+        if self.posisjon >= self.storrelse:
+            return b""
+        n = BLOKK if n is None or n < 0 else n
+        n = min(n, self.storrelse - self.posisjon)
+        grunnlag = hashlib.sha256(str(self.posisjon // BLOKK).encode()).digest()
+        data = (grunnlag * (n // len(grunnlag) + 1))[:n]
+        self.posisjon += n
+        self.sha256.update(data)
+        return data
+
+
+def sha256_fil(sti):
+    h = hashlib.sha256()
+    with open(sti, "rb") as f:
+        for blokk in iter(lambda: f.read(BLOKK), b""):
+            h.update(blokk)
+    return h.hexdigest()
+
+
+def last_ned_barn(sti):
+    """Kjøres i egen prosess slik at topp-RSS kun gjelder nedlastingen"""
+    sys.path.append('./lib')
+    import hugintranskriptlib as htl
+
+    rss_for = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    htl.download_blob(CONNECTION_STRING, CONTAINER, BLOB_NAME, sti)
+    varighet = time.time() - start
+    rss_etter = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss er i bytes på macOS og i KB på Linux
+    faktor = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({
+        "varighet": varighet,
+        "rss_for_mb": rss_for * faktor / 1024 / 1024,
+        "rss_etter_mb": rss_etter * faktor / 1024 / 1024,
+    }))
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    storrelse_gb = float(args[0]) if args else 2.0
+    avbryt = "--avbryt" in sys.argv
+    storrelse = int(storrelse_gb * 1024 * 1024 * 1024)
+
+    from azure.storage.blob import BlobServiceClient
+
+    service = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    container = service.get_container_client(CONTAINER)
+    if not container.exists():
+        container.create_container()
+
+    print(f"⬆️  Laster opp syntetisk blob på {storrelse_gb:.1f} GB...")
+    kilde = SyntetiskData(storrelse)
+    container.upload_blob(BLOB_NAME, kilde, length=storrelse, overwrite=True, max_concurrency=4)
+    forventet = kilde.sha256.hexdigest()
+
+    os.makedirs("./blobber", exist_ok=True)
+    sti = "./blobber/benchmark_nedlasting.mp4"
+    for rest in (sti, sti + ".part", sti + ".part.json"):
+        if os.path.exists(rest):
+            os.remove(rest)
+
+    kommando = [sys.executable, __file__, "--barn", sti]
+
+    if avbryt:
+        print("✂️  Starter nedlasting og avbryter den underveis...")
+        prosess = subprocess.Popen(kommando, stdout=subprocess.DEVNULL)
+        while not os.path.exists(sti + ".part.json") and prosess.poll() is None:
+            time.sleep(0.2)
+        prosess.kill()
+        prosess.wait()
+        with open(sti + ".part.json", "r", encoding="utf-8") as f:
+            print(f"   Avbrutt etter {json.load(f)['offset']/1024/1024:.0f} MB")
+
+    print("⬇️  Laster ned...")
+    resultat = subprocess.run(kommando, stdout=subprocess.PIPE, text=True, check=True)
+    maling = json.loads(resultat.stdout.strip().splitlines()[-1])
+
+    riktig = sha256_fil(sti) == forventet
+    print()
+    print("📊 RESULTAT")
+    print("=" * 50)
+    print(f"   Størrelse:        {storrelse_gb:.1f} GB")
+    print(f"   Varighet:         {maling['varighet']:.1f} s ({storrelse/1024/1024/maling['varighet']:.1f} MB/s)")
+    print(f"   RSS før/etter:    {maling['rss_for_mb']:.0f} MB / {maling['rss_etter_mb']:.0f} MB")
+    print(f"   Innhold korrekt:  {'✅' if riktig else '❌'}")
+
+    os.remove(sti)
+    container.delete_blob(BLOB_NAME)
+    return 0 if riktig else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--barn":
+        last_ned_barn(sys.argv[2])
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: kaldstart vs. varm modell
+Måler hva hver launchd-kjøring betaler i import- og modell-lastetid sammenlignet
+med daemon-modus (python HuginLokalTranskripsjon.py serve), der modellen er lastet én gang.
+
+Bruk:
+    python benchmark_oppstart.py [antall_varme_kjøringer]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+TEST_PATH = "./testfiles/"
+TEST_FILE = "audio_king.mp3"
+
+
+def kald_kjoring():
+    """Kjøres i en ny prosess: import, modell-lasting og én transkripsjon, slik launchd gjør i dag"""
+    t0 = time.time()
+    sys.path.append('./lib')
+    import hugintranskriptlib as htl
+    t_import = time.time() - t0
+
+    t1 = time.time()
+    htl.last_modell()
+    t_modell = time.time() - t1
+
+    t2 = time.time()
+    htl.transkriber(TEST_PATH, TEST_FILE)
+    t_transkripsjon = time.time() - t2
+
+    print(json.dumps({
+        "import": t_import,
+        "modell": t_modell,
+        "transkripsjon": t_transkripsjon,
+    }))
+
+
+def main():
+    antall_varme = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    if not os.path.exists(os.path.join(TEST_PATH, TEST_FILE)):
+        print(f"❌ Test file not found: {TEST_PATH}{TEST_FILE}")
+        return 1
+
+    os.makedirs("./ferdig_tekst", exist_ok=True)
+
+    print("🧊 Kaldstart (ny prosess per kjøring, som launchd i dag)")
+    print("=" * 50)
+    start = time.time()
+    resultat = subprocess.run(
+        [sys.executable, __file__, "--kald"],
+        stdout=subprocess.PIPE, text=True, check=True
+    )
+    kald_total = time.time() - start
+    kald = json.loads(resultat.stdout.strip().splitlines()[-1])
+    print(f"   Import:        {kald['import']:.2f} s")
+    print(f"   Modell-lasting: {kald['modell']:.2f} s")
+    print(f"   Transkripsjon: {kald['transkripsjon']:.2f} s")
+    print(f"   Totalt (inkl. interpreter): {kald_total:.2f} s")
+
+    print()
+    print(f"🔥 Varm modell ({antall_varme} kjøringer i samme prosess, som daemon-modus)")
+    print("=" * 50)
+    sys.path.append('./lib')
+    import hugintranskriptlib as htl
+    htl.last_modell()
+
+    varme_tider = []
+    for i in range(antall_varme):
+        t = time.time()
+        htl.transkriber(TEST_PATH, TEST_FILE)
+        varme_tider.append(time.time() - t)
+        print(f"   Kjøring {i + 1}: {varme_tider[-1]:.2f} s")
+
+    varm_snitt = sum(varme_tider) / len(varme_tider)
+    oppstartskostnad = kald_total - varm_snitt
+
+    print()
+    print("📊 RESULTAT")
+    print("=" * 50)
+    print(f"   Kaldstart per fil:      {kald_total:.2f} s")
+    print(f"   Varm modell per fil:    {varm_snitt:.2f} s")
+    print(f"   Spart per kjøring:      {oppstartskostnad:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--kald":
+        kald_kjoring()
+        sys.exit(0)
+    sys.exit(main())
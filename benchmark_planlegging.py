@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rekkefølge i transkripsjonskøen (replay)
+Spiller av en strøm av opplastinger mot en simulert node i daemon-modus og måler snittlig
+gjennomløpstid (fra opplasting til ferdig) per planleggingspolicy i lib/planlegger.py.
+
+Noden lister containeren, sorterer jobbene med sorter_jobber() og transkriberer dem én og én
+(varighet = lydlengde * RTF + fast tid for nedlasting og publisering), og lister på nytt
+HUGIN_POLL_INTERVAL sekunder etter at runden er ferdig - slik kjor_runde() og serve() gjør.
+Planleggeren ser bare blob-størrelsen, så lengden estimeres med samme støy som i drift.
+
+Uten sporfil brukes en syntetisk arbeidsdag: mest korte talenotater, noen møter og et par
+lange styremøter. En sporfil er CSV med kolonnene ankomst_s,varighet_s[,prioritet].
+
+Bruk:
+    python benchmark_planlegging.py [--spor fil.csv] [--rtf 0.1] [--maks-per-runde 0] [--frø 1]
+"""
+
+import csv
+import os
+import random
+import sys
+
+sys.path.append('./lib')
+
+from jobbregister import _persentil
+from planlegger import POLICIES, STANDARD_LYDRATER, estimer_varighet, sorter_jobber
+
+POLL_INTERVAL = float(os.getenv("HUGIN_POLL_INTERVAL", "60"))
+FAST_TID = 30.0  # sekunder per fil til nedlasting, oppsummering og publisering
+KORT = 15 * 60   # opptak kortere enn dette regnes som talenotater i rapporten
+
+
+def syntetisk_dag(frø):
+    """Åtte timer med opplastinger: (ankomst_s, varighet_s, prioritet)"""
+    tilfeldig = random.Random(frø)
+    opplastinger = []
+    t = 0.0
+    while t < 8 * 3600:
+        t += tilfeldig.expovariate(1 / 240)
+        r = tilfeldig.random()
+        if r < 0.85:
+            varighet = tilfeldig.uniform(2, 10) * 60
+        elif r < 0.96:
+            varighet = tilfeldig.uniform(30, 90) * 60
+        else:
+            varighet = tilfeldig.uniform(120, 210) * 60
+        prioritet = 1 if tilfeldig.random() < 0.1 else 0
+        opplastinger.append((t, varighet, prioritet))
+    return opplastinger
+
+
+def les_spor(sti):
+    with open(sti, "r", encoding="utf-8") as f:
+        return [(float(rad["ankomst_s"]), float(rad["varighet_s"]), int(rad.get("prioritet") or 0))
+                for rad in csv.DictReader(f)]
+
+
+def spill_av(opplastinger, policy, rtf, maks_per_runde, frø):
+    """Simulerer én node og returnerer gjennomløpstid per opplasting (sekunder) og lydlengde"""
+    tilfeldig = random.Random(frø)
+    rate = STANDARD_LYDRATER["m4a"]
+    jobber = [{
+        "nr": i,
+        "created": ankomst,
+        "size": int(varighet * rate * tilfeldig.uniform(0.8, 1.25)),  # bitrate varierer
+        "file_extension": "m4a",
+        "metadata": {"upn": "test@example.com", "priority": str(prioritet)},
+        "varighet": varighet,
+    } for i, (ankomst, varighet, prioritet) in enumerate(sorted(opplastinger))]
+    for jobb in jobber:
+        jobb["estimated_duration"] = estimer_varighet(jobb)
+
+    ventende = list(jobber)
+    resultater = []
+    t = 0.0
+    while ventende:
+        listet = [j for j in ventende if j["created"] <= t]
+        if not listet:
+            t = max(t + POLL_INTERVAL, min(j["created"] for j in ventende))
+            continue
+
+        runde = sorter_jobber(listet, policy=policy, naa=t)
+        if maks_per_runde:
+            runde = runde[:maks_per_runde]
+        for jobb in runde:
+            t += jobb["varighet"] * rtf + FAST_TID
+            resultater.append((t - jobb["created"], jobb["varighet"]))
+            ventende.remove(jobb)
+        t += POLL_INTERVAL
+    return resultater
+
+
+def snitt(verdier):
+    """Mean in minutes"""
+    return sum(verdier) / len(verdier) / 60 if verdier else 0.0
+
+
+def main():
+    args = sys.argv[1:]
+
+    def verdi(flagg, standard):
+        return args[args.index(flagg) + 1] if flagg in args else standard
+
+    rtf = float(verdi("--rtf", "0.1"))
+    maks_per_runde = int(verdi("--maks-per-runde", "0"))
+    frø = int(verdi("--frø", "1"))
+    opplastinger = les_spor(verdi("--spor", None)) if "--spor" in args else syntetisk_dag(frø)
+
+    lyd = sum(v for _, v, _ in opplastinger)
+    print(f"🎞️  {len(opplastinger)} opplastinger, {lyd/3600:.1f} timer lyd, RTF {rtf}, "
+          f"poll {POLL_INTERVAL:.0f}s, maks per runde {maks_per_runde or 'alle'}")
+    print()
+    print(f"{'policy':<10} {'snitt':>8} {'p50':>8} {'p95':>8} {'maks':>8} {'snitt kort':>11} {'snitt lang':>11}")
+    print("-" * 70)
+
+    for policy in POLICIES:
+        resultater = spill_av(opplastinger, policy, rtf, maks_per_runde, frø)
+        tider = [tid for tid, _ in resultater]
+        korte = [tid for tid, varighet in resultater if varighet < KORT]
+        lange = [tid for tid, varighet in resultater if varighet >= KORT]
+        print(f"{policy:<10} {snitt(tider):>7.1f}m {_persentil(tider, 50)/60:>7.1f}m "
+              f"{_persentil(tider, 95)/60:>7.1f}m {max(tider)/60:>7.1f}m {snitt(korte):>10.1f}m {snitt(lange):>10.1f}m")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
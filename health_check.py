@@ -115,22 +115,21 @@ def check_directories():
     return True, f"All directories available: {', '.join(required_dirs)}"
 
 def check_whisper_model():
-    """Check if WhisperX model can be loaded"""
+    """Check if the configured ASR backend can load its model"""
     try:
         # Set up environment for ffmpeg
         os.environ['PATH'] = '/opt/homebrew/bin:' + os.environ.get('PATH', '')
         
-        from transformers import pipeline
+        from lib.asr_backends import hent_backend
         
-        # Try to load the model (this will use cached version if available)
-        asr = pipeline("automatic-speech-recognition", 
-                      "NbAiLab/nb-whisper-medium", 
-                      device="mps")  # Use Metal Performance Shaders on Apple Silicon
+        # Loads the model for HUGIN_ASR_BACKEND (mlx on Apple Silicon, faster-whisper on Linux)
+        backend = hent_backend()
+        backend.last()
         
-        return True, "WhisperX model loaded successfully"
+        return True, f"ASR model loaded successfully ({backend.navn})"
         
     except Exception as e:
-        return False, f"WhisperX model loading failed: {str(e)}"
+        return False, f"ASR model loading failed: {str(e)}"
 
 def check_library_imports():
     """Check if local library can be imported"""
@@ -165,7 +164,7 @@ def main():
         ("Python Dependencies", check_python_imports),
         ("Directory Structure", check_directories),
         ("Local Library", check_library_imports),
-        ("WhisperX Model", check_whisper_model),
+        ("ASR Model", check_whisper_model),
     ]
     
     all_passed = True
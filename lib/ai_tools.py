@@ -4,30 +4,51 @@ Provides integration with Ollama for generating meeting summaries and abstracts.
 """
 
 import os
+import re
+import time
+import queue
 import logging
-from typing import Optional, Dict, Any
-from ollama import chat, ChatResponse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, TextIO
+from ollama import Client, ChatResponse
 
 logger = logging.getLogger(__name__)
 
-def generate_meeting_summary(
-    transcription_text: str,
-    model: str = "gpt-oss:20b",
-    language: str = "norsk bokmål"
-) -> Optional[str]:
-    """
-    Generate a meeting summary using Ollama.
+# Transkripsjoner som er lengre enn dette (estimerte tokens) oppsummeres i biter (map-reduce)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("OLLAMA_CHUNK_TOKENS", "6000"))
+# Samtidige forespørsler mot Ollama i map-steget (Ollama må ha OLLAMA_NUM_PARALLEL >= dette)
+SUMMARY_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "2"))
+# Kontekstvindu per forespørsel (0 = modellens standard i Ollama)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+# Hvor lenge Ollama holder modellen i minnet etter siste forespørsel ("30m", sekunder, eller -1 for alltid)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Hvor lenge et svar fra tilgjengelighetssjekken gjenbrukes, og hvor lenge sjekken venter på svar (sekunder)
+OLLAMA_HEALTH_TTL = float(os.getenv("OLLAMA_HEALTH_TTL", "60"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "10"))
 
-    Args:
-        transcription_text: The transcribed text to summarize
-        model: Ollama model to use (default: gpt-oss:20b)
-        language: Output language (default: norsk bokmål)
+# Frister: første token per forespørsel (inkluderer modell-lasting og prefill) og hele sammendraget per fil
+OLLAMA_FIRST_TOKEN_TIMEOUT = float(os.getenv("OLLAMA_FIRST_TOKEN_TIMEOUT", "300"))
+OLLAMA_TOTAL_TIMEOUT = float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "1800"))
 
-    Returns:
-        Generated summary text or None if failed
-    """
+# Egen klient med tidsavbrudd, så en forespørsel som henger ikke blir liggende for alltid i bakgrunnen
+_klient = Client(timeout=OLLAMA_TOTAL_TIMEOUT + 60)
+# Tilgjengelighetssjekken skal svare raskt; en Ollama som henger regnes som utilgjengelig
+_sjekk_klient = Client(timeout=OLLAMA_HEALTH_TIMEOUT)
+
+# Modell -> (tidspunkt, tilgjengelig) fra siste sjekk
+_tilgjengelig = {}
+_tilgjengelig_lock = threading.Lock()
 
-    system_prompt = f"""Du er en språkmodell som skal oppsummere og lage disposisjon til et møtereferat basert på en ord-for-ord-transkripsjon. Det er svært viktig at du kun bruker informasjon som faktisk finnes i transkripsjonen, og at du verken legger til, trekker fra eller gjetter på innhold. Oppsummeringen/disposisjonen skal være så presis og korrekt som mulig, og alt som tas med må være direkte basert på det som står i transkripsjonen. Ikke inkluder tolkninger eller antakelser. Strukturen skal være ryddig og oversiktlig.
+# Grovt anslag for norsk tekst; brukes til å dele transkripsjonen uten å laste en tokenizer
+TEGN_PER_TOKEN = 3.5
+
+# Maks antall runder med deloppsummering før siste sammenslåing
+MAKS_NIVAER = 3
+
+
+def _system_prompt(language: str) -> str:
+    return f"""Du er en språkmodell som skal oppsummere og lage disposisjon til et møtereferat basert på en ord-for-ord-transkripsjon. Det er svært viktig at du kun bruker informasjon som faktisk finnes i transkripsjonen, og at du verken legger til, trekker fra eller gjetter på innhold. Oppsummeringen/disposisjonen skal være så presis og korrekt som mulig, og alt som tas med må være direkte basert på det som står i transkripsjonen. Ikke inkluder tolkninger eller antakelser. Strukturen skal være ryddig og oversiktlig.
 
 Regler:
 
@@ -43,30 +64,270 @@ Avslutt referatet med en kort oppsummering av de viktigste punktene og åpne fel
 Oppgave:
 Les gjennom transkripsjonen og lag en strukturert disposisjon til et møtereferat, der alle punkter er basert utelukkende på innholdet i transkripsjonen."""
 
+
+def _map_prompt(language: str) -> str:
+    return f"""Du får én del av en lengre ord-for-ord-transkripsjon av et møte (eller av stikkordsreferater laget fra den). Lag et fyldig stikkordsreferat av denne delen, i kronologisk rekkefølge, som senere skal settes sammen med referatene av de andre delene til ett møtereferat.
+
+Regler:
+
+Du skal alltid skrive på {language}.
+Bruk kun informasjon som faktisk finnes i teksten. Ikke gjør antakelser.
+Ta med alle temaer, saker, synspunkter, beslutninger, oppgaver og hvem som har ansvar, med navn, tall og datoer slik de står.
+Ikke skriv innledning, advarsel eller avslutning; kun selve stikkordene."""
+
+
+def _reduce_prompt(language: str) -> str:
+    return _system_prompt(language) + """
+
+Merk: Du får ikke selve transkripsjonen, men stikkordsreferater av påfølgende deler av den, i kronologisk rekkefølge. Behandle dem som én sammenhengende transkripsjon, og slå sammen temaer som går igjen i flere deler."""
+
+
+def estimer_tokens(tekst: str) -> int:
+    """Rough token count for budgeting chunk sizes"""
+    return int(len(tekst) / TEGN_PER_TOKEN) + 1
+
+
+def del_tekst(tekst: str, maks_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most maks_tokens (estimated), at paragraph and sentence boundaries.
+
+    Sentences longer than the budget are split between words.
+    """
+    maks_tegn = int(maks_tokens * TEGN_PER_TOKEN)
+    setninger = []
+    for avsnitt in re.split(r"\n\s*\n", tekst):
+        for setning in re.split(r"(?<=[.!?])\s+", avsnitt.strip()):
+            while len(setning) > maks_tegn:
+                kutt = setning.rfind(" ", 0, maks_tegn)
+                kutt = kutt if kutt > 0 else maks_tegn
+                setninger.append(setning[:kutt])
+                setning = setning[kutt:].lstrip()
+            if setning:
+                setninger.append(setning)
+
+    biter = []
+    gjeldende = ""
+    for setning in setninger:
+        if gjeldende and len(gjeldende) + 1 + len(setning) > maks_tegn:
+            biter.append(gjeldende)
+            gjeldende = setning
+        else:
+            gjeldende = f"{gjeldende} {setning}" if gjeldende else setning
+    if gjeldende:
+        biter.append(gjeldende)
+    return biter
+
+
+def _keep_alive(verdi: str):
+    """keep_alive as Ollama expects it: a number of seconds or a duration string like '30m'"""
+    return int(verdi) if verdi.lstrip("-").isdigit() else verdi
+
+
+class _Tokenstatistikk:
+    """Accumulates Ollama token counts over the requests that make up one summary"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+        self.prompt_seconds = 0.0
+        self.eval_seconds = 0.0
+        self.first_token_seconds = None
+
+    def registrer(self, siste: ChatResponse):
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += siste.prompt_eval_count or 0
+            self.eval_tokens += siste.eval_count or 0
+            self.prompt_seconds += (siste.prompt_eval_duration or 0) / 1e9
+            self.eval_seconds += (siste.eval_duration or 0) / 1e9
+
+    def som_dict(self, total_seconds: float) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "eval_tokens": self.eval_tokens,
+            "prompt_tokens_per_second": self.prompt_tokens / self.prompt_seconds if self.prompt_seconds else 0.0,
+            "tokens_per_second": self.eval_tokens / self.eval_seconds if self.eval_seconds else 0.0,
+            "first_token_seconds": self.first_token_seconds,
+            "total_seconds": total_seconds,
+        }
+
+
+def _chat(model: str, system_prompt: str, user_text: str, deadline: Optional[float] = None,
+          output: Optional[TextIO] = None, tokenstatistikk: Optional[_Tokenstatistikk] = None) -> Optional[str]:
+    """
+    One streaming chat request.
+
+    Tokens are read on a background thread and handed over through a queue, so the deadlines hold
+    even when Ollama stops sending: no token (including thinking tokens) within
+    OLLAMA_FIRST_TOKEN_TIMEOUT, or not done by deadline, raises TimeoutError and abandons the stream.
+
+    Args:
+        model: Ollama model
+        system_prompt: System message
+        user_text: User message
+        deadline: Unix time the whole answer must be complete by
+        output: Open text file the answer is written to as it arrives
+        tokenstatistikk: Collects prompt/eval token counts from the final chunk
+
+    Returns:
+        The message content
+    """
+    kwargs = {"keep_alive": _keep_alive(OLLAMA_KEEP_ALIVE)}
+    if OLLAMA_NUM_CTX:
+        kwargs["options"] = {"num_ctx": OLLAMA_NUM_CTX}
+
+    ko = queue.Queue()
+    avbryt = threading.Event()
+
+    def les():
+        try:
+            for del_ in _klient.chat(
+                model=model,
+                messages=[
+                    {
+                        'role': 'system',
+                        'content': system_prompt,
+                    },
+                    {
+                        'role': 'user',
+                        'content': user_text,
+                    },
+                ],
+                stream=True,
+                **kwargs
+            ):
+                if avbryt.is_set():
+                    return  # lukker strømmen, så Ollama slutter å generere
+                ko.put(("del", del_))
+            ko.put(("slutt", None))
+        except Exception as e:
+            ko.put(("feil", e))
+
+    threading.Thread(target=les, name="ollama-strom", daemon=True).start()
+
+    start_time = time.time()
+    forste_frist = start_time + OLLAMA_FIRST_TOKEN_TIMEOUT
+    if deadline:
+        forste_frist = min(forste_frist, deadline)
+    forste_token = None
+    tekst = []
+    try:
+        while True:
+            frist = forste_frist if forste_token is None else deadline
+            try:
+                type_, verdi = ko.get(timeout=max(0.0, frist - time.time()) if frist else None)
+            except queue.Empty:
+                if forste_token is None:
+                    raise TimeoutError(f"No token from Ollama within {time.time() - start_time:.1f} seconds")
+                raise TimeoutError(f"Summary not finished by the total deadline ({time.time() - start_time:.1f} seconds into this request)")
+
+            if type_ == "feil":
+                raise verdi
+            if type_ == "slutt":
+                break
+
+            innhold = verdi.message.content or ""
+            if forste_token is None and (innhold or verdi.message.thinking):
+                forste_token = time.time() - start_time
+            if innhold:
+                tekst.append(innhold)
+                if output:
+                    output.write(innhold)
+                    output.flush()
+            if verdi.done and tokenstatistikk:
+                tokenstatistikk.registrer(verdi)
+    finally:
+        avbryt.set()
+
+    if tokenstatistikk and output:
+        tokenstatistikk.first_token_seconds = forste_token
+    return "".join(tekst)
+
+
+def _map_reduce(transcription_text: str, model: str, language: str, chunk_tokens: int, concurrency: int,
+                deadline: Optional[float], output: Optional[TextIO], tokenstatistikk: _Tokenstatistikk) -> Optional[str]:
+    """
+    Hierarchical summary: summarize chunks concurrently, then combine the partial summaries.
+
+    If the partial summaries together are still longer than one chunk, they are grouped and
+    summarized again until they fit in a single reduce request (at most MAKS_NIVAER levels).
+    """
+    tekst = transcription_text
+    for niva in range(1, MAKS_NIVAER + 1):
+        biter = del_tekst(tekst, chunk_tokens)
+        logger.info(f"Map-reduce level {niva}: summarizing {len(biter)} chunks with {concurrency} concurrent requests")
+        with ThreadPoolExecutor(max(1, concurrency)) as pool:
+            delreferater = list(pool.map(
+                lambda bit: _chat(model, _map_prompt(language), bit, deadline, tokenstatistikk=tokenstatistikk), biter
+            ))
+
+        if any(not d for d in delreferater):
+            logger.error("Failed to summarize one or more chunks")
+            return None
+
+        tekst = "\n\n".join(f"Del {i} av {len(delreferater)}:\n{d.strip()}" for i, d in enumerate(delreferater, start=1))
+        if estimer_tokens(tekst) <= chunk_tokens:
+            break
+
+    logger.info("Map-reduce: combining partial summaries into meeting minutes")
+    return _chat(model, _reduce_prompt(language), tekst, deadline, output, tokenstatistikk)
+
+
+def generate_meeting_summary(
+    transcription_text: str,
+    model: str = "gpt-oss:20b",
+    language: str = "norsk bokmål",
+    chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+    concurrency: int = SUMMARY_CONCURRENCY,
+    output_path: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    timeout: float = OLLAMA_TOTAL_TIMEOUT
+) -> Optional[str]:
+    """
+    Generate a meeting summary using Ollama.
+
+    Transcripts longer than chunk_tokens are summarized map-reduce style: the text is split
+    into chunks, the chunks are summarized concurrently, and a final request turns the partial
+    summaries into the meeting minutes.
+
+    Answers are streamed. The meeting minutes are written to output_path as they arrive, and
+    the summary is abandoned if a request gets no first token within OLLAMA_FIRST_TOKEN_TIMEOUT
+    or the whole summary takes longer than timeout.
+
+    Args:
+        transcription_text: The transcribed text to summarize
+        model: Ollama model to use (default: gpt-oss:20b)
+        language: Output language (default: norsk bokmål)
+        chunk_tokens: Maximum estimated tokens per request before switching to map-reduce
+        concurrency: Concurrent chunk requests against Ollama
+        output_path: File the meeting minutes are streamed to (overwritten)
+        stats: Dict that is filled with requests, prompt_tokens, eval_tokens, prompt_tokens_per_second,
+            tokens_per_second, first_token_seconds, total_seconds (and error on failure)
+        timeout: Total deadline in seconds for the whole summary
+
+    Returns:
+        Generated summary text or None if failed
+    """
+
+    start_time = time.time()
+    deadline = start_time + timeout
+    tokenstatistikk = _Tokenstatistikk()
+    output = open(output_path, "w", encoding="utf-8") if output_path else None
+    summary_text = None
+
     try:
         logger.info(f"Generating summary using model: {model}")
 
-        response: ChatResponse = chat(
-            model=model,
-            messages=[
-                {
-                    'role': 'system',
-                    'content': system_prompt,
-                },
-                {
-                    'role': 'user',
-                    'content': transcription_text,
-                },
-            ]
-        )
-
-        # Extract content from response
-        if hasattr(response, 'message') and hasattr(response.message, 'content'):
-            summary_text = response.message.content
-        elif isinstance(response, dict) and 'message' in response:
-            summary_text = response['message'].get('content', '')
+        if estimer_tokens(transcription_text) > chunk_tokens:
+            summary_text = _map_reduce(transcription_text, model, language, chunk_tokens, concurrency,
+                                       deadline, output, tokenstatistikk)
         else:
-            logger.error(f"Unexpected response format from Ollama: {type(response)}")
+            summary_text = _chat(model, _system_prompt(language), transcription_text, deadline, output, tokenstatistikk)
+
+        if summary_text is None:
             return None
 
         logger.info("Successfully generated meeting summary")
@@ -74,33 +335,77 @@ Les gjennom transkripsjonen og lag en strukturert disposisjon til et møterefera
 
     except Exception as e:
         logger.error(f"Error generating summary with Ollama: {str(e)}")
+        if stats is not None:
+            stats["error"] = str(e)
         return None
 
+    finally:
+        if output:
+            output.close()
+        if stats is not None:
+            stats.update(tokenstatistikk.som_dict(time.time() - start_time))
+            logger.info(
+                f"Ollama: {stats['prompt_tokens']} prompt tokens ({stats['prompt_tokens_per_second']:.0f}/s), "
+                f"{stats['eval_tokens']} generated tokens ({stats['tokens_per_second']:.1f}/s) "
+                f"in {stats['requests']} requests, {stats['total_seconds']:.1f}s total"
+            )
+
 
-def is_ollama_available(model: str = "gpt-oss:20b") -> bool:
+def is_ollama_available(model: str = "gpt-oss:20b", max_age: float = OLLAMA_HEALTH_TTL) -> bool:
     """
     Check if Ollama service is available and the specified model is accessible.
 
+    Uses the show endpoint, which reads model metadata without loading the model or generating
+    anything. The answer is reused for max_age seconds, so per-file checks are free.
+
     Args:
         model: Model name to check
+        max_age: Seconds a previous answer for the same model is reused (0 always asks Ollama)
 
     Returns:
         True if Ollama and model are available, False otherwise
     """
+    with _tilgjengelig_lock:
+        sjekket = _tilgjengelig.get(model)
+        if sjekket and time.time() - sjekket[0] < max_age:
+            return sjekket[1]
+
     try:
-        # Test with a minimal prompt
-        response: ChatResponse = chat(
-            model=model,
-            messages=[
-                {
-                    'role': 'user',
-                    'content': 'Test',
-                },
-            ]
-        )
-        return True
+        _sjekk_klient.show(model)
+        tilgjengelig = True
     except Exception as e:
         logger.warning(f"Ollama not available or model '{model}' not found: {str(e)}")
+        tilgjengelig = False
+
+    with _tilgjengelig_lock:
+        _tilgjengelig[model] = (time.time(), tilgjengelig)
+    return tilgjengelig
+
+
+def warm_up_model(model: str = "gpt-oss:20b", keep_alive: str = OLLAMA_KEEP_ALIVE) -> bool:
+    """
+    Load the model into Ollama's memory ahead of the first summary.
+
+    An empty generate request makes Ollama load the model without generating anything; keep_alive
+    decides how long it stays loaded afterwards.
+
+    Args:
+        model: Model to preload
+        keep_alive: How long Ollama should keep the model loaded
+
+    Returns:
+        True if the model is loaded, False if Ollama or the model is unavailable
+    """
+    if not is_ollama_available(model):
+        return False
+
+    try:
+        start_time = time.time()
+        _klient.generate(model=model, prompt="", keep_alive=_keep_alive(keep_alive))
+        logger.info(f"Ollama model '{model}' loaded in {time.time() - start_time:.1f} seconds (keep_alive {keep_alive})")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not preload Ollama model '{model}': {str(e)}")
         return False
 
 
@@ -112,8 +417,7 @@ def get_available_models() -> list:
         List of available model names, empty list if error
     """
     try:
-        from ollama import list as list_models
-        models = list_models()
+        models = _sjekk_klient.list()
         if isinstance(models, dict) and 'models' in models:
             return [model['name'] for model in models['models']]
         return []
@@ -0,0 +1,341 @@
+"""
+ASR Backends for Transcription Service
+Common interface for speech recognition engines, plus chunked transcription of long
+recordings: audio is split at silence, chunks are decoded (in parallel where the backend
+allows it) and the text and timestamps are stitched back together in order.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+try:
+    from .lyd import SAMPLE_RATE, del_i_biter, energi_db
+except ImportError:
+    from lyd import SAMPLE_RATE, del_i_biter, energi_db
+
+logger = logging.getLogger(__name__)
+
+# Lokal norsk MLX-modell
+MODEL_PATH = "./nb-whisper-medium-mlx"
+
+# CPU-backend (faster-whisper / CTranslate2) for Linux-noder
+CT2_MODEL_PATH = os.getenv("HUGIN_CT2_MODEL", "./nb-whisper-medium-ct2")
+CT2_COMPUTE_TYPE = os.getenv("HUGIN_CT2_COMPUTE_TYPE", "int8")
+CPU_THREADS = int(os.getenv("HUGIN_CPU_THREADS", "0"))
+CT2_WORKERS = int(os.getenv("HUGIN_CT2_WORKERS", "1"))
+BEAM_SIZE = int(os.getenv("HUGIN_BEAM_SIZE", "1"))
+
+# Oppdeling av lange opptak
+CHUNK_SECONDS = float(os.getenv("HUGIN_CHUNK_SECONDS", "300"))
+CHUNK_OVERLAP_SECONDS = float(os.getenv("HUGIN_CHUNK_OVERLAP_SECONDS", "2"))
+CHUNK_WORKERS = int(os.getenv("HUGIN_CHUNK_WORKERS", "2"))
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class ASRBackend:
+    """
+    Interface for a speech recognition engine.
+
+    transkriber() returns the same structure as mlx_whisper.transcribe():
+    {'text': str, 'segments': [{'start': float, 'end': float, 'text': str}, ...]}
+    with timestamps in seconds relative to the start of the given audio.
+    """
+
+    navn = "base"
+    # Hvor mange biter som trygt kan dekodes samtidig i samme prosess
+    maks_parallell = 1
+
+    def last(self):
+        """Load the model into memory ahead of the first transcription"""
+
+    def parametre(self) -> Dict:
+        """Model and decoding settings that affect the transcript (part of the cache key)"""
+        return {"backend": self.navn}
+
+    def transkriber(self, lyd: Union[str, np.ndarray], word_timestamps: bool = False) -> Dict:
+        raise NotImplementedError
+
+
+class MLXBackend(ASRBackend):
+    """NB-Whisper on Apple Silicon via mlx_whisper"""
+
+    navn = "mlx"
+    maks_parallell = 1
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        self.model_path = model_path
+        self._lastet = False
+        self._lock = threading.Lock()
+
+    def last(self):
+        with self._lock:
+            if self._lastet:
+                return
+            import mlx.core as mx
+            from mlx_whisper.transcribe import ModelHolder
+
+            if not os.path.exists(os.path.join(self.model_path, "config.json")):
+                print(f"❌ Local MLX model not found at {self.model_path}")
+                raise FileNotFoundError(f"Required MLX model not found at {self.model_path}")
+
+            start_time = time.time()
+            # mlx_whisper.transcribe() bruker samme ModelHolder, så modellen gjenbrukes så lenge prosessen lever
+            ModelHolder.get_model(self.model_path, mx.float16)
+            self._lastet = True
+            logger.info(f"MLX model loaded from {self.model_path} on {mx.default_device()} "
+                        f"in {time.time() - start_time:.2f} seconds")
+
+    def parametre(self):
+        return {"backend": self.navn, "model": os.path.abspath(self.model_path), "language": "no", "temperature": 0.0}
+
+    def transkriber(self, lyd, word_timestamps=False):
+        import mlx_whisper
+
+        transcribe_params = {
+            "path_or_hf_repo": self.model_path,
+            "language": "no",
+            "verbose": False,
+            "temperature": 0.0
+        }
+
+        # Only add word_timestamps if True (for performance)
+        if word_timestamps:
+            transcribe_params["word_timestamps"] = True
+
+        return mlx_whisper.transcribe(lyd, **transcribe_params)
+
+
+class FasterWhisperBackend(ASRBackend):
+    """
+    NB-Whisper on CPU via faster-whisper (CTranslate2), for ordinary x86 Linux servers.
+
+    The model must be converted to CTranslate2 format first, e.g.
+    ct2-transformers-converter --model NbAiLab/nb-whisper-medium --output_dir nb-whisper-medium-ct2 --quantization int8
+
+    Args:
+        model_path: Directory with the converted model
+        compute_type: CTranslate2 compute type ('int8', 'int8_float32', 'float32')
+        cpu_threads: Threads per decode (0 lets CTranslate2 decide)
+        workers: Decodes that may run concurrently on the same model (used for chunked transcription)
+        beam_size: Beam width; 1 is greedy decoding like the MLX backend
+    """
+
+    navn = "faster-whisper"
+
+    def __init__(self, model_path: str = CT2_MODEL_PATH, compute_type: str = CT2_COMPUTE_TYPE,
+                 cpu_threads: int = CPU_THREADS, workers: int = CT2_WORKERS, beam_size: int = BEAM_SIZE):
+        self.model_path = model_path
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.maks_parallell = max(1, workers)
+        self.beam_size = beam_size
+        self._modell = None
+        self._lock = threading.Lock()
+
+    def last(self):
+        with self._lock:
+            if self._modell is not None:
+                return
+            from faster_whisper import WhisperModel
+
+            if not os.path.isdir(self.model_path):
+                print(f"❌ CTranslate2 model not found at {self.model_path}")
+                raise FileNotFoundError(f"Required CTranslate2 model not found at {self.model_path}")
+
+            start_time = time.time()
+            self._modell = WhisperModel(
+                self.model_path,
+                device="cpu",
+                compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads,
+                num_workers=self.maks_parallell,
+            )
+            logger.info(f"CTranslate2 model loaded from {self.model_path} ({self.compute_type}, "
+                        f"{self.cpu_threads or 'auto'} threads) in {time.time() - start_time:.2f} seconds")
+
+    def parametre(self):
+        return {"backend": self.navn, "model": os.path.abspath(self.model_path), "language": "no",
+                "temperature": 0.0, "compute_type": self.compute_type, "beam_size": self.beam_size}
+
+    def transkriber(self, lyd, word_timestamps=False):
+        self.last()
+        segmenter, info = self._modell.transcribe(
+            lyd,
+            language="no",
+            task="transcribe",
+            beam_size=self.beam_size,
+            temperature=0.0,
+            word_timestamps=word_timestamps,
+            vad_filter=False,
+        )
+
+        segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segmenter]
+        return {"text": "".join(s["text"] for s in segments).strip(), "segments": segments, "language": info.language}
+
+
+class StubBackend(ASRBackend):
+    """
+    Fast stand-in without a model, for tests and benchmarks on any machine.
+
+    Emits one segment per 5 seconds of non-silent audio and sleeps
+    sanntidsfaktor × audio length to simulate decoding cost.
+    """
+
+    navn = "stub"
+    maks_parallell = 8
+
+    def __init__(self, sanntidsfaktor: float = 0.0):
+        self.sanntidsfaktor = sanntidsfaktor
+
+    def transkriber(self, lyd, word_timestamps=False):
+        if isinstance(lyd, str):
+            try:
+                from .lyd import last_lyd
+            except ImportError:
+                from lyd import last_lyd
+            lyd = last_lyd(lyd)
+
+        varighet = len(lyd) / SAMPLE_RATE
+        if self.sanntidsfaktor:
+            time.sleep(varighet * self.sanntidsfaktor)
+
+        energi = energi_db(lyd)
+        terskel = float(np.percentile(energi, 10)) + 10 if len(energi) else 0.0
+        rammer_per_segment = int(5 / 0.03)
+
+        segments = []
+        for i in range(0, len(energi), rammer_per_segment):
+            if np.mean(energi[i:i + rammer_per_segment]) > terskel:
+                start = i * 0.03
+                end = min(start + 5.0, varighet)
+                segments.append({"start": start, "end": end, "text": f" tale {start:.0f}-{end:.0f}"})
+
+        return {"text": "".join(s["text"] for s in segments).strip(), "segments": segments}
+
+
+def hent_backend(navn: Optional[str] = None) -> ASRBackend:
+    """
+    Return the shared backend instance for a name, creating it on first use.
+
+    Args:
+        navn: 'mlx', 'faster-whisper' or 'stub'; defaults to HUGIN_ASR_BACKEND or 'mlx'
+    """
+    navn = navn or os.getenv("HUGIN_ASR_BACKEND", "mlx")
+    with _backends_lock:
+        if navn not in _backends:
+            if navn == "mlx":
+                _backends[navn] = MLXBackend()
+            elif navn == "faster-whisper":
+                _backends[navn] = FasterWhisperBackend()
+            elif navn == "stub":
+                _backends[navn] = StubBackend(float(os.getenv("HUGIN_STUB_RTF", "0")))
+            else:
+                raise ValueError(f"Ukjent ASR-backend: {navn}")
+        return _backends[navn]
+
+
+def _normaliser(ord_: str) -> str:
+    return re.sub(r"[^\w]", "", ord_.lower())
+
+
+def _fjern_gjentakelse(forrige: str, ny: str, maks_ord: int = 8) -> str:
+    """Remove words at the start of ny that repeat the last words of forrige"""
+    forrige_ord = [_normaliser(o) for o in forrige.split()]
+    ny_ord = ny.split()
+    ny_norm = [_normaliser(o) for o in ny_ord]
+
+    for k in range(min(maks_ord, len(forrige_ord), len(ny_ord)), 0, -1):
+        if forrige_ord[-k:] == ny_norm[:k]:
+            rest = " ".join(ny_ord[k:])
+            return f" {rest}" if rest else ""
+    return ny
+
+
+def sy_sammen(resultater: List[Dict], biter: List[tuple], dekodet_fra: List[int], sr: int = SAMPLE_RATE) -> Dict:
+    """
+    Stitch per-chunk results into one transcript.
+
+    Each chunk was decoded with some overlap on both sides. Segment timestamps are shifted
+    to absolute time, a segment is kept only by the chunk whose core range contains its
+    midpoint, and words repeated across a seam are removed.
+
+    Args:
+        resultater: Backend results per chunk, in order
+        biter: (start, end) core sample ranges per chunk
+        dekodet_fra: First sample actually decoded for each chunk (core start minus overlap)
+        sr: Sample rate
+
+    Returns:
+        dict: {'text', 'segments'} in the same format as a single backend call
+    """
+    segments = []
+    for resultat, (start, end), fra in zip(resultater, biter, dekodet_fra):
+        forskyvning = fra / sr
+        kjerne_start = start / sr
+        kjerne_slutt = end / sr
+        siste_bit = end == biter[-1][1]
+
+        for seg in resultat.get("segments") or []:
+            s = dict(seg)
+            s["start"] = seg.get("start", 0.0) + forskyvning
+            s["end"] = seg.get("end", seg.get("start", 0.0)) + forskyvning
+            midt = (s["start"] + s["end"]) / 2
+            if midt < kjerne_start or (midt >= kjerne_slutt and not siste_bit):
+                continue
+
+            if segments:
+                s["text"] = _fjern_gjentakelse(segments[-1]["text"], s.get("text", ""))
+            if s.get("text", "").strip():
+                segments.append(s)
+
+    return {"text": "".join(s["text"] for s in segments).strip(), "segments": segments}
+
+
+def transkriber_i_biter(backend: ASRBackend, lyd: np.ndarray, word_timestamps: bool = False,
+                        chunk_sekunder: float = CHUNK_SECONDS, overlapp_sekunder: float = CHUNK_OVERLAP_SECONDS,
+                        arbeidere: int = CHUNK_WORKERS, sr: int = SAMPLE_RATE) -> Dict:
+    """
+    Transcribe a long recording in chunks split at silence.
+
+    Args:
+        backend: ASR backend to decode each chunk with
+        lyd: Mono 16 kHz float32 samples
+        word_timestamps: Passed on to the backend
+        chunk_sekunder: Target chunk length
+        overlapp_sekunder: Extra audio decoded on each side of a chunk to avoid cutting words
+        arbeidere: Parallel chunk decodes, limited by backend.maks_parallell.
+            With one worker the chunks are decoded in order on the calling thread.
+        sr: Sample rate
+
+    Returns:
+        dict: {'text', 'segments'} covering the whole recording
+    """
+    biter = del_i_biter(lyd, chunk_sekunder, sr)
+    overlapp = int(overlapp_sekunder * sr)
+    dekodet_fra = [max(0, start - overlapp) for start, _ in biter]
+    dekodet_til = [min(len(lyd), end + overlapp) for _, end in biter]
+
+    def dekod(i):
+        t = time.time()
+        resultat = backend.transkriber(lyd[dekodet_fra[i]:dekodet_til[i]], word_timestamps=word_timestamps)
+        logger.info(f"Chunk {i + 1}/{len(biter)} ({(dekodet_til[i] - dekodet_fra[i]) / sr:.0f}s audio) "
+                    f"decoded in {time.time() - t:.1f}s")
+        return resultat
+
+    arbeidere = max(1, min(arbeidere, backend.maks_parallell, len(biter)))
+    if arbeidere == 1:
+        resultater = [dekod(i) for i in range(len(biter))]
+    else:
+        with ThreadPoolExecutor(arbeidere) as pool:
+            resultater = list(pool.map(dekod, range(len(biter))))
+
+    return sy_sammen(resultater, biter, dekodet_fra, sr)
@@ -0,0 +1,350 @@
+"""
+Blob Storage Library for Transcription Service
+Shared access layer for Azure Blob Storage: one pooled BlobServiceClient per
+connection string and container, listing with metadata in the same call,
+streaming downloads and per-operation request counters.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+
+try:
+    from .http_lib import HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_READ_TIMEOUT
+except ImportError:
+    from http_lib import HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Nedlastingsinnstillinger: parallelle range-forespørsler, størrelse per forespørsel,
+# og hvor ofte fremdriften lagres slik at en avbrutt nedlasting kan fortsette
+BLOB_DOWNLOAD_CONCURRENCY = int(os.getenv("BLOB_DOWNLOAD_CONCURRENCY", "4"))
+BLOB_DOWNLOAD_CHUNK_SIZE = int(os.getenv("BLOB_DOWNLOAD_CHUNK_MB", "8")) * 1024 * 1024
+BLOB_DOWNLOAD_SEGMENT_SIZE = int(os.getenv("BLOB_DOWNLOAD_SEGMENT_MB", "256")) * 1024 * 1024
+
+# Varighet på blob-lease (15-60 sekunder i Azure). Leasen fornyes jevnlig så lenge noden
+# jobber med filen, og utløper av seg selv hvis noden krasjer.
+BLOB_LEASE_SECONDS = int(os.getenv("BLOB_LEASE_SECONDS", "60"))
+
+_lagre = {}
+_lagre_lock = threading.Lock()
+
+
+def _operasjon(method: str, url: str) -> str:
+    """Maps an HTTP request against Blob Storage to a readable operation name"""
+    query = parse_qs(urlparse(url).query)
+    comp = query.get("comp", [None])[0]
+
+    if comp == "list":
+        return "list"
+    if comp:
+        return comp
+    if method == "HEAD":
+        return "properties"
+    if method == "GET":
+        return "download"
+    if method == "DELETE":
+        return "delete"
+    if method == "PUT":
+        return "upload"
+    return method.lower()
+
+
+class BlobLager:
+    """
+    Pooled access to one blob container.
+
+    All operations share a single BlobServiceClient, so the HTTP connection pool and
+    TLS sessions are reused across files. Every HTTP request (including retries)
+    is counted per operation in self.teller, and throttled (429/503) or failed (5xx)
+    responses in self.strupet and self.feilsvar. Timeouts and the retry count come from
+    the shared HTTP settings; the SDK's own retry policy adds jitter and honours Retry-After.
+
+    Args:
+        connection_string: Azure Storage connection string
+        container_name: Container holding the uploaded recordings
+    """
+
+    def __init__(self, connection_string: str, container_name: str):
+        self.container_name = container_name
+        self.teller = Counter()
+        self.strupet = Counter()
+        self.feilsvar = Counter()
+        self._teller_lock = threading.Lock()
+
+        self.service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_single_get_size=BLOB_DOWNLOAD_CHUNK_SIZE,
+            max_chunk_get_size=BLOB_DOWNLOAD_CHUNK_SIZE,
+            raw_request_hook=self._tell,
+            raw_response_hook=self._tell_svar,
+            connection_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            retry_total=HTTP_MAX_RETRIES,
+        )
+        self.container_client = self.service_client.get_container_client(container_name)
+
+        # Blobs denne noden har gjort krav på, med tilhørende lease
+        self._leases = {}
+        self._lease_lock = threading.Lock()
+        self._fornyer = None
+        self._stopp = threading.Event()
+
+    def _tell(self, request):
+        operasjon = _operasjon(request.http_request.method, request.http_request.url)
+        with self._teller_lock:
+            self.teller[operasjon] += 1
+
+    def _tell_svar(self, response):
+        status = response.http_response.status_code
+        if status < 500 and status != 429:
+            return
+        operasjon = _operasjon(response.http_request.method, response.http_request.url)
+        with self._teller_lock:
+            if status in (429, 503):
+                self.strupet[operasjon] += 1
+            else:
+                self.feilsvar[operasjon] += 1
+
+    def blob_client(self, blob_name: str):
+        return self.container_client.get_blob_client(blob_name)
+
+    def list_blobs(self) -> List[Dict]:
+        """
+        List all blobs with metadata, size and ETag in a single (paged) list call.
+
+        Returns:
+            list: One dict per blob {'name', 'size', 'etag', 'metadata', 'created'}
+        """
+        blobs = []
+        for blob in self.container_client.list_blobs(include=["metadata"]):
+            blobs.append({
+                "name": blob.name,
+                "size": blob.size,
+                "etag": blob.etag,
+                "metadata": blob.metadata or {},
+                "created": blob.creation_time,
+            })
+        return blobs
+
+    def hent_blob(self, blob_name: str) -> Optional[Dict]:
+        """
+        Properties of one blob in the same form as list_blobs(), for blobs named by an event.
+
+        Returns:
+            dict: {'name', 'size', 'etag', 'metadata', 'created'}, or None if the blob is gone
+        """
+        try:
+            blob = self.blob_client(blob_name).get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        return {
+            "name": blob_name,
+            "size": blob.size,
+            "etag": blob.etag,
+            "metadata": blob.metadata or {},
+            "created": blob.creation_time,
+        }
+
+    def get_metadata(self, blob_name: str) -> Dict:
+        return self.blob_client(blob_name).get_blob_properties().metadata
+
+    def delete(self, blob_name: str):
+        with self._lease_lock:
+            lease = self._leases.pop(blob_name, None)
+        try:
+            self.blob_client(blob_name).delete_blob(lease=lease)
+        except ResourceNotFoundError:
+            logger.warning(f"Blob {blob_name} was already deleted")
+        except Exception:
+            # Behold leasen så den kan frigis eller fornyes når slettingen feiler
+            if lease is not None:
+                with self._lease_lock:
+                    self._leases.setdefault(blob_name, lease)
+            raise
+
+    def claim(self, blob_name: str, etag: Optional[str] = None) -> bool:
+        """
+        Claim a blob for this node by acquiring a lease on it.
+
+        The lease is renewed in the background until the blob is deleted or released,
+        so other nodes skip it while it is being processed. If this node crashes the
+        lease expires after BLOB_LEASE_SECONDS and the blob can be claimed again.
+
+        Args:
+            blob_name: Name of the blob
+            etag: ETag from the listing; the claim fails if the blob changed since then
+
+        Returns:
+            bool: True if this node now owns the blob, False if another node has it
+                or it no longer exists
+        """
+        kwargs = {}
+        if etag:
+            kwargs = {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+
+        try:
+            lease = self.blob_client(blob_name).acquire_lease(lease_duration=BLOB_LEASE_SECONDS, **kwargs)
+        except (ResourceNotFoundError, ResourceModifiedError):
+            return False
+        except HttpResponseError as e:
+            if e.status_code == 409:
+                return False
+            raise
+
+        with self._lease_lock:
+            self._leases[blob_name] = lease
+            if self._fornyer is None:
+                self._fornyer = threading.Thread(target=self._forny_leaser, name="blob-lease-fornyer", daemon=True)
+                self._fornyer.start()
+        return True
+
+    def release(self, blob_name: str):
+        """Give up the claim on a blob so another node (or a later run) can pick it up"""
+        with self._lease_lock:
+            lease = self._leases.pop(blob_name, None)
+        if lease is None:
+            return
+        try:
+            lease.release()
+        except HttpResponseError as e:
+            logger.warning(f"Could not release lease on {blob_name}: {e}")
+
+    def _forny_leaser(self):
+        while not self._stopp.wait(BLOB_LEASE_SECONDS / 3):
+            with self._lease_lock:
+                leases = list(self._leases.items())
+            for blob_name, lease in leases:
+                try:
+                    lease.renew()
+                except HttpResponseError as e:
+                    with self._lease_lock:
+                        # Slettet eller frigitt mens vi fornyet - ikke en feil
+                        if self._leases.get(blob_name) is not lease:
+                            continue
+                        del self._leases[blob_name]
+                    logger.error(f"Lost lease on {blob_name}: {e}")
+
+    def download(self, blob_name: str, download_file_path: str,
+                 size: Optional[int] = None, etag: Optional[str] = None) -> int:
+        """
+        Stream a blob to disk in segments using parallel range requests.
+
+        Data is written to a .part file that is moved into place atomically when the
+        download completes, so memory use does not depend on the file size. Progress is
+        saved after every completed segment, and an interrupted download resumes from the
+        last completed segment as long as the blob is unchanged (same ETag).
+
+        Args:
+            blob_name: Name of the blob
+            download_file_path: Final local path
+            size: Blob size from the listing (avoids a separate properties request)
+            etag: Blob ETag from the listing
+
+        Returns:
+            int: Number of bytes downloaded in this call
+        """
+        blob_client = self.blob_client(blob_name)
+
+        if size is None or etag is None:
+            properties = blob_client.get_blob_properties()
+            size = properties.size
+            etag = properties.etag
+
+        part_path = download_file_path + ".part"
+        fremdrift_path = part_path + ".json"
+
+        offset = _les_fremdrift(fremdrift_path, etag) if os.path.exists(part_path) else 0
+        if offset:
+            logger.info(f"Resuming download of {blob_name} at {offset/1024/1024:.1f} of {size/1024/1024:.1f} MB")
+        else:
+            logger.info(f"Downloading blob to: {download_file_path}")
+
+        start_time = time.time()
+        start_offset = offset
+        with open(part_path, "r+b" if offset else "wb") as download_file:
+            while offset < size:
+                length = min(BLOB_DOWNLOAD_SEGMENT_SIZE, size - offset)
+                download_file.seek(offset)
+                downloader = blob_client.download_blob(
+                    offset=offset,
+                    length=length,
+                    max_concurrency=BLOB_DOWNLOAD_CONCURRENCY,
+                    etag=etag,
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                downloader.readinto(download_file)
+                download_file.flush()
+                os.fsync(download_file.fileno())
+
+                offset += length
+                _skriv_fremdrift(fremdrift_path, etag, offset)
+
+            download_file.truncate(size)
+
+        os.replace(part_path, download_file_path)
+        if os.path.exists(fremdrift_path):
+            os.remove(fremdrift_path)
+
+        duration = time.time() - start_time
+        rate = (size - start_offset) / 1024 / 1024 / duration if duration > 0 else 0
+        logger.info(f"Blob {blob_name} downloaded to {download_file_path} ({size/1024/1024:.1f} MB, {rate:.1f} MB/s)")
+        return size - start_offset
+
+    def nullstill_teller(self):
+        with self._teller_lock:
+            self.teller.clear()
+            self.strupet.clear()
+            self.feilsvar.clear()
+
+    def rapport(self) -> str:
+        """One-line summary of HTTP requests per operation, with throttled and failed responses"""
+        with self._teller_lock:
+            if not self.teller:
+                return "ingen forespørsler"
+            deler = [f"{operasjon}={antall}" for operasjon, antall in sorted(self.teller.items())]
+            linje = f"{sum(self.teller.values())} totalt ({', '.join(deler)})"
+            for navn, teller in (("strupet", self.strupet), ("5xx", self.feilsvar)):
+                if teller:
+                    deler = [f"{operasjon}={antall}" for operasjon, antall in sorted(teller.items())]
+                    linje += f", {navn}: {', '.join(deler)}"
+            return linje
+
+
+def hent_blob_lager(connection_string: str, container_name: str) -> BlobLager:
+    """
+    Return the shared BlobLager for a connection string and container, creating it on first use.
+    """
+    key = (connection_string, container_name)
+    with _lagre_lock:
+        if key not in _lagre:
+            _lagre[key] = BlobLager(connection_string, container_name)
+        return _lagre[key]
+
+
+def _les_fremdrift(fremdrift_path, etag):
+    """Returnerer antall ferdige bytes fra en tidligere avbrutt nedlasting av samme blob-versjon"""
+    try:
+        with open(fremdrift_path, "r", encoding="utf-8") as f:
+            fremdrift = json.load(f)
+        if fremdrift.get("etag") == etag:
+            return int(fremdrift.get("offset", 0))
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _skriv_fremdrift(fremdrift_path, etag, offset):
+    tmp_path = fremdrift_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"etag": etag, "offset": offset}, f)
+    os.replace(tmp_path, fremdrift_path)
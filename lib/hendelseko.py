@@ -0,0 +1,188 @@
+"""
+Event Queue Library for Transcription Service
+Blob-created events from Event Grid, delivered to an Azure Storage Queue. In daemon mode the
+service waits on the queue instead of listing the container, so a new recording is picked up
+within seconds and an idle node makes no list calls.
+
+Messages are received with a visibility timeout and deleted only once their blob is handled.
+If a node dies mid-run, the messages become visible again and are picked up by the restarted
+node or by another node reading the same queue.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.queue import QueueClient
+
+try:
+    from .http_lib import HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_READ_TIMEOUT
+except ImportError:
+    from http_lib import HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Køen Event Grid leverer BlobCreated-hendelser til (tom = ingen hendelser, daemon-modus lister containeren)
+EVENT_QUEUE = os.getenv("HUGIN_EVENT_QUEUE", "")
+# Hvor lenge en mottatt melding er usynlig for andre mottakere; bør dekke en hel runde
+QUEUE_VISIBILITY_SECONDS = int(os.getenv("HUGIN_QUEUE_VISIBILITY_SECONDS", "900"))
+# Lengste pause mellom tomme kall mot køen mens den venter (ventetiden dobles opp til dette)
+QUEUE_MAX_IDLE_SECONDS = float(os.getenv("HUGIN_QUEUE_MAX_IDLE_SECONDS", "5"))
+
+BLOB_CREATED = "Microsoft.Storage.BlobCreated"
+MAKS_MELDINGER = 32  # Azure gir maks 32 meldinger per kall
+
+_koer = {}
+_koer_lock = threading.Lock()
+
+
+def tolk_melding(innhold: str, container_name: str) -> Optional[str]:
+    """
+    Blob name from an Event Grid BlobCreated event in a queue message.
+
+    Event Grid writes the event as base64-encoded JSON; plain JSON is accepted too. Both the
+    Event Grid schema (eventType) and the CloudEvents schema (type) are understood.
+
+    Args:
+        innhold: Message text as stored in the queue
+        container_name: Only events for blobs in this container are used
+
+    Returns:
+        str: Blob name, or None if the message is not a BlobCreated event for the container
+    """
+    try:
+        tekst = base64.b64decode(innhold, validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        tekst = innhold
+    try:
+        hendelse = json.loads(tekst)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(hendelse, list):
+        hendelse = hendelse[0] if len(hendelse) == 1 else None
+    if not isinstance(hendelse, dict):
+        return None
+
+    if (hendelse.get("eventType") or hendelse.get("type")) != BLOB_CREATED:
+        return None
+    prefiks = f"/blobServices/default/containers/{container_name}/blobs/"
+    subject = hendelse.get("subject") or ""
+    if not subject.startswith(prefiks) or len(subject) == len(prefiks):
+        return None
+    return subject[len(prefiks):]
+
+
+class Hendelseko:
+    """
+    Blob-created events for one container, read from an Azure Storage Queue.
+
+    Args:
+        connection_string: Azure Storage connection string for the account holding the queue
+        queue_name: Queue the Event Grid subscription delivers to
+        container_name: Container holding the uploaded recordings
+        synlighet: Visibility timeout in seconds for received messages
+    """
+
+    def __init__(self, connection_string: str, queue_name: str, container_name: str,
+                 synlighet: int = QUEUE_VISIBILITY_SECONDS):
+        self.container_name = container_name
+        self.synlighet = synlighet
+        self.teller = Counter()
+        self.queue_client = QueueClient.from_connection_string(
+            connection_string,
+            queue_name,
+            connection_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            retry_total=HTTP_MAX_RETRIES,
+        )
+
+    def opprett(self):
+        """Create the queue if it does not exist"""
+        try:
+            self.queue_client.create_queue()
+        except ResourceExistsError:
+            pass
+
+    def motta(self) -> Dict[str, List]:
+        """
+        One receive call: up to 32 messages, hidden for the visibility timeout.
+
+        Messages that are not BlobCreated events for the container are deleted right away.
+
+        Returns:
+            dict: {blob name: [QueueMessage, ...]} (several uploads of one blob share an entry)
+        """
+        hendelser = {}
+        self.teller["mottak"] += 1
+        for melding in self.queue_client.receive_messages(messages_per_page=MAKS_MELDINGER,
+                                                          max_messages=MAKS_MELDINGER,
+                                                          visibility_timeout=self.synlighet):
+            navn = tolk_melding(melding.content, self.container_name)
+            if navn is None:
+                logger.debug(f"Ignorerer melding {melding.id}: ikke BlobCreated for {self.container_name}")
+                self.teller["ignorert"] += 1
+                self.slett([melding])
+                continue
+            self.teller["hendelser"] += 1
+            hendelser.setdefault(navn, []).append(melding)
+        return hendelser
+
+    def vent(self, maks_vent: float, stopp: Optional[threading.Event] = None) -> Dict[str, List]:
+        """
+        Long-poll: receive until there are events, maks_vent seconds have passed or stopp is set.
+
+        Azure Storage Queues answer at once, so empty receives are repeated with a pause that
+        starts at 0.5 s and doubles up to QUEUE_MAX_IDLE_SECONDS.
+
+        Returns:
+            dict: {blob name: [QueueMessage, ...]}, empty if nothing arrived in time
+        """
+        frist = time.time() + maks_vent
+        pause = 0.5
+        while True:
+            hendelser = self.motta()
+            igjen = frist - time.time()
+            if hendelser or igjen <= 0:
+                return hendelser
+            if stopp is not None:
+                if stopp.wait(min(pause, igjen)):
+                    return {}
+            else:
+                time.sleep(min(pause, igjen))
+            pause = min(pause * 2, QUEUE_MAX_IDLE_SECONDS)
+
+    def slett(self, meldinger: List):
+        """Delete handled messages (already deleted or re-received by another node is not an error)"""
+        for melding in meldinger:
+            try:
+                self.queue_client.delete_message(melding)
+                self.teller["slettet"] += 1
+            except ResourceNotFoundError:
+                logger.debug(f"Melding {melding.id} er allerede slettet")
+            except HttpResponseError as e:
+                # Jobben varte lenger enn synlighetstiden og meldingen er levert på nytt med ny pop receipt
+                if e.status_code != 400 and getattr(e, "error_code", None) != "PopReceiptMismatch":
+                    raise
+                logger.debug(f"Melding {melding.id} er mottatt på nytt av en annen mottaker")
+
+    def rapport(self) -> str:
+        return (f"{self.teller['mottak']} mottak, {self.teller['hendelser']} hendelser, "
+                f"{self.teller['ignorert']} ignorert, {self.teller['slettet']} slettet")
+
+
+def hent_hendelseko(connection_string: str, queue_name: str, container_name: str) -> Hendelseko:
+    """
+    Return the shared Hendelseko for a queue and container, creating it on first use.
+    """
+    key = (connection_string, queue_name, container_name)
+    with _koer_lock:
+        if key not in _koer:
+            _koer[key] = Hendelseko(connection_string, queue_name, container_name)
+        return _koer[key]
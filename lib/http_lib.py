@@ -0,0 +1,237 @@
+"""
+HTTP Library for Transcription Service
+Shared HTTP layer for the Microsoft Graph calls: connect and read timeouts, retries with
+jittered exponential backoff, Retry-After handling for HTTP 429/503, and a token-bucket
+limiter per endpoint class (upload, invite, sendMail) so a full batch of files does not
+trip tenant throttling in the first place. Retries and throttling are counted per endpoint.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+try:
+    from .metrikker import GRAPH_SEKUNDER
+except ImportError:
+    from metrikker import GRAPH_SEKUNDER
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+# Ventetid før nytt forsøk: tilfeldig mellom 0 og BACKOFF * 2^forsøk (full jitter), maks MAX_BACKOFF.
+# Retry-After fra serveren går foran, men begrenses også av MAX_BACKOFF.
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "1"))
+HTTP_MAX_BACKOFF_SECONDS = float(os.getenv("HTTP_MAX_BACKOFF_SECONDS", "120"))
+
+# Forespørsler per sekund per endepunktklasse (0 = ubegrenset), og hvor mange som kan gå i én støt
+GRAPH_RATE_UPLOAD = float(os.getenv("GRAPH_RATE_UPLOAD", "4"))
+GRAPH_RATE_INVITE = float(os.getenv("GRAPH_RATE_INVITE", "4"))
+GRAPH_RATE_SENDMAIL = float(os.getenv("GRAPH_RATE_SENDMAIL", "1"))
+GRAPH_RATE_BURST = int(os.getenv("GRAPH_RATE_BURST", "5"))
+
+# Endepunkt -> klasse med felles kvote
+ENDEPUNKTKLASSER = {
+    "upload": "upload",
+    "upload-chunk": "upload",
+    "createUploadSession": "upload",
+    "invite": "invite",
+    "createLink": "invite",
+    "sendMail": "sendMail",
+}
+
+_PROV_IGJEN = {429, 500, 502, 503, 504}
+_STRUPET = {429, 503}
+
+
+class Tokenbotte:
+    """
+    Token-bucket rate limiter.
+
+    Args:
+        rate: Tokens added per second (0 = unlimited)
+        kapasitet: Maximum tokens, i.e. how many requests may go out back to back
+    """
+
+    def __init__(self, rate: float, kapasitet: int = GRAPH_RATE_BURST):
+        self.rate = rate
+        self.kapasitet = max(1, kapasitet)
+        self._tokens = float(self.kapasitet)
+        self._sist = time.monotonic()
+        self._lock = threading.Lock()
+
+    def ta(self, antall: int = 1) -> float:
+        """
+        Take tokens, waiting until they are available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+        ventet = 0.0
+        while True:
+            with self._lock:
+                naa = time.monotonic()
+                self._tokens = min(self.kapasitet, self._tokens + (naa - self._sist) * self.rate)
+                self._sist = naa
+                # Mer enn kapasiteten på én gang slipper gjennom når bøtta er full
+                behov = min(antall, self.kapasitet)
+                if self._tokens >= behov:
+                    self._tokens -= antall
+                    return ventet
+                vent = (behov - self._tokens) / self.rate
+            time.sleep(vent)
+            ventet += vent
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    verdi = response.headers.get("Retry-After")
+    if not verdi:
+        return None
+    try:
+        return max(0.0, float(verdi))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(verdi).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def ventetid(forsok: int, server_ventetid: Optional[float] = None) -> float:
+    """Backoff before retry number forsok (0-based): Retry-After if given, else full-jitter exponential"""
+    if server_ventetid is not None:
+        return min(HTTP_MAX_BACKOFF_SECONDS, server_ventetid + random.uniform(0, HTTP_BACKOFF_SECONDS))
+    return random.uniform(0, min(HTTP_MAX_BACKOFF_SECONDS, HTTP_BACKOFF_SECONDS * 2 ** forsok))
+
+
+def _ikke_sendt(e: requests.RequestException) -> bool:
+    """True if the connection was never opened, so the server cannot have received the request"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    return isinstance(getattr(e.args[0], "reason", None), NewConnectionError) if e.args else False
+
+
+class HttpKlient:
+    """
+    Pooled requests.Session with timeouts, retries and per-endpoint-class rate limits.
+
+    Responses with 429, 500, 502, 503 or 504 and connection errors are retried up to
+    HTTP_MAX_RETRIES times. POST requests are only retried when the server cannot
+    have acted on them (429/503, or the connection could not be opened), so an email
+    is never sent twice.
+
+    Args:
+        pool_size: Maximum pooled connections per host
+        rater: Requests per second per endpoint class (defaults to the GRAPH_RATE_* settings)
+    """
+
+    def __init__(self, pool_size: int = 8, rater: Optional[Dict[str, float]] = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if rater is None:
+            rater = {"upload": GRAPH_RATE_UPLOAD, "invite": GRAPH_RATE_INVITE, "sendMail": GRAPH_RATE_SENDMAIL}
+        self.botter = {klasse: Tokenbotte(rate) for klasse, rate in rater.items()}
+
+        self.teller = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def _tell(self, endepunkt: str, hva: str, antall: float = 1):
+        with self._lock:
+            self.teller[endepunkt][hva] += antall
+
+    def begrens(self, endepunkt: str, antall: int = 1):
+        """Wait for the endpoint class quota (used directly for sub-requests inside a $batch)"""
+        botte = self.botter.get(ENDEPUNKTKLASSER.get(endepunkt))
+        if botte:
+            ventet = botte.ta(antall)
+            if ventet:
+                self._tell(endepunkt, "begrenset")
+                self._tell(endepunkt, "ventet_s", ventet)
+
+    def request(self, method: str, url: str, endepunkt: str, forsok: int = HTTP_MAX_RETRIES + 1,
+                **kwargs) -> requests.Response:
+        """
+        Send a request with rate limiting, timeouts and retries.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            endepunkt: Endpoint name for rate limiting and counters (e.g. 'invite')
+            forsok: Maximum attempts (1 disables retries, e.g. when the caller resumes by itself)
+
+        Returns:
+            requests.Response: The last response, which may still be an error status
+
+        Raises:
+            requests.RequestException: If the last attempt failed without a response
+        """
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        kan_gjentas = method.upper() != "POST"
+        data = kwargs.get("data")
+        start = data.tell() if hasattr(data, "seek") else None
+
+        for n in range(forsok):
+            self.begrens(endepunkt)
+            self._tell(endepunkt, "foresporsler")
+            start_tid = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                GRAPH_SEKUNDER.observer(time.monotonic() - start_tid, endepunkt=endepunkt)
+                if n + 1 >= forsok or not (kan_gjentas or _ikke_sendt(e)):
+                    self._tell(endepunkt, "feilet")
+                    raise
+                vent = ventetid(n)
+                logger.warning(f"{endepunkt}: {type(e).__name__}, nytt forsøk om {vent:.1f}s")
+            else:
+                GRAPH_SEKUNDER.observer(time.monotonic() - start_tid, endepunkt=endepunkt)
+                status = response.status_code
+                if status not in _PROV_IGJEN or n + 1 >= forsok or not (kan_gjentas or status in _STRUPET):
+                    if status >= 400:
+                        self._tell(endepunkt, "feilet")
+                    return response
+                if status in _STRUPET:
+                    self._tell(endepunkt, "strupet")
+                vent = ventetid(n, retry_after(response))
+                logger.warning(f"{endepunkt}: HTTP {status}, nytt forsøk om {vent:.1f}s")
+                response.close()
+
+            self._tell(endepunkt, "nye_forsok")
+            # En strøm (f.eks. en fil) må spoles tilbake før den sendes på nytt
+            if start is not None:
+                data.seek(start)
+            time.sleep(vent)
+
+    def nullstill_teller(self):
+        with self._lock:
+            self.teller.clear()
+
+    def rapport(self) -> List[str]:
+        """Per-endpoint retry and throttling counters as report lines (only endpoints with any)"""
+        linjer = []
+        with self._lock:
+            for endepunkt, t in sorted(self.teller.items()):
+                if not (t["nye_forsok"] or t["strupet"] or t["begrenset"] or t["feilet"]):
+                    continue
+                linjer.append(
+                    f"   • {endepunkt}: {t['foresporsler']} forespørsler, {t['nye_forsok']} nye forsøk, "
+                    f"{t['strupet']} strupet (429/503), {t['feilet']} feilet, "
+                    f"ventet {t['ventet_s']:.1f}s på kvote ({t['begrenset']} ganger)"
+                )
+        return linjer
@@ -1,23 +1,18 @@
+import importlib
+import io
 import os
 import logging
 import time
 import json
 import warnings
 import dotenv
-import requests
-import ffmpeg
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
-from transformers import pipeline
-from docx import Document
-import mlx.core as mx
-import mlx_whisper
 try:
-    from .transkripsjon_sp_lib import hentToken
-    from .ai_tools import generate_meeting_summary, is_ollama_available
+    from .transkripsjon_sp_lib import delMedBruker, lastOppFil, sendEpost, sendEposter, slettFil
+    from .blob_lib import hent_blob_lager
 except ImportError:
-    from transkripsjon_sp_lib import hentToken
-    from ai_tools import generate_meeting_summary, is_ollama_available
+    from transkripsjon_sp_lib import delMedBruker, lastOppFil, sendEpost, sendEposter, slettFil
+    from blob_lib import hent_blob_lager
 
 # Ensure ffmpeg is in PATH
 os.environ['PATH'] = '/opt/homebrew/bin:' + os.environ.get('PATH', '')
@@ -28,88 +23,123 @@ warnings.filterwarnings("ignore")
 # Konfigurer logging
 logger = logging.getLogger(__name__)
 
+# Opptak lengre enn dette deles opp ved pauser og transkriberes bit for bit (0 slår av oppdeling)
+CHUNKED_MIN_MINUTES = float(os.getenv("HUGIN_CHUNKED_MIN_MINUTES", "30"))
+
+# Ollama-modell for sammendrag
+SUMMARY_MODEL = os.getenv("OLLAMA_MODEL", "gpt-oss:20b")
+
+
+# Tunge moduler (numpy, talegjenkjenning, Ollama, ffmpeg-python, python-docx) lastes først når de brukes,
+# slik at en runde som bare lister containeren og ikke finner noe, kun laster Azure-klienten
+_LATE_NAVN = {
+    "SAMPLE_RATE": "lyd", "last_lyd": "lyd",
+    "CHUNK_SECONDS": "asr_backends", "CHUNK_OVERLAP_SECONDS": "asr_backends", "MODEL_PATH": "asr_backends",
+    "hent_backend": "asr_backends", "transkriber_i_biter": "asr_backends",
+    "generate_meeting_summary": "ai_tools", "is_ollama_available": "ai_tools", "warm_up_model": "ai_tools",
+    "innholdsnokkel": "transkripsjonscache",
+}
 
-# Funksjoner
-def download_blob(AZURE_STORAGE_CONNECTION_STRING, container_name, blob_name, download_file_path):
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
 
-    print("Downloading blob to: " + download_file_path)
+def _lib(navn):
+    """Import a sibling module in lib/ on first use (relative in the package, top-level when lib/ is on sys.path)"""
+    return importlib.import_module(f"{__package__}.{navn}" if __package__ else navn)
 
-    with open(download_file_path, "wb") as download_file:
-        download_file.write(blob_client.download_blob().readall())
-    print(f"Blob {blob_name} successfully downloaded to {download_file_path}")
+
+def __getattr__(navn):
+    # htl.SAMPLE_RATE, htl.warm_up_model osv. virker som før, men modulen importeres ved første oppslag
+    if navn in _LATE_NAVN:
+        return getattr(_lib(_LATE_NAVN[navn]), navn)
+    raise AttributeError(f"module {__name__!r} has no attribute {navn!r}")
+
+
+# Funksjoner
+# Blob-operasjonene går via en felles BlobLager (én klient og ett tilkoblingsbasseng per kjøring)
+def download_blob(AZURE_STORAGE_CONNECTION_STRING, container_name, blob_name, download_file_path, size=None, etag=None):
+    lager = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, container_name)
+    return lager.download(blob_name, download_file_path, size=size, etag=etag)
 
 # Functioon to list all blobs in a container
 def list_blobs(AZURE_STORAGE_CONNECTION_STRING, container_name) -> list:
-    filnavn = []
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    container_client = blob_service_client.get_container_client(container_name)
+    return [blob["name"] for blob in list_blobs_with_metadata(AZURE_STORAGE_CONNECTION_STRING, container_name)]
+
+# List all blobs with metadata, size and ETag in one list call
+def list_blobs_with_metadata(AZURE_STORAGE_CONNECTION_STRING, container_name) -> list:
+    lager = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, container_name)
     print("Listing blobs...")
-    for blob in container_client.list_blobs():
-        print(blob.name)
-        filnavn.append(blob.name)
-    return filnavn
+    blobs = lager.list_blobs()
+    for blob in blobs:
+        print(blob["name"])
+    return blobs
 
 # Get metadata of a blob
 def get_blob_metadata(AZURE_STORAGE_CONNECTION_STRING, container_name, blob_name):
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-    print("Blob metadata: " + str(blob_client.get_blob_properties().metadata))
-    # metadata.append(blob_client.get_blob_properties().metadata)
-    return blob_client.get_blob_properties().metadata
+    metadata = hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, container_name).get_metadata(blob_name)
+    print("Blob metadata: " + str(metadata))
+    return metadata
 
 # Delete downloaded blob
 def delete_blob(AZURE_STORAGE_CONNECTION_STRING, container_name, blob_name):
-    blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
     print("Deleting blob: " + blob_name)
-    blob_client.delete_blob()
+    hent_blob_lager(AZURE_STORAGE_CONNECTION_STRING, container_name).delete(blob_name)
     print("Blob deleted")
 
-# Konverterer video til lyd
-def konverter_til_lyd(filnavn, nytt_filnavn):
-    # Konverterer video til lyd
-    print(f'Konverterer {filnavn} til lyd.')
-    ffmpeg.input(filnavn).output(nytt_filnavn, acodec='pcm_s16le', format='wav').run(overwrite_output=True)
-    print(f'Konvertering ferdig. Lydfilen er lagret som {nytt_filnavn}')
+# Henter lydlengde i sekunder med ffprobe (None hvis den ikke kan leses)
+def lydvarighet(filnavn):
+    import ffmpeg
+    try:
+        return float(ffmpeg.probe(filnavn)["format"]["duration"])
+    except (ffmpeg.Error, KeyError, ValueError) as e:
+        logger.warning(f"Could not read audio duration for {filnavn}: {e}")
+        return None
 
-# Transkriber blob og lagrer i SRT-fil
-def transkriber(sti, filnavn, word_timestamps=False):
-        print(f'Transkriberer lyd fra {filnavn} til tekst. Obs: Dette er en tidkrevende prosess.')
-        print(f"🇳🇴 MLX Norwegian (Apple Silicon GPU)")
-        print("=" * 50)
+# Laster talegjenkjenningsmodellen inn i minnet slik at påfølgende transkripsjoner slipper lastetiden
+def last_modell():
+    _lib("asr_backends").hent_backend().last()
 
-        device = mx.default_device()
-        print(f"MLX Device: {device}")
 
-        start_time = time.time()
+# Avgjør om et opptak transkriberes i biter
+def skal_deles_opp(lyd):
+    return CHUNKED_MIN_MINUTES > 0 and len(lyd) / _lib("lyd").SAMPLE_RATE > CHUNKED_MIN_MINUTES * 60
 
-        # Transkriberer lydfilen med MLX Norwegian model
-        audio_path = sti + filnavn
 
-        # Use local nb-whisper-medium-mlx model
-        model_path = "./nb-whisper-medium-mlx"
-        if not os.path.exists(os.path.join(model_path, "config.json")):
-            print(f"❌ Local MLX model not found at {model_path}")
-            raise FileNotFoundError(f"Required MLX model not found at {model_path}")
+# Cachenøkkel for dekodet lyd: innholdet pluss modell og innstillinger som påvirker transkripsjonen
+def cache_nokkel(lyd, word_timestamps=False):
+    asr = _lib("asr_backends")
+    parametre = asr.hent_backend().parametre()
+    parametre["word_timestamps"] = word_timestamps
+    if skal_deles_opp(lyd):
+        parametre["chunk_seconds"] = asr.CHUNK_SECONDS
+        parametre["chunk_overlap_seconds"] = asr.CHUNK_OVERLAP_SECONDS
+    return _lib("transkripsjonscache").innholdsnokkel(lyd, parametre)
 
-        print(f"✅ Using local Norwegian MLX model: {model_path}")
 
-        transcribe_params = {
-            "path_or_hf_repo": model_path,
-            "language": "no",
-            "verbose": False,
-            "temperature": 0.0
-        }
+# Transkriber blob og lagrer i SRT-fil. lyd kan være ferdig dekodede 16 kHz mono-samples;
+# ellers dekodes filen direkte fra ffmpeg uten mellomliggende WAV-fil. utnavn er navnet
+# (uten filtype) på tekst- og SRT-filen i ./ferdig_tekst; standard er filnavnet frem til første punktum.
+def transkriber(sti, filnavn, word_timestamps=False, lyd=None, utnavn=None):
+        asr = _lib("asr_backends")
+        lydmodul = _lib("lyd")
+        backend = asr.hent_backend()
+        backend.last()
+        print(f'Transkriberer lyd fra {filnavn} til tekst. Obs: Dette er en tidkrevende prosess.')
+        print(f"🇳🇴 ASR backend: {backend.navn}")
+        print("=" * 50)
 
-        # Only add word_timestamps if True (for performance)
-        if word_timestamps:
-            transcribe_params["word_timestamps"] = True
+        start_time = time.time()
+        if lyd is None:
+            audio_path = sti + filnavn
+            lyd = lydmodul.last_lyd(audio_path, varighet=lydvarighet(audio_path))
+        varighet = len(lyd) / lydmodul.SAMPLE_RATE
 
-        print("Transcribing with Norwegian MLX model...")
+        # Lange opptak deles ved pauser slik at bitene kan dekodes hver for seg
         transcribe_start = time.time()
-        result = mlx_whisper.transcribe(audio_path, **transcribe_params)
+        if skal_deles_opp(lyd):
+            print(f"Transcribing {varighet/60:.1f} min in chunks...")
+            result = asr.transkriber_i_biter(backend, lyd, word_timestamps=word_timestamps)
+        else:
+            print("Transcribing...")
+            result = backend.transkriber(lyd, word_timestamps=word_timestamps)
         transcribe_time = time.time() - transcribe_start
 
         total_time = time.time() - start_time
@@ -117,12 +147,13 @@ def transkriber(sti, filnavn, word_timestamps=False):
 
         # Sørg for at utdata-mappe eksisterer
         os.makedirs("./ferdig_tekst", exist_ok=True)
+        utnavn = utnavn or filnavn.split('.')[0]
 
         # Always create text file
         full_text = result.get('text', '')
         tekst_data = [f"{full_text}\n"] if full_text else []
 
-        with open(f"./ferdig_tekst/{filnavn.split('.')[0]}.txt", 'w', encoding='utf-8') as f:
+        with open(f"./ferdig_tekst/{utnavn}.txt", 'w', encoding='utf-8') as f:
             f.write(''.join(tekst_data))
 
         # Only create SRT file if word_timestamps is True
@@ -161,12 +192,14 @@ def transkriber(sti, filnavn, word_timestamps=False):
                     srt_data.append(srt_string)
 
             # Skriver til SRT-fil
-            with open(f"./ferdig_tekst/{filnavn.split('.')[0]}.srt", 'w', encoding='utf-8') as f:
+            with open(f"./ferdig_tekst/{utnavn}.srt", 'w', encoding='utf-8') as f:
                 f.write('\n'.join(srt_data))
 
-            print(f'Transkripsjonen er lagret i ./ferdig_tekst/{filnavn.split(".")[0]}.srt og .txt')
+            print(f'Transkripsjonen er lagret i ./ferdig_tekst/{utnavn}.srt og .txt')
         else:
-            print(f'Transkripsjonen er lagret i ./ferdig_tekst/{filnavn.split(".")[0]}.txt')
+            print(f'Transkripsjonen er lagret i ./ferdig_tekst/{utnavn}.txt')
+
+        return result
 
 
 # Konverterer srt-fil til ren telst med kun tekst uten tidskoder og index
@@ -183,25 +216,28 @@ def srt_til_tekst(filnavn):
     os.makedirs("./oppsummeringer", exist_ok=True)
     
     # Skriv for hvert element i ren_tekst skriv en ny linje i en docx-fil
-    with open("./oppsummeringer/" + filnavn.split(".")[0] + ".txt", 'w', encoding='utf-8') as f:
+    with open("./oppsummeringer/" + os.path.splitext(filnavn)[0] + ".txt", 'w', encoding='utf-8') as f:
         f.write("".join(ren_tekst))
 
 
-def create_ai_summary(filnavn: str, model: str = "gpt-oss:20b") -> dict:
+def create_ai_summary(filnavn: str, model: str = SUMMARY_MODEL, stats: dict = None) -> dict:
     """
     Create AI-generated meeting summary using Ollama from transcribed text
 
     Args:
         filnavn: Base filename (without extension) of the transcribed file
         model: Ollama model to use for summarization
+        stats: Optional dict filled with token counts and timings (see generate_meeting_summary)
 
     Returns:
-        dict: Paths to generated summary files {'txt': path, 'docx': path} or empty dict if failed
+        dict: Path to the generated summary {'txt': path} or empty dict if failed
     """
     logger.info(f"Creating AI summary for {filnavn}")
 
+    ai_tools = _lib("ai_tools")
+
     # Check if Ollama is available
-    if not is_ollama_available(model):
+    if not ai_tools.is_ollama_available(model):
         logger.warning(f"Ollama model '{model}' not available, skipping AI summary")
         return {}
 
@@ -219,44 +255,98 @@ def create_ai_summary(filnavn: str, model: str = "gpt-oss:20b") -> dict:
             logger.warning(f"Transcribed text file is empty: {text_file_path}")
             return {}
 
-        # Generate summary using Ollama
+        # Generate summary using Ollama, streamed into the text file as it is generated
         logger.info(f"Generating summary using model: {model}")
-        summary_text = generate_meeting_summary(transcription_text, model)
+        os.makedirs("./oppsummeringer", exist_ok=True)
+        summary_txt_path = f"./oppsummeringer/{filnavn}_ai_sammendrag.txt"
+        summary_text = ai_tools.generate_meeting_summary(transcription_text, model, output_path=summary_txt_path, stats=stats)
 
         if not summary_text:
             logger.error("Failed to generate summary with Ollama")
+            if os.path.exists(summary_txt_path):
+                os.remove(summary_txt_path)
             return {}
 
-        # Ensure output directory exists
-        os.makedirs("./oppsummeringer", exist_ok=True)
+        return lagre_sammendrag(filnavn, summary_text)
 
-        # Save summary as text file
-        summary_txt_path = f"./oppsummeringer/{filnavn}_ai_sammendrag.txt"
-        with open(summary_txt_path, 'w', encoding='utf-8') as f:
-            f.write(summary_text)
+    except Exception as e:
+        logger.error(f"Error creating AI summary: {str(e)}")
+        return {}
+
+
+def lagre_sammendrag(filnavn: str, summary_text: str) -> dict:
+    """
+    Save a summary as text in ./oppsummeringer (the DOCX is built from it when publishing)
+
+    Args:
+        filnavn: Base filename (without extension) of the transcribed file
+        summary_text: Summary text, paragraphs separated by blank lines
+
+    Returns:
+        dict: Path to the summary file {'txt': path}
+    """
+    # Ensure output directory exists
+    os.makedirs("./oppsummeringer", exist_ok=True)
+
+    # Save summary as text file
+    summary_txt_path = f"./oppsummeringer/{filnavn}_ai_sammendrag.txt"
+    with open(summary_txt_path, 'w', encoding='utf-8') as f:
+        f.write(summary_text)
 
-        # Save summary as DOCX file
-        summary_docx_path = f"./oppsummeringer/{filnavn}_ai_sammendrag.docx"
-        doc = Document()
+    logger.info(f"AI summary saved to {summary_txt_path}")
 
+    return {
+        'txt': summary_txt_path
+    }
+
+
+def lag_docx(text: str, avsnitt: bool = False) -> bytes:
+    """
+    Build a DOCX document in memory
+
+    Args:
+        text: Document text
+        avsnitt: Split the text into paragraphs at blank lines (used for summaries)
+
+    Returns:
+        bytes: The DOCX file content, ready to upload
+    """
+    from docx import Document
+
+    doc = Document()
+    if avsnitt:
         # Split text into paragraphs for better formatting
-        paragraphs = summary_text.split('\n\n')
-        for paragraph in paragraphs:
+        for paragraph in text.split('\n\n'):
             if paragraph.strip():
                 doc.add_paragraph(paragraph.strip())
+    else:
+        doc.add_paragraph(text)
 
-        doc.save(summary_docx_path)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
 
-        logger.info(f"AI summary saved to {summary_txt_path} and {summary_docx_path}")
 
-        return {
-            'txt': summary_txt_path,
-            'docx': summary_docx_path
-        }
+_FEILMELDING = """Hei,
 
-    except Exception as e:
-        logger.error(f"Error creating AI summary: {str(e)}")
-        return {}
+Din transkripsjonsjobb er ferdig behandlet, men det oppstod et teknisk problem med å laste opp filen til SharePoint.
+
+Vennligst kontakt support for assistanse med å hente din transkriberte fil.
+
+Vi beklager uleiligheten.
+
+Med vennlig hilsen
+Hugin Transkripsjonstjeneste
+Telemark Fylkeskommune"""
+
+_PERSONVERN = """VIKTIG PERSONVERNHENSYN:
+Vær forsiktig med hvordan du bruker transkripsjonen videre i andre tjenester. Dersom transkripsjonen inneholder personopplysninger, må du følge gjeldende personvernregler og kun dele informasjonen med personer som har et tjenstlig behov for den.
+
+Takk for at du bruker transkripsjonstjenesten i Hugin.
+
+Med vennlig hilsen
+Hugin Transkripsjonstjeneste
+Telemark Fylkeskommune"""
 
 
 def sendNotificationWithSummary(upn: str, transcribed_files: dict, summary_files: dict, original_blob_name: str) -> bool:
@@ -265,21 +355,42 @@ def sendNotificationWithSummary(upn: str, transcribed_files: dict, summary_files
 
     Args:
         upn: User Principal Name (email) of the recipient
-        transcribed_files: Dict with transcription file paths {'docx': 'path/to/file.docx'}
-        summary_files: Dict with AI summary file paths {'docx': 'path/to/summary.docx'} (can be empty)
+        transcribed_files: Dict with the transcription DOCX {'docx': bytes, stream or file path}
+        summary_files: Dict with the AI summary DOCX {'docx': bytes, stream or file path} (can be empty)
         original_blob_name: Original blob filename for unique naming
 
     Returns:
         bool: True if email notification sent successfully
     """
+    lenker = last_opp_og_del(upn, transcribed_files, summary_files, original_blob_name)
+    if not lenker:
+        return False
+    return send_samlede_varsler({upn: [lenker]})[upn]
+
+
+def last_opp_og_del(upn: str, transcribed_files: dict, summary_files: dict, original_blob_name: str) -> dict:
+    """
+    Upload the transcription (and AI summary) to SharePoint and share them with the user, without sending email
+
+    Args:
+        upn: User Principal Name (email) of the recipient
+        transcribed_files: Dict with the transcription DOCX {'docx': bytes, stream or file path}
+        summary_files: Dict with the AI summary DOCX {'docx': bytes, stream or file path} (can be empty)
+        original_blob_name: Original blob filename for unique naming
+
+    Returns:
+        dict: {'navn': original_blob_name, 'transkripsjon': url, 'sammendrag': url or None}, or None if the upload failed.
+        A failed attempt is retried by the caller, so no error email is sent here (see send_feilvarsel)
+    """
     if not upn:
-        logger.error("UPN er påkrevd for sendNotificationWithSummary")
+        logger.error("UPN er påkrevd for last_opp_og_del")
         raise ValueError("UPN er påkrevd")
 
     if not transcribed_files.get('docx'):
-        logger.error("DOCX-fil er påkrevd for sendNotificationWithSummary")
+        logger.error("DOCX-fil er påkrevd for last_opp_og_del")
         raise ValueError("DOCX-fil er påkrevd")
 
+    opplastet = []
     try:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_filename = os.path.splitext(original_blob_name)[0]
@@ -288,97 +399,133 @@ def sendNotificationWithSummary(upn: str, transcribed_files: dict, summary_files
         trans_unique_filename = f"{base_filename}_transkripsjon_{timestamp}.docx"
         logger.info(f"Laster opp transkripsjon til SharePoint med navn: {trans_unique_filename}")
 
-        os.makedirs("./dokumenter", exist_ok=True)
-        trans_temp_path = f"./dokumenter/{trans_unique_filename}"
-
-        import shutil
-        shutil.copy2(transcribed_files['docx'], trans_temp_path)
-
-        transcription_url = _upload_to_sharepoint_custom(upn, trans_temp_path)
-
-        if os.path.exists(trans_temp_path):
-            os.remove(trans_temp_path)
+        trans_item = _last_opp_sharepoint(transcribed_files['docx'], trans_unique_filename)
 
-        if not transcription_url:
+        if not trans_item:
             logger.error("SharePoint opplasting av transkripsjon feilet")
-            return False
+            return None
+        opplastet.append(trans_item)
 
         # Upload AI summary file if available
-        summary_url = None
-        if summary_files.get('docx') and os.path.exists(summary_files['docx']):
+        summary_item = None
+        if summary_files.get('docx'):
             summary_unique_filename = f"{base_filename}_sammendrag_{timestamp}.docx"
             logger.info(f"Laster opp AI-sammendrag til SharePoint med navn: {summary_unique_filename}")
 
-            summary_temp_path = f"./dokumenter/{summary_unique_filename}"
-            shutil.copy2(summary_files['docx'], summary_temp_path)
+            summary_item = _last_opp_sharepoint(summary_files['docx'], summary_unique_filename)
 
-            summary_url = _upload_to_sharepoint_custom(upn, summary_temp_path)
+            if not summary_item:
+                logger.warning("SharePoint opplasting av sammendrag feilet - fortsetter uten sammendrag")
+            else:
+                opplastet.append(summary_item)
 
-            if os.path.exists(summary_temp_path):
-                os.remove(summary_temp_path)
+        # Tilgang og delingslenke for begge filene i én $batch
+        lenker = delMedBruker(upn, [trans_item] + ([summary_item] if summary_item else []))
+        summary_url = lenker[1] if summary_item else None
+        if summary_url:
+            logger.info(f"SharePoint opplasting av sammendrag vellykket: {summary_url}")
 
-            if summary_url:
-                logger.info(f"SharePoint opplasting av sammendrag vellykket: {summary_url}")
-            else:
-                logger.warning("SharePoint opplasting av sammendrag feilet - fortsetter uten sammendrag")
+        return {'navn': original_blob_name, 'transkripsjon': lenker[0], 'sammendrag': summary_url}
 
-        # Create email notification message with download links
+    except Exception as e:
+        logger.error(f"last_opp_og_del feilet for {upn}: {e}")
+        # Neste forsøk laster opp med nytt tidsstempel; filene fra dette forsøket skal ikke bli liggende
+        for item in opplastet:
+            try:
+                slettFil(item)
+            except Exception as slettefeil:
+                logger.warning(f"Kunne ikke slette {item.get('name')} fra SharePoint: {slettefeil}")
+        return None
+
+
+def send_feilvarsel(upn: str):
+    """Tell the user their recording could not be delivered (sent once, when the job has failed for good)"""
+    _send_error_notification(upn, _FEILMELDING)
+
+
+def lag_varsel(oppforinger: list) -> tuple:
+    """
+    Build the notification email for one or more finished recordings
+
+    Args:
+        oppforinger: Dicts from last_opp_og_del, one per recording
+
+    Returns:
+        tuple: (subject, message)
+    """
+    med_sammendrag = any(o.get('sammendrag') for o in oppforinger)
+
+    if len(oppforinger) == 1:
+        oppforing = oppforinger[0]
         email_message = f"""Hei,
 
 Din transkripsjonsjobb er nå ferdig behandlet.
 
 TRANSKRIPSJON:
 Du kan laste ned den transkriberte filen ved å klikke på lenken nedenfor:
-{transcription_url}"""
+{oppforing['transkripsjon']}"""
 
-        if summary_url:
+        if oppforing.get('sammendrag'):
             email_message += f"""
 
 AI-SAMMENDRAG:
 Du kan også laste ned et AI-generert sammendrag av møtet:
-{summary_url}"""
+{oppforing['sammendrag']}"""
 
-        email_message += """
+        email_subject = "Transkripsjon ferdig" + (" (med AI-sammendrag)" if med_sammendrag else "") + " - Hugin"
+    else:
+        email_message = f"""Hei,
 
-Filene er lagret trygt i SharePoint og kun du har tilgang til dem.
+{len(oppforinger)} av dine transkripsjonsjobber er nå ferdig behandlet. Du kan laste ned filene ved å klikke på lenkene nedenfor."""
 
-VIKTIG PERSONVERNHENSYN:
-Vær forsiktig med hvordan du bruker transkripsjonen videre i andre tjenester. Dersom transkripsjonen inneholder personopplysninger, må du følge gjeldende personvernregler og kun dele informasjonen med personer som har et tjenstlig behov for den.
+        for nr, oppforing in enumerate(oppforinger, 1):
+            email_message += f"""
 
-Takk for at du bruker transkripsjonstjenesten i Hugin.
+{nr}. {oppforing['navn']}
+TRANSKRIPSJON: {oppforing['transkripsjon']}"""
+            if oppforing.get('sammendrag'):
+                email_message += f"""
+AI-SAMMENDRAG: {oppforing['sammendrag']}"""
 
-Med vennlig hilsen
-Hugin Transkripsjonstjeneste
-Telemark Fylkeskommune"""
+        email_subject = f"{len(oppforinger)} transkripsjoner ferdig" + (" (med AI-sammendrag)" if med_sammendrag else "") + " - Hugin"
 
-        # Send email notification using Graph API
-        logger.info(f"Sender e-post via Graph API til {upn} med lenker")
-        email_subject = "Transkripsjon ferdig" + (" (med AI-sammendrag)" if summary_url else "") + " - Hugin"
-        email_success = _send_email_graph(upn, email_subject, email_message)
+    email_message += f"""
 
-        if email_success:
-            logger.info(f"E-post med SharePoint-lenker sendt til {upn}")
-        else:
-            logger.error(f"E-post sending feilet for {upn}")
+Filene er lagret trygt i SharePoint og kun du har tilgang til dem.
 
-        return email_success
+{_PERSONVERN}"""
 
-    except Exception as e:
-        logger.error(f"sendNotificationWithSummary feilet for {upn}: {e}")
-        # Send error notification as fallback
-        error_message = """Hei,
+    return email_subject, email_message
 
-Din transkripsjonsjobb er ferdig behandlet, men det oppstod et teknisk problem med å laste opp filen til SharePoint.
 
-Vennligst kontakt support for assistanse med å hente din transkriberte fil.
+def send_samlede_varsler(varsler: dict) -> dict:
+    """
+    Send one email per user listing all of that user's finished recordings
 
-Vi beklager uleiligheten.
+    Args:
+        varsler: {upn: [dict from last_opp_og_del, ...]}
 
-Med vennlig hilsen
-Hugin Transkripsjonstjeneste
-Telemark Fylkeskommune"""
-        _send_error_notification(upn, error_message)
-        return False
+    Returns:
+        dict: {upn: True if the email was sent}
+    """
+    eposter = []
+    for upn, oppforinger in varsler.items():
+        email_subject, email_message = lag_varsel(oppforinger)
+        logger.info(f"Sender e-post via Graph API til {upn} med lenker til {len(oppforinger)} opptak")
+        eposter.append((upn, email_subject, email_message))
+
+    try:
+        resultater = sendEposter(eposter)
+    except Exception as e:
+        logger.error(f"Failed to send email via Graph API: {e}")
+        resultater = [False] * len(eposter)
+
+    for (upn, _, _), ok in zip(eposter, resultater):
+        if ok:
+            logger.info(f"E-post med SharePoint-lenker sendt til {upn}")
+        else:
+            logger.error(f"E-post sending feilet for {upn}")
+    return {upn: ok for (upn, _, _), ok in zip(eposter, resultater)}
 
 
 def sendNotification(upn: str, transcribed_files: dict, original_blob_name: str) -> bool:
@@ -387,7 +534,7 @@ def sendNotification(upn: str, transcribed_files: dict, original_blob_name: str)
     
     Args:
         upn: User Principal Name (email) of the recipient
-        transcribed_files: Dict with file paths {'docx': 'path/to/file.docx'}
+        transcribed_files: Dict with the transcription DOCX {'docx': bytes, stream or file path}
         original_blob_name: Original blob filename for unique naming
     
     Returns:
@@ -409,39 +556,13 @@ def sendNotification(upn: str, transcribed_files: dict, original_blob_name: str)
         
         logger.info(f"Laster opp transkripsjon til SharePoint med navn: {unique_filename}")
         
-        # Temporarily copy the docx file with unique filename for SharePoint upload
-        docx_file_path = transcribed_files['docx']
-        temp_upload_path = f"./dokumenter/{unique_filename}"  # Use unique filename
-        
-        # Create dokumenter directory if it doesn't exist
-        os.makedirs("./dokumenter", exist_ok=True)
-        
-        # Copy the docx file to the expected path temporarily with unique name
-        import shutil
-        shutil.copy2(docx_file_path, temp_upload_path)
-        
         # Upload to SharePoint with custom filename
-        sharepoint_url = _upload_to_sharepoint_custom(upn, temp_upload_path)
-        
-        # Clean up temporary file
-        if os.path.exists(temp_upload_path):
-            os.remove(temp_upload_path)
+        sharepoint_url = _upload_to_sharepoint_custom(upn, transcribed_files['docx'], unique_filename)
         
         if not sharepoint_url:
             logger.error("SharePoint opplasting feilet")
             # Send error notification
-            error_message = """Hei,
-
-Din transkripsjonsjobb er ferdig behandlet, men det oppstod et teknisk problem med å laste opp filen til SharePoint.
-
-Vennligst kontakt support for assistanse med å hente din transkriberte fil.
-
-Vi beklager uleiligheten.
-
-Med vennlig hilsen
-Hugin Transkripsjonstjeneste
-Telemark Fylkeskommune"""
-            _send_error_notification(upn, error_message)
+            _send_error_notification(upn, _FEILMELDING)
             return False
         
         logger.info(f"SharePoint opplasting vellykket: {sharepoint_url}")
@@ -481,18 +602,7 @@ Telemark Fylkeskommune"""
     except Exception as e:
         logger.error(f"sendNotification feilet for {upn}: {e}")
         # Send error notification as fallback
-        error_message = """Hei,
-
-Din transkripsjonsjobb er ferdig behandlet, men det oppstod et teknisk problem med å laste opp filen til SharePoint.
-
-Vennligst kontakt support for assistanse med å hente din transkriberte fil.
-
-Vi beklager uleiligheten.
-
-Med vennlig hilsen
-Hugin Transkripsjonstjeneste
-Telemark Fylkeskommune"""
-        _send_error_notification(upn, error_message)
+        _send_error_notification(upn, _FEILMELDING)
         return False
 
 def _send_error_notification(upn: str, error_message: str):
@@ -508,113 +618,32 @@ def _send_error_notification(upn: str, error_message: str):
     except Exception as e:
         logger.error(f"Kunne ikke sende feilmelding til {upn}: {e}")
 
-def _upload_to_sharepoint_custom(upn: str, file_path: str) -> str:
+def _upload_to_sharepoint_custom(upn: str, kilde, file_name: str = None) -> str:
     """
-    Custom SharePoint upload function that uses the provided file path and filename
-    Upload files to SharePoint with custom file path support
+    Custom SharePoint upload function that takes the remote file name separately
+    Upload a file path, bytes or stream to SharePoint under file_name.
+    The permission invite and the sharing link are sent together in one Graph $batch.
     """
-    SHAREPOINT_SITE_URL = os.getenv('SHAREPOINT_SITE_URL')
-    DEFAULT_LIBRARY = os.getenv('DEFAULT_LIBRARY', 'Documents')
-    GRAPH_URL = "https://graph.microsoft.com/v1.0"
-    
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+    item = _last_opp_sharepoint(kilde, file_name)
+    if not item:
         return None
-    
     try:
-        # Get authentication token
-        token = hentToken()
-        if not token:
-            return None
-        
-        # Get site ID
-        parts = SHAREPOINT_SITE_URL.replace('https://', '').split('/')
-        hostname = parts[0]
-        site_path = '/'.join(parts[1:])
-        
-        headers = {'Authorization': f'Bearer {token}'}
-        url = f"{GRAPH_URL}/sites/{hostname}:/{site_path}"
-        
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        site_id = response.json()['id']
-        
-        if not site_id:
-            logger.error("Could not get SharePoint site ID")
-            return None
-        
-        # Get document library
-        drives_url = f"{GRAPH_URL}/sites/{site_id}/drives"
-        drives_response = requests.get(drives_url, headers=headers)
-        drives_response.raise_for_status()
-        
-        # Find the specified document library
-        drives = drives_response.json()['value']
-        drive_id = None
-        for drive in drives:
-            if drive['name'] == DEFAULT_LIBRARY:
-                drive_id = drive['id']
-                break
-        
-        if not drive_id:
-            logger.error(f"Could not find '{DEFAULT_LIBRARY}' document library")
-            return None
-        
-        # Upload file with the exact filename from file_path
-        file_name = os.path.basename(file_path)
-        upload_headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/octet-stream'
-        }
-        
-        upload_url = f"{GRAPH_URL}/sites/{site_id}/drives/{drive_id}/root:/{file_name}:/content"
-        
-        with open(file_path, 'rb') as f:
-            response = requests.put(upload_url, headers=upload_headers, data=f)
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        logger.info(f"Successfully uploaded to SharePoint: {file_name}")
-        
-        # Set exclusive permissions for the specified UPN
-        file_id = result['id']
-        permission_data = {
-            'recipients': [{'email': upn}],
-            'roles': ['read'],
-            'requireSignIn': True,
-            'sendInvitation': False
-        }
-        
-        invite_url = f"{GRAPH_URL}/sites/{site_id}/drives/{drive_id}/items/{file_id}/invite"
-        permission_headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        invite_response = requests.post(invite_url, headers=permission_headers, json=permission_data)
-        
-        if invite_response.status_code in [200, 201]:
-            logger.info(f"Granted exclusive access to: {upn}")
-        else:
-            logger.warning(f"Permission grant may have failed: {invite_response.status_code}")
-        
-        # Generate a secure sharing link
-        sharing_data = {
-            'type': 'view',
-            'scope': 'users'  # Only users with permissions can access
-        }
-        
-        link_url = f"{GRAPH_URL}/sites/{site_id}/drives/{drive_id}/items/{file_id}/createLink"
-        response = requests.post(link_url, headers=permission_headers, json=sharing_data)
-        
-        if response.status_code in [200, 201]:
-            sharing_link = response.json()['link']['webUrl']
-            logger.info("Secure sharing link created successfully")
-            return sharing_link
-        else:
-            logger.warning(f"Sharing link creation failed: {response.status_code}, using direct URL")
-            return result['webUrl']
-        
+        return delMedBruker(upn, [item])[0]
+    except Exception as e:
+        logger.error(f"SharePoint sharing failed: {e}")
+        return None
+
+
+def _last_opp_sharepoint(kilde, file_name: str = None) -> dict:
+    """Upload a file path, bytes or stream to SharePoint as file_name, returning the drive item or None"""
+    if isinstance(kilde, str) and not os.path.exists(kilde):
+        logger.error(f"File not found: {kilde}")
+        return None
+
+    try:
+        item = lastOppFil(kilde, file_name)
+        logger.info(f"Successfully uploaded to SharePoint: {item.get('name', file_name)}")
+        return item
     except Exception as e:
         logger.error(f"SharePoint upload failed: {e}")
         return None
@@ -625,46 +654,7 @@ def _send_email_graph(upn: str, subject: str, message: str) -> bool:
     Send email using Microsoft Graph API directly
     """
     try:
-        # Get authentication token
-        token = hentToken()
-        if not token:
-            logger.error("Could not get Graph API token for email")
-            return False
-        
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Send email
-        email_payload = {
-            'message': {
-                'subject': subject,
-                'body': {
-                    'contentType': 'Text',
-                    'content': message
-                },
-                'toRecipients': [
-                    {
-                        'emailAddress': {
-                            'address': upn
-                        }
-                    }
-                ]
-            }
-        }
-        
-        # Use application permissions to send mail
-        email_url = f"https://graph.microsoft.com/v1.0/users/{upn}/sendMail"
-        email_response = requests.post(email_url, headers=headers, json=email_payload)
-        
-        if email_response.status_code == 202:
-            logger.info(f"Email sent via Graph API to {upn}")
-            return True
-        else:
-            logger.error(f"Failed to send email via Graph API: {email_response.status_code} - {email_response.text}")
-            return False
-            
+        return sendEpost(upn, subject, message)
     except Exception as e:
         logger.error(f"Failed to send email via Graph API to {upn}: {e}")
-        return False
\ No newline at end of file
+        return False
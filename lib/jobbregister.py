@@ -0,0 +1,298 @@
+"""
+Job Register for Transcription Service
+Durable, on-disk ledger of every job: the last stage it completed, attempts, errors and
+per-stage wall time. A restarted service resumes each job where it stopped instead of
+starting over, and the source blob is only deleted once the job reaches the acknowledged
+state. The ledger can also be queried for throughput statistics.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOBBREGISTER_PATH = os.getenv("HUGIN_JOB_DB", "./jobber/jobber.db")
+
+_registre = {}
+_registre_lock = threading.Lock()
+
+# Tilstander i rekkefølge. En jobb går bare framover.
+NEW = "new"
+DOWNLOADED = "downloaded"
+TRANSCRIBED = "transcribed"
+SUMMARIZED = "summarized"
+UPLOADED = "uploaded"
+PUBLISHED = "published"
+ACKNOWLEDGED = "acknowledged"
+STATES = [NEW, DOWNLOADED, TRANSCRIBED, SUMMARIZED, UPLOADED, PUBLISHED, ACKNOWLEDGED]
+
+
+def er_ferdig_med(jobb: Dict, state: str) -> bool:
+    """True if the job has already completed the given state"""
+    return STATES.index(jobb.get("state", NEW)) >= STATES.index(state)
+
+
+# Kolonner lagt til etter første versjon av registeret, migreres inn i eksisterende databaser
+_EKSTRA_KOLONNER = {
+    "upn": "TEXT",
+    "size": "INTEGER",
+    "audio_duration": "REAL",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "error": "TEXT",
+    "error_stage": "TEXT",
+    "summary_prompt_tokens": "INTEGER",
+    "summary_eval_tokens": "INTEGER",
+    "summary_tokens_per_second": "REAL",
+}
+
+
+def _persentil(verdier: List[float], p: float) -> float:
+    """Percentile with linear interpolation between the closest ranks"""
+    if not verdier:
+        return 0.0
+    verdier = sorted(verdier)
+    k = (len(verdier) - 1) * p / 100
+    lav = int(k)
+    hoy = min(lav + 1, len(verdier) - 1)
+    return verdier[lav] + (verdier[hoy] - verdier[lav]) * (k - lav)
+
+
+class Jobbregister:
+    """
+    SQLite-backed job ledger, keyed on blob name and ETag.
+
+    Holds one row per job (state, UPN, size, audio duration, attempts and last error) and
+    one row per stage execution with its wall time, so throughput can be queried without
+    reading the log. A re-upload with the same name gets a new ETag and therefore a new job.
+
+    Args:
+        path: Database file, created on first use
+    """
+
+    def __init__(self, path: str = JOBBREGISTER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                blob_name TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                state TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (blob_name, etag)
+            )
+        """)
+        eksisterende = {rad[1] for rad in self._db.execute("PRAGMA table_info(jobs)")}
+        for kolonne, definisjon in _EKSTRA_KOLONNER.items():
+            if kolonne not in eksisterende:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {kolonne} {definisjon}")
+
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS stage_timings (
+                blob_name TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                started REAL NOT NULL,
+                duration REAL NOT NULL,
+                ok INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS stage_timings_stage ON stage_timings (stage, started)")
+
+    def hent(self, blob_name: str, etag: str) -> Optional[Dict]:
+        """
+        Return the saved job for a blob version, or None if it has not been seen before.
+        """
+        with self._lock:
+            rad = self._db.execute(
+                "SELECT data FROM jobs WHERE blob_name = ? AND etag = ?", (blob_name, etag)
+            ).fetchone()
+        return json.loads(rad[0]) if rad else None
+
+    def lagre(self, jobb: Dict, state: Optional[str] = None):
+        """
+        Save a job, optionally recording that it has completed a state.
+
+        Args:
+            jobb: Job dict; must contain blob_name and etag. Keys starting with '_' hold
+                in-memory data (e.g. decoded audio) and are not saved.
+            state: The state the job has just completed, or None to keep the current state
+        """
+        if state:
+            jobb["state"] = state
+            jobb.pop("error", None)
+            jobb.pop("error_stage", None)
+        jobb.setdefault("state", NEW)
+
+        naa = time.time()
+        data = json.dumps({k: v for k, v in jobb.items() if not k.startswith("_")}, default=str)
+        upn = (jobb.get("metadata") or {}).get("upn")
+        oppsummering = jobb.get("summary_stats") or {}
+        with self._lock:
+            self._db.execute("""
+                INSERT INTO jobs (blob_name, etag, state, data, created, updated,
+                                  upn, size, audio_duration, attempts, error, error_stage,
+                                  summary_prompt_tokens, summary_eval_tokens, summary_tokens_per_second)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (blob_name, etag) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, updated = excluded.updated,
+                    upn = excluded.upn, size = excluded.size, audio_duration = excluded.audio_duration,
+                    attempts = excluded.attempts, error = excluded.error, error_stage = excluded.error_stage,
+                    summary_prompt_tokens = excluded.summary_prompt_tokens,
+                    summary_eval_tokens = excluded.summary_eval_tokens,
+                    summary_tokens_per_second = excluded.summary_tokens_per_second
+            """, (jobb["blob_name"], jobb["etag"], jobb["state"], data, naa, naa,
+                  upn, jobb.get("size"), jobb.get("audio_duration"), jobb.get("attempts", 0),
+                  jobb.get("error"), jobb.get("error_stage"),
+                  oppsummering.get("prompt_tokens"), oppsummering.get("eval_tokens"),
+                  oppsummering.get("tokens_per_second")))
+        logger.debug(f"Job {jobb['blob_name']} -> {jobb['state']}")
+
+    def registrer_feil(self, jobb: Dict, stage: str, feil: Optional[Exception]):
+        """Record the last error for a job without changing its state"""
+        jobb["error"] = str(feil) if feil else "hoppet over"
+        jobb["error_stage"] = stage
+        self.lagre(jobb)
+
+    def registrer_steg(self, jobb: Dict, stage: str, started: float, duration: float, ok: bool):
+        """Record the wall time of one stage execution"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO stage_timings (blob_name, etag, stage, started, duration, ok) VALUES (?, ?, ?, ?, ?, ?)",
+                (jobb["blob_name"], jobb["etag"], stage, started, duration, int(ok)),
+            )
+
+    def statistikk(self, siden: Optional[float] = None) -> Dict:
+        """
+        Throughput statistics from the ledger.
+
+        Args:
+            siden: Only include stage executions started after this Unix time
+
+        Returns:
+            dict: {'steg': {stage: {'antall', 'snitt', 'p50', 'p95'}},
+                   'rtf': [(blob_name, audio seconds, transcription seconds, real-time factor)],
+                   'oppsummering': {'antall', 'prompt_tokens', 'eval_tokens' (averages per file),
+                                    'tokens_per_second_p50', 'tokens_per_second_min'},
+                   'tilstander': {state: count}, 'filer_per_time': float}
+        """
+        siden = siden or 0
+        with self._lock:
+            tider = self._db.execute(
+                "SELECT stage, duration FROM stage_timings WHERE ok = 1 AND started >= ?", (siden,)
+            ).fetchall()
+            rtf_rader = self._db.execute("""
+                SELECT j.blob_name, j.audio_duration, SUM(t.duration)
+                FROM jobs j JOIN stage_timings t ON t.blob_name = j.blob_name AND t.etag = j.etag
+                WHERE t.stage = 'transkripsjon' AND t.ok = 1 AND t.started >= ? AND j.audio_duration > 0
+                GROUP BY j.blob_name, j.etag
+            """, (siden,)).fetchall()
+            token_rader = self._db.execute("""
+                SELECT summary_prompt_tokens, summary_eval_tokens, summary_tokens_per_second
+                FROM jobs WHERE updated >= ? AND summary_tokens_per_second > 0
+            """, (siden,)).fetchall()
+            tilstander = dict(self._db.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE updated >= ? GROUP BY state", (siden,)
+            ).fetchall())
+            vindu = self._db.execute(
+                "SELECT MIN(created), MAX(updated), COUNT(*) FROM jobs WHERE state = ? AND updated >= ?",
+                (ACKNOWLEDGED, siden),
+            ).fetchone()
+
+        per_steg = {}
+        for stage, duration in tider:
+            per_steg.setdefault(stage, []).append(duration)
+
+        steg = {}
+        for stage, verdier in per_steg.items():
+            steg[stage] = {
+                "antall": len(verdier),
+                "snitt": sum(verdier) / len(verdier),
+                "p50": _persentil(verdier, 50),
+                "p95": _persentil(verdier, 95),
+            }
+
+        rtf = [(navn, lyd, tid, tid / lyd) for navn, lyd, tid in rtf_rader]
+
+        oppsummering = {}
+        if token_rader:
+            hastigheter = [r[2] for r in token_rader]
+            oppsummering = {
+                "antall": len(token_rader),
+                "prompt_tokens": sum(r[0] or 0 for r in token_rader) / len(token_rader),
+                "eval_tokens": sum(r[1] or 0 for r in token_rader) / len(token_rader),
+                "tokens_per_second_p50": _persentil(hastigheter, 50),
+                "tokens_per_second_min": min(hastigheter),
+            }
+
+        start, slutt, ferdige = vindu
+        filer_per_time = ferdige / (slutt - start) * 3600 if ferdige and slutt and slutt > start else 0.0
+
+        return {"steg": steg, "rtf": rtf, "oppsummering": oppsummering, "tilstander": tilstander,
+                "filer_per_time": filer_per_time}
+
+    def lydrater(self, maks: int = 500) -> Dict[str, float]:
+        """
+        Bytes per second of audio by file extension, from recent jobs with a known duration.
+
+        Used to estimate the duration of a recording from its blob size before it is downloaded.
+
+        Returns:
+            dict: {extension: median bytes per second}
+        """
+        with self._lock:
+            rader = self._db.execute("""
+                SELECT blob_name, size, audio_duration FROM jobs
+                WHERE size > 0 AND audio_duration > 0 ORDER BY updated DESC LIMIT ?
+            """, (maks,)).fetchall()
+
+        per_type = {}
+        for blob_name, size, audio_duration in rader:
+            filtype = os.path.splitext(blob_name)[1].lstrip(".").lower()
+            per_type.setdefault(filtype, []).append(size / audio_duration)
+        return {filtype: _persentil(verdier, 50) for filtype, verdier in per_type.items()}
+
+
+def formater_statistikk(stats: Dict) -> List[str]:
+    """Human-readable lines for the output of Jobbregister.statistikk()"""
+    linjer = ["📊 STATISTIKK FRA JOBBREGISTERET:"]
+    linjer.append(f"   • Jobber per tilstand: {stats['tilstander'] or 'ingen'}")
+    linjer.append(f"   • Fullførte filer per time: {stats['filer_per_time']:.1f}")
+    for stage, s in stats["steg"].items():
+        linjer.append(
+            f"   • {stage:<14} n={s['antall']:<5} snitt {s['snitt']:.1f}s | p50 {s['p50']:.1f}s | p95 {s['p95']:.1f}s"
+        )
+    if stats["rtf"]:
+        rtf_verdier = [r for _, _, _, r in stats["rtf"]]
+        linjer.append(
+            f"   • Real-time factor (transkripsjon / lydlengde): p50 {_persentil(rtf_verdier, 50):.3f} | "
+            f"p95 {_persentil(rtf_verdier, 95):.3f} over {len(rtf_verdier)} filer"
+        )
+        for navn, lyd, tid, r in stats["rtf"][-10:]:
+            linjer.append(f"     - {navn}: {lyd/60:.1f} min lyd på {tid:.1f}s (RTF {r:.3f})")
+    o = stats.get("oppsummering")
+    if o:
+        linjer.append(
+            f"   • AI-sammendrag: {o['tokens_per_second_p50']:.1f} tokens/s (p50), tregeste {o['tokens_per_second_min']:.1f} "
+            f"tokens/s | snitt {o['prompt_tokens']:.0f} prompt- og {o['eval_tokens']:.0f} genererte tokens over {o['antall']} filer"
+        )
+    return linjer
+
+
+def hent_jobbregister(path: str = JOBBREGISTER_PATH) -> Jobbregister:
+    """
+    Return the shared Jobbregister for a database file, opening it on first use.
+    """
+    with _registre_lock:
+        if path not in _registre:
+            _registre[path] = Jobbregister(path)
+        return _registre[path]
@@ -0,0 +1,136 @@
+"""
+Audio Library for Transcription Service
+Decodes audio with ffmpeg to 16 kHz mono float32 and finds silence boundaries with a
+lightweight energy-based voice activity detector, used to split long recordings into
+chunks that can be transcribed independently.
+"""
+
+import logging
+import subprocess
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# VAD-innstillinger: rammelengde og glatting av energikurven
+_RAMME = int(0.03 * SAMPLE_RATE)  # 30 ms
+_GLATTING = 10  # rammer (300 ms)
+
+# Samples per lesing fra ffmpeg-pipen (2 MB)
+_LESEBLOKK = 1 << 20
+
+
+def last_lyd(filnavn: str, sr: int = SAMPLE_RATE, varighet: Optional[float] = None) -> np.ndarray:
+    """
+    Decode any audio or video file to mono float32 samples in [-1, 1] using ffmpeg.
+
+    ffmpeg writes 16-bit PCM to a pipe, which is read in fixed-size blocks into one reusable
+    buffer and converted straight into the output array. Nothing is written to disk and the
+    raw PCM is never held in memory as a whole.
+
+    Args:
+        filnavn: Path to the media file
+        sr: Target sample rate
+        varighet: Expected length in seconds (e.g. from ffprobe), used to size the output
+            array up front so it does not have to grow while decoding
+
+    Returns:
+        np.ndarray: 1-D float32 array
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", filnavn,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "-",
+    ]
+
+    lyd = np.empty(int((varighet or 600) * sr) + sr, dtype=np.float32)
+    blokk = np.empty(_LESEBLOKK, dtype=np.int16)
+    blokk_bytes = memoryview(blokk).cast("B")
+    antall = 0
+    rest = 0  # en odde byte som venter på resten av samplet sitt
+
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as prosess:
+        while True:
+            lest = prosess.stdout.readinto(blokk_bytes[rest:])
+            if not lest:
+                break
+            lest += rest
+            samples = lest // 2
+
+            if antall + samples > len(lyd):
+                storre = np.empty(max(len(lyd) * 2, antall + samples), dtype=np.float32)
+                storre[:antall] = lyd[:antall]
+                lyd = storre
+
+            np.multiply(blokk[:samples], 1 / 32768.0, out=lyd[antall:antall + samples], casting="unsafe")
+            antall += samples
+
+            rest = lest % 2
+            if rest:
+                blokk_bytes[0] = blokk_bytes[lest - 1]
+
+        feilmelding = prosess.stderr.read()
+        if prosess.wait() != 0:
+            raise RuntimeError(f"Failed to load audio: {feilmelding.decode(errors='ignore')}")
+
+    # Unngå å holde på et stort overallokert buffer når lengden ikke var kjent på forhånd
+    if len(lyd) - antall > 60 * sr:
+        return lyd[:antall].copy()
+    return lyd[:antall]
+
+
+def energi_db(lyd: np.ndarray) -> np.ndarray:
+    """Smoothed frame energy in dB, one value per 30 ms frame"""
+    antall_rammer = len(lyd) // _RAMME
+    if antall_rammer == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    rammer = lyd[:antall_rammer * _RAMME].reshape(antall_rammer, _RAMME)
+    # Kvadratsum per ramme i float64 uten å lage kopier av hele opptaket
+    rms = np.sqrt(np.einsum("ij,ij->i", rammer, rammer, dtype=np.float64) / _RAMME + 1e-12)
+    db = 20 * np.log10(rms)
+
+    kjerne = np.ones(_GLATTING) / _GLATTING
+    return np.convolve(db, kjerne, mode="same").astype(np.float32)
+
+
+def del_i_biter(lyd: np.ndarray, maal_sekunder: float = 300.0, sr: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Split audio into chunks of roughly maal_sekunder, cutting at silence.
+
+    For every boundary the quietest point (lowest smoothed energy) within ±20 % of the
+    target length is chosen, so cuts land in pauses between utterances whenever there is one.
+
+    Args:
+        lyd: Mono samples
+        maal_sekunder: Target chunk length in seconds
+        sr: Sample rate of lyd
+
+    Returns:
+        list: (start, end) sample indices covering the whole signal without gaps or overlap
+    """
+    n = len(lyd)
+    maal = int(maal_sekunder * sr)
+    if n <= maal * 1.2:
+        return [(0, n)]
+
+    energi = energi_db(lyd)
+    vindu = int(maal * 0.2)
+
+    biter = []
+    start = 0
+    while n - start > maal * 1.2:
+        fra = (start + maal - vindu) // _RAMME
+        til = min(start + maal + vindu, n) // _RAMME
+        if til <= fra or til > len(energi):
+            kutt = start + maal
+        else:
+            kutt = (fra + int(np.argmin(energi[fra:til]))) * _RAMME + _RAMME // 2
+        biter.append((start, kutt))
+        start = kutt
+    biter.append((start, n))
+
+    logger.info(f"Split {n/sr/60:.1f} min of audio into {len(biter)} chunks at silence boundaries")
+    return biter
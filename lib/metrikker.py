@@ -0,0 +1,216 @@
+"""
+Metrics Library for Transcription Service
+Counters, gauges and histograms in the Prometheus text format, without extra dependencies.
+In daemon mode they are served on a local HTTP /metrics endpoint; in cron mode they are
+written to a file for the node_exporter textfile collector at the end of each run.
+"""
+
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# /metrics i daemon-modus (0 slår av), og fil for textfile-collectoren etter hver runde (tom slår av)
+METRICS_HOST = os.getenv("HUGIN_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("HUGIN_METRICS_PORT", "9464"))
+METRICS_TEXTFILE = os.getenv("HUGIN_METRICS_TEXTFILE", "./metrics/hugin.prom")
+
+SEKUND_BOTTER = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(verdi) -> str:
+    return str(verdi).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiketter(etiketter: Tuple[Tuple[str, str], ...], ekstra: str = "") -> str:
+    deler = [f'{navn}="{_escape(verdi)}"' for navn, verdi in etiketter]
+    if ekstra:
+        deler.append(ekstra)
+    return "{" + ",".join(deler) + "}" if deler else ""
+
+
+def _tall(verdi: float) -> str:
+    if math.isinf(verdi):
+        return "+Inf" if verdi > 0 else "-Inf"
+    return repr(float(verdi)) if not float(verdi).is_integer() else str(int(verdi))
+
+
+class _Metrikk:
+    type = ""
+
+    def __init__(self, navn: str, beskrivelse: str):
+        self.navn = navn
+        self.beskrivelse = beskrivelse
+        self._verdier = {}
+        self._lock = threading.Lock()
+
+    def linjer(self) -> List[str]:
+        return [f"# HELP {self.navn} {self.beskrivelse}", f"# TYPE {self.navn} {self.type}"] + self._verdilinjer()
+
+    def _verdilinjer(self) -> List[str]:
+        with self._lock:
+            return [f"{self.navn}{_etiketter(n)} {_tall(v)}" for n, v in sorted(self._verdier.items())]
+
+
+class Teller(_Metrikk):
+    """Monotonic counter, optionally per label set (e.g. steg='nedlasting')"""
+
+    type = "counter"
+
+    def inc(self, antall: float = 1, **etiketter):
+        nokkel = tuple(sorted(etiketter.items()))
+        with self._lock:
+            self._verdier[nokkel] = self._verdier.get(nokkel, 0) + antall
+
+
+class Maler(_Metrikk):
+    """Gauge: set directly, or computed at scrape time by a callable returning {label value: value}"""
+
+    type = "gauge"
+
+    def __init__(self, navn: str, beskrivelse: str, etikett: Optional[str] = None):
+        super().__init__(navn, beskrivelse)
+        self.etikett = etikett
+        self._funksjon = None
+
+    def sett(self, verdi: float, **etiketter):
+        with self._lock:
+            self._verdier[tuple(sorted(etiketter.items()))] = verdi
+
+    def sett_funksjon(self, funksjon: Optional[Callable[[], Dict[str, float]]]):
+        self._funksjon = funksjon
+
+    def _verdilinjer(self) -> List[str]:
+        funksjon = self._funksjon
+        if funksjon is None:
+            return super()._verdilinjer()
+        try:
+            verdier = funksjon()
+        except Exception as e:
+            logger.debug(f"Kunne ikke lese {self.navn}: {e}")
+            return []
+        return [f"{self.navn}{_etiketter(((self.etikett, n),))} {_tall(v)}" for n, v in sorted(verdier.items())]
+
+
+class Histogram(_Metrikk):
+    """Cumulative histogram with fixed bucket upper bounds"""
+
+    type = "histogram"
+
+    def __init__(self, navn: str, beskrivelse: str, botter: Tuple[float, ...] = SEKUND_BOTTER):
+        super().__init__(navn, beskrivelse)
+        self.botter = tuple(sorted(botter)) + (math.inf,)
+
+    def observer(self, verdi: float, **etiketter):
+        nokkel = tuple(sorted(etiketter.items()))
+        with self._lock:
+            antall, summen, totalt = self._verdier.get(nokkel) or ([0] * len(self.botter), 0.0, 0)
+            for i, ovre in enumerate(self.botter):
+                if verdi <= ovre:
+                    antall[i] += 1
+            self._verdier[nokkel] = (antall, summen + verdi, totalt + 1)
+
+    def _verdilinjer(self) -> List[str]:
+        linjer = []
+        with self._lock:
+            for nokkel, (antall, summen, totalt) in sorted(self._verdier.items()):
+                for ovre, n in zip(self.botter, antall):
+                    le = 'le="' + _tall(ovre) + '"'
+                    linjer.append(f"{self.navn}_bucket{_etiketter(nokkel, le)} {n}")
+                linjer.append(f"{self.navn}_sum{_etiketter(nokkel)} {_tall(summen)}")
+                linjer.append(f"{self.navn}_count{_etiketter(nokkel)} {totalt}")
+        return linjer
+
+
+_REGISTER: List[_Metrikk] = []
+
+
+def _registrer(metrikk):
+    _REGISTER.append(metrikk)
+    return metrikk
+
+
+# Metrikkene tjenesten oppdaterer
+NEDLASTET_BYTES = _registrer(Teller("hugin_download_bytes_total", "Bytes downloaded from Blob Storage"))
+NEDLASTING_SEKUNDER = _registrer(Histogram("hugin_download_seconds", "Time to download one recording"))
+FFMPEG_SEKUNDER = _registrer(Histogram("hugin_ffmpeg_seconds", "Time to decode one recording with ffmpeg"))
+ASR_SEKUNDER = _registrer(Histogram("hugin_asr_seconds", "Time to transcribe one recording"))
+ASR_RTF = _registrer(Histogram("hugin_asr_realtime_factor", "Transcription time divided by audio length",
+                               botter=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2)))
+LYD_SEKUNDER = _registrer(Teller("hugin_audio_seconds_total", "Seconds of audio transcribed"))
+OLLAMA_TOKENS = _registrer(Teller("hugin_ollama_tokens_total", "Tokens in Ollama summary requests, by kind"))
+OLLAMA_TOKENS_PER_SEKUND = _registrer(Histogram("hugin_ollama_tokens_per_second",
+                                                "Generated tokens per second for one summary",
+                                                botter=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200)))
+OPPSUMMERING_SEKUNDER = _registrer(Histogram("hugin_summary_seconds", "Time to summarize one transcript"))
+GRAPH_SEKUNDER = _registrer(Histogram("hugin_graph_request_seconds", "Microsoft Graph request latency by endpoint",
+                                      botter=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)))
+STEG_SEKUNDER = _registrer(Histogram("hugin_stage_seconds", "Wall time per pipeline stage execution"))
+STEG_FEIL = _registrer(Teller("hugin_stage_failures_total", "Jobs that failed, by stage"))
+FULLFORTE = _registrer(Teller("hugin_jobs_completed_total", "Jobs delivered and acknowledged"))
+KO_DYBDE = _registrer(Maler("hugin_queue_depth", "Jobs waiting in front of each pipeline stage", etikett="steg"))
+RUNDER = _registrer(Teller("hugin_runs_total", "Processing runs started"))
+HENDELSER = _registrer(Teller("hugin_queue_events_total", "Blob-created events received from the event queue"))
+SISTE_RUNDE = _registrer(Maler("hugin_last_run_timestamp_seconds", "Unix time the last run finished"))
+SISTE_RUNDE_SEKUNDER = _registrer(Maler("hugin_last_run_duration_seconds", "Duration of the last run"))
+SISTE_RUNDE_FILER = _registrer(Maler("hugin_last_run_files", "Files in the last run, by outcome"))
+
+
+def eksponer() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    linjer = []
+    for metrikk in _REGISTER:
+        linjer.extend(metrikk.linjer())
+    return "\n".join(linjer) + "\n"
+
+
+def skriv_tekstfil(sti: str = METRICS_TEXTFILE):
+    """Write all metrics to a file for the textfile collector (atomically, so a scrape never sees half a file)"""
+    if not sti:
+        return
+    os.makedirs(os.path.dirname(sti) or ".", exist_ok=True)
+    midlertidig = f"{sti}.{os.getpid()}.tmp"
+    with open(midlertidig, "w", encoding="utf-8") as f:
+        f.write(eksponer())
+    os.replace(midlertidig, sti)
+
+
+class _Metrikkhandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        svar = eksponer().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(svar)))
+        self.end_headers()
+        self.wfile.write(svar)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server, or None if port is 0 or the port is taken
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _Metrikkhandler)
+    except OSError as e:
+        logger.error(f"Kunne ikke starte metrikk-endepunkt på {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrikker", daemon=True).start()
+    logger.info(f"📈 Metrikker på http://{host}:{server.server_address[1]}/metrics")
+    return server
+
@@ -0,0 +1,234 @@
+"""
+Pipeline Library for Transcription Service
+Runs jobs through a chain of stages connected by bounded queues, so that different
+files can be in different stages at the same time (file N+1 is transcribed while
+file N is summarized and published).
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Markerer at det ikke kommer flere jobber inn i et steg
+_SLUTT = object()
+
+
+class Steg:
+    """
+    A single pipeline stage.
+
+    Args:
+        navn: Stage name used in logs and the throughput report
+        funksjon: Callable that takes a job and returns the job for the next stage.
+            Returning None drops the job (counted as skipped), raising marks it as failed.
+        arbeidere: Number of worker threads for this stage
+        hovedtraad: Run this stage on the thread that calls Pipeline.kjor().
+            Used for the MLX transcription stage, which should stay on the main thread.
+    """
+
+    def __init__(self, navn: str, funksjon: Callable, arbeidere: int = 1, hovedtraad: bool = False):
+        if arbeidere < 1:
+            raise ValueError(f"Steg '{navn}' må ha minst én arbeider")
+        if hovedtraad and arbeidere != 1:
+            raise ValueError(f"Steg '{navn}' kan bare ha én arbeider når det kjører på hovedtråden")
+
+        self.navn = navn
+        self.funksjon = funksjon
+        self.arbeidere = arbeidere
+        self.hovedtraad = hovedtraad
+
+        # Statistikk for gjennomstrømningsrapporten
+        self.antall = 0
+        self.hoppet_over = 0
+        self.feil = 0
+        self.aktiv_tid = 0.0
+        self.forste_start = None
+        self.siste_slutt = None
+        self._lock = threading.Lock()
+        self._gjenstaende_arbeidere = arbeidere
+
+    def _registrer(self, start: float, slutt: float, utfall: str):
+        with self._lock:
+            self.aktiv_tid += slutt - start
+            if self.forste_start is None or start < self.forste_start:
+                self.forste_start = start
+            if self.siste_slutt is None or slutt > self.siste_slutt:
+                self.siste_slutt = slutt
+            if utfall == "ok":
+                self.antall += 1
+            elif utfall == "hoppet_over":
+                self.hoppet_over += 1
+            else:
+                self.feil += 1
+
+    def _arbeider_ferdig(self) -> bool:
+        """Returns True for the last worker of this stage to finish"""
+        with self._lock:
+            self._gjenstaende_arbeidere -= 1
+            return self._gjenstaende_arbeidere == 0
+
+
+class Pipeline:
+    """
+    Staged pipeline with bounded queues between the stages.
+
+    Args:
+        steg: Ordered list of stages
+        kostorrelse: Maximum number of jobs waiting in front of each stage
+        ved_feil: Optional callback (job, stage name, error) for jobs that fail or are
+            skipped, e.g. to release resources held by the job. error is None for skipped jobs.
+        etter_steg: Optional callback (job, stage name, start time, duration, ok) called
+            after every stage execution, e.g. to record per-stage timings.
+    """
+
+    def __init__(self, steg: List[Steg], kostorrelse: int = 2, ved_feil: Optional[Callable] = None,
+                 etter_steg: Optional[Callable] = None):
+        if not steg:
+            raise ValueError("Pipeline må ha minst ett steg")
+        if sum(1 for s in steg if s.hovedtraad) > 1:
+            raise ValueError("Bare ett steg kan kjøre på hovedtråden")
+
+        self.steg = steg
+        self.kostorrelse = kostorrelse
+        self.ved_feil = ved_feil
+        self.etter_steg = etter_steg
+        self.ferdige = []
+        self.feilede = []
+        self._lock = threading.Lock()
+        self._koer = []
+        self.start_tid = None
+        self.slutt_tid = None
+
+    def kjor(self, jobber: list) -> Tuple[list, list]:
+        """
+        Run all jobs through the pipeline and block until every job has finished or failed.
+
+        Args:
+            jobber: Jobs to process, in the order they should enter the first stage
+
+        Returns:
+            tuple: (completed jobs, failed jobs as (job, stage name, error) tuples)
+        """
+        self.start_tid = time.time()
+        koer = [queue.Queue(maxsize=self.kostorrelse) for _ in self.steg]
+        koer.append(None)  # siste steg leverer til self.ferdige
+        self._koer = koer
+
+        traader = []
+        mater = threading.Thread(target=self._mat, args=(jobber, koer[0]), name="pipeline-mater", daemon=True)
+        mater.start()
+        traader.append(mater)
+
+        hovedsteg = None
+        for i, steg in enumerate(self.steg):
+            neste = self.steg[i + 1] if i + 1 < len(self.steg) else None
+            if steg.hovedtraad:
+                hovedsteg = (steg, koer[i], koer[i + 1], neste)
+                continue
+            for n in range(steg.arbeidere):
+                t = threading.Thread(
+                    target=self._arbeider,
+                    args=(steg, koer[i], koer[i + 1], neste),
+                    name=f"pipeline-{steg.navn}-{n + 1}",
+                    daemon=True,
+                )
+                t.start()
+                traader.append(t)
+
+        if hovedsteg:
+            self._arbeider(*hovedsteg)
+
+        for t in traader:
+            t.join()
+
+        self.slutt_tid = time.time()
+        return self.ferdige, self.feilede
+
+    def _mat(self, jobber: list, ko: queue.Queue):
+        for jobb in jobber:
+            ko.put(jobb)
+        for _ in range(self.steg[0].arbeidere):
+            ko.put(_SLUTT)
+
+    def _arbeider(self, steg: Steg, inn: queue.Queue, ut: Optional[queue.Queue], neste: Optional[Steg]):
+        while True:
+            jobb = inn.get()
+            if jobb is _SLUTT:
+                break
+
+            start = time.time()
+            try:
+                resultat = steg.funksjon(jobb)
+            except Exception as e:
+                slutt = time.time()
+                steg._registrer(start, slutt, "feil")
+                logger.error(f"❌ Steg '{steg.navn}' feilet: {e}")
+                self._etter_steg(jobb, steg.navn, start, slutt, False)
+                self._feilet(jobb, steg.navn, e)
+                continue
+
+            slutt = time.time()
+            if resultat is None:
+                steg._registrer(start, slutt, "hoppet_over")
+                self._etter_steg(jobb, steg.navn, start, slutt, False)
+                self._feilet(jobb, steg.navn, None)
+                continue
+
+            steg._registrer(start, slutt, "ok")
+            self._etter_steg(resultat, steg.navn, start, slutt, True)
+            if ut is None:
+                with self._lock:
+                    self.ferdige.append(resultat)
+            else:
+                ut.put(resultat)
+
+        # Siste arbeider i steget signaliserer til alle arbeiderne i neste steg
+        if steg._arbeider_ferdig() and ut is not None:
+            for _ in range(neste.arbeidere):
+                ut.put(_SLUTT)
+
+    def _etter_steg(self, jobb, steg_navn: str, start: float, slutt: float, ok: bool):
+        if self.etter_steg:
+            try:
+                self.etter_steg(jobb, steg_navn, start, slutt - start, ok)
+            except Exception as e:
+                logger.error(f"❌ Registrering etter steg '{steg_navn}' feilet: {e}")
+
+    def _feilet(self, jobb, steg_navn: str, feil: Optional[Exception]):
+        with self._lock:
+            self.feilede.append((jobb, steg_navn, feil))
+        if self.ved_feil:
+            try:
+                self.ved_feil(jobb, steg_navn, feil)
+            except Exception as e:
+                logger.error(f"❌ Feilhåndtering for steg '{steg_navn}' feilet: {e}")
+
+    def kodybde(self) -> Dict[str, int]:
+        """Jobs currently waiting in front of each stage"""
+        return {steg.navn: ko.qsize() for steg, ko in zip(self.steg, self._koer)}
+
+    def rapport(self) -> List[str]:
+        """
+        Per-stage throughput report.
+
+        Returns:
+            list: Report lines, ready to be logged
+        """
+        linjer = ["📈 GJENNOMSTRØMNING PER STEG:"]
+        for steg in self.steg:
+            behandlet = steg.antall + steg.hoppet_over + steg.feil
+            snitt = steg.aktiv_tid / behandlet if behandlet else 0.0
+            vindu = (steg.siste_slutt - steg.forste_start) if steg.forste_start is not None else 0.0
+            per_time = steg.antall / vindu * 3600 if vindu > 0 else 0.0
+            linjer.append(
+                f"   • {steg.navn:<12} {steg.antall} ok, {steg.hoppet_over} hoppet over, {steg.feil} feil | "
+                f"snitt {snitt:.1f}s/fil | {per_time:.1f} filer/time | arbeidere: {steg.arbeidere}"
+            )
+        if self.start_tid is not None and self.slutt_tid is not None:
+            total = self.slutt_tid - self.start_tid
+            linjer.append(f"   • Total veggtid: {total:.1f}s for {len(self.ferdige)} fullførte filer")
+        return linjer
@@ -1,57 +1,597 @@
 #!/usr/bin/env python3
 """
 Transkripsjon SharePoint Library
-Library with functions for SharePoint operations using Microsoft Graph API
+Library with functions for SharePoint operations using Microsoft Graph API.
+
+All Graph traffic goes through one GraphKlient per process: the access token is reused
+until shortly before it expires, the site and drive IDs are looked up once, and every
+request shares a pooled requests.Session with keep-alive.
 """
 
+import io
+import logging
 import os
+import threading
+import time
+from collections import Counter
+from typing import BinaryIO, Dict, List, Optional, Union
+from urllib.parse import urlparse
+
 import requests
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+
+try:
+    from .http_lib import HttpKlient, ventetid
+except ImportError:
+    from http_lib import HttpKlient, ventetid
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration from .env
 TENANT_ID = os.getenv('TENANT_ID')
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 SHAREPOINT_SITE_URL = os.getenv('SHAREPOINT_SITE_URL')
 DEFAULT_LIBRARY = os.getenv('DEFAULT_LIBRARY', 'Documents')
-GRAPH_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_URL = os.getenv('GRAPH_URL', "https://graph.microsoft.com/v1.0")
+LOGIN_URL = os.getenv('GRAPH_LOGIN_URL', "https://login.microsoftonline.com")
+
+# Tokenet fornyes så mange sekunder før expires_in går ut (og straks hvis Graph svarer 401)
+GRAPH_TOKEN_MARGIN_SECONDS = int(os.getenv("GRAPH_TOKEN_MARGIN_SECONDS", "300"))
+# Maks antall gjenbrukte HTTPS-tilkoblinger per vert
+GRAPH_POOL_SIZE = int(os.getenv("GRAPH_POOL_SIZE", "8"))
+# Delforespørsler i en $batch som feiler midlertidig (429, 5xx, eller 424 fordi forespørselen de
+# avhenger av feilet) sendes på nytt i en ny $batch, med Retry-After eller ventetid fra http_lib
+GRAPH_BATCH_RETRIES = int(os.getenv("GRAPH_BATCH_RETRIES", "3"))
+
+# Filer over terskelen lastes opp i en opplastingsøkt (createUploadSession), i biter som kan
+# gjenopptas fra siste bekreftede byte etter en feil. Bitstørrelsen rundes ned til et multiplum av 320 KiB.
+GRAPH_UPLOAD_SESSION_THRESHOLD = int(float(os.getenv("GRAPH_UPLOAD_SESSION_THRESHOLD_MB", "4")) * 1024 * 1024)
+GRAPH_UPLOAD_CHUNK_SIZE = max(1, int(float(os.getenv("GRAPH_UPLOAD_CHUNK_MB", "5")) * 1024 * 1024) // (320 * 1024)) * 320 * 1024
+GRAPH_UPLOAD_RETRIES = int(os.getenv("GRAPH_UPLOAD_RETRIES", "5"))
+
+_BATCH_MAKS = 20  # Graph tillater maks 20 forespørsler per $batch
+_MIDLERTIDIG = frozenset({424, 429, 500, 502, 503, 504})
+# sendMail prøves bare på nytt når e-posten sikkert ikke ble sendt
+_IKKE_SENDT = frozenset({424, 429, 503})
+
+_klienter = {}
+_klienter_lock = threading.Lock()
+
+
+def _endepunkt(path: str) -> str:
+    """Maps a Graph path to a readable endpoint name for the request counters"""
+    path = urlparse(path).path.rstrip("/")
+    siste = path.rsplit("/", 1)[-1]
+    if path.endswith(":/content"):
+        return "upload"
+    if siste in ("invite", "createLink", "sendMail", "drives", "$batch", "createUploadSession"):
+        return siste
+    if "/sites/" in path and "/drives" not in path:
+        return "site"
+    return siste or "graph"
+
+
+class GraphKlient:
+    """
+    Shared Microsoft Graph client for one app registration and SharePoint site.
+
+    The client-credentials token is cached until GRAPH_TOKEN_MARGIN_SECONDS before it
+    expires, the site and document library IDs are cached for the life of the process,
+    and all requests go through one HttpKlient (pooled session, timeouts, retries and
+    rate limits per endpoint class). Requests are counted per endpoint in self.teller,
+    retries and throttling in self.http.teller.
+
+    Args:
+        tenant_id: Azure AD tenant
+        client_id: App registration client ID
+        client_secret: App registration secret
+        site_url: SharePoint site URL (https://host/sites/name)
+        library: Name of the document library to upload to
+    """
+
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str,
+                 site_url: str, library: str = DEFAULT_LIBRARY):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.site_url = site_url
+        self.library = library
+        self.teller = Counter()
+        self.batch_teller = Counter()
+
+        self.http = HttpKlient(pool_size=GRAPH_POOL_SIZE)
+        self.session = self.http.session
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._token_utloper = 0.0
+        self._site_id = None
+        self._drive_id = None
+
+    def _tell(self, endepunkt: str):
+        with self._lock:
+            self.teller[endepunkt] += 1
+
+    def token(self) -> str:
+        """
+        Return a valid access token, fetching a new one only when the cached one is about to expire.
+
+        Raises:
+            requests.HTTPError: If the token endpoint rejects the credentials
+        """
+        with self._lock:
+            if self._token and time.time() < self._token_utloper - GRAPH_TOKEN_MARGIN_SECONDS:
+                return self._token
+
+            token_data = {
+                'grant_type': 'client_credentials',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'scope': 'https://graph.microsoft.com/.default'
+            }
+            token_url = f"{LOGIN_URL}/{self.tenant_id}/oauth2/v2.0/token"
+            response = self.http.request("POST", token_url, "token", data=token_data)
+            self.teller["token"] += 1
+            response.raise_for_status()
+
+            token_info = response.json()
+            self._token = token_info['access_token']
+            self._token_utloper = time.time() + float(token_info.get('expires_in', 3599))
+            return self._token
+
+    def forkast_token(self):
+        """Drop the cached token so the next request fetches a new one"""
+        with self._lock:
+            self._token = None
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send an authenticated request to Graph through the shared HTTP layer.
+
+        Args:
+            method: HTTP method
+            path: Path relative to GRAPH_URL, or an absolute URL (e.g. @odata.nextLink)
+
+        Returns:
+            requests.Response: The response; a 401 is retried once with a fresh token
+        """
+        url = path if path.startswith("http") else f"{GRAPH_URL}{path}"
+        headers = dict(kwargs.pop("headers", None) or {})
+        endepunkt = _endepunkt(url)
+
+        for forsok in range(2):
+            headers['Authorization'] = f'Bearer {self.token()}'
+            response = self.http.request(method, url, endepunkt, headers=headers, **kwargs)
+            self._tell(endepunkt)
+            if response.status_code != 401 or forsok:
+                return response
+            # Tokenet kan være trukket tilbake før det utløper
+            self.forkast_token()
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PUT", path, **kwargs)
+
+    def site_id(self) -> str:
+        """SharePoint site ID for site_url, looked up once per process"""
+        if self._site_id is None:
+            parts = self.site_url.replace('https://', '').split('/')
+            hostname = parts[0]
+            site_path = '/'.join(parts[1:])
+            response = self.get(f"/sites/{hostname}:/{site_path}")
+            response.raise_for_status()
+            self._site_id = response.json()['id']
+        return self._site_id
+
+    def drive_id(self) -> str:
+        """
+        ID of the document library named self.library, looked up once per process.
+
+        Raises:
+            LookupError: If the site has no library with that name
+        """
+        if self._drive_id is None:
+            url = f"/sites/{self.site_id()}/drives?$select=id,name"
+            while url:
+                response = self.get(url)
+                response.raise_for_status()
+                side = response.json()
+                for drive in side['value']:
+                    if drive['name'] == self.library:
+                        self._drive_id = drive['id']
+                        return self._drive_id
+                url = side.get('@odata.nextLink')
+            raise LookupError(f"Could not find '{self.library}' document library")
+        return self._drive_id
+
+    def batch(self, foresporsler: List[Dict], prov_igjen: frozenset = _MIDLERTIDIG) -> Dict[str, Dict]:
+        """
+        Send sub-requests as JSON $batch requests and return the responses by id.
+
+        Requests linked by dependsOn are kept in the same $batch so Graph runs them in
+        order. Sub-requests that fail with 429, 5xx or 424 (their dependency failed) are
+        re-sent, together with the requests they depend on, up to GRAPH_BATCH_RETRIES times.
+
+        Args:
+            foresporsler: [{'id', 'method', 'url', 'body' (optional), 'dependsOn' (optional)}]
+                with url relative to GRAPH_URL, e.g. '/users/{upn}/sendMail'
+            prov_igjen: Sub-request status codes to retry
+
+        Returns:
+            dict: id -> {'id', 'status', 'headers', 'body'} from the last attempt
+
+        Raises:
+            requests.HTTPError: If the $batch request itself fails
+        """
+        svar = {}
+        gjenstaende = [_batch_foresporsel(f) for f in foresporsler]
+
+        for forsok in range(GRAPH_BATCH_RETRIES + 1):
+            server_ventetid = None
+            feilet = set()
+            for gruppe in _pakk_batch(gjenstaende):
+                for f in gruppe:
+                    self.http.begrens(_endepunkt(f["url"]))
+                response = self.post("/$batch", json={"requests": gruppe})
+                response.raise_for_status()
+                with self._lock:
+                    for f in gruppe:
+                        self.batch_teller[_endepunkt(f["url"])] += 1
+                for delsvar in response.json()["responses"]:
+                    svar[delsvar["id"]] = delsvar
+                    if delsvar["status"] in prov_igjen:
+                        feilet.add(delsvar["id"])
+                        headers = {k.lower(): v for k, v in (delsvar.get("headers") or {}).items()}
+                        if "retry-after" in headers:
+                            server_ventetid = max(server_ventetid or 0.0, float(headers["retry-after"]))
+
+            if not feilet or forsok == GRAPH_BATCH_RETRIES:
+                break
+
+            # Prøv de feilede på nytt; avhengigheter som allerede lyktes trengs ikke lenger
+            gjenstaende = [f for f in gjenstaende if f["id"] in feilet]
+            for f in gjenstaende:
+                if "dependsOn" in f:
+                    f["dependsOn"] = [d for d in f["dependsOn"] if d in feilet]
+                    if not f["dependsOn"]:
+                        del f["dependsOn"]
+            with self._lock:
+                self.batch_teller["retry"] += len(gjenstaende)
+            vent = ventetid(forsok, server_ventetid)
+            logger.warning(f"{len(gjenstaende)} Graph-delforespørsler feilet midlertidig, prøver igjen om {vent:.1f}s")
+            time.sleep(vent)
+
+        return svar
+
+    def nullstill_teller(self):
+        with self._lock:
+            self.teller.clear()
+            self.batch_teller.clear()
+        self.http.nullstill_teller()
+
+    def rapport(self) -> str:
+        """One-line summary of Graph requests per endpoint, and of the sub-requests sent inside $batch"""
+        with self._lock:
+            if not self.teller:
+                return "ingen forespørsler"
+            deler = [f"{endepunkt}={antall}" for endepunkt, antall in sorted(self.teller.items())]
+            linje = f"{sum(self.teller.values())} totalt ({', '.join(deler)})"
+            if self.batch_teller:
+                deler = [f"{endepunkt}={antall}" for endepunkt, antall in sorted(self.batch_teller.items())]
+                linje += f", i $batch: {', '.join(deler)}"
+            return linje
+
+
+def _batch_foresporsel(foresporsel: Dict) -> Dict:
+    """Copy of a sub-request with the JSON Content-Type header Graph requires when there is a body"""
+    f = dict(foresporsel)
+    if "body" in f and "headers" not in f:
+        f["headers"] = {"Content-Type": "application/json"}
+    if "dependsOn" in f:
+        f["dependsOn"] = list(f["dependsOn"])
+    return f
+
+
+def _pakk_batch(foresporsler: List[Dict]) -> List[List[Dict]]:
+    """Split sub-requests into $batch payloads of at most _BATCH_MAKS, keeping dependsOn chains together"""
+    rot = {}
+    grupper = {}
+    for f in foresporsler:
+        avhengigheter = [rot[d] for d in f.get("dependsOn", []) if d in rot]
+        r = avhengigheter[0] if avhengigheter else f["id"]
+        for annen in avhengigheter[1:]:
+            if annen != r:
+                for g in grupper.pop(annen):
+                    rot[g["id"]] = r
+                    grupper[r].append(g)
+        rot[f["id"]] = r
+        grupper.setdefault(r, []).append(f)
+
+    pakker = [[]]
+    for gruppe in grupper.values():
+        if pakker[-1] and len(pakker[-1]) + len(gruppe) > _BATCH_MAKS:
+            pakker.append([])
+        pakker[-1].extend(gruppe)
+    return [p for p in pakker if p]
+
+
+def hent_graph_klient() -> GraphKlient:
+    """
+    Return the shared GraphKlient for the configured tenant and site, creating it on first use.
+    """
+    key = (TENANT_ID, CLIENT_ID, SHAREPOINT_SITE_URL, DEFAULT_LIBRARY)
+    with _klienter_lock:
+        if key not in _klienter:
+            _klienter[key] = GraphKlient(TENANT_ID, CLIENT_ID, CLIENT_SECRET, SHAREPOINT_SITE_URL, DEFAULT_LIBRARY)
+        return _klienter[key]
 
 
 def hentToken() -> Optional[str]:
     """
     Authenticate to Microsoft Graph using app credentials and return access token.
+    The token is cached by the shared GraphKlient until shortly before it expires.
     
     Returns:
         str: Access token if successful, None if failed
     """
     try:
-        token_data = {
-            'grant_type': 'client_credentials',
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'scope': 'https://graph.microsoft.com/.default'
-        }
-        
-        token_url = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        
-        response = requests.post(token_url, data=token_data, headers=headers)
-        response.raise_for_status()
-        
-        token_info = response.json()
-        access_token = token_info['access_token']
-        
-        return access_token
-        
+        return hent_graph_klient().token()
     except Exception as e:
         print(f"❌ Authentication failed: {e}")
         return None
 
 
+def lastOppFil(kilde: Union[str, bytes, BinaryIO], file_name: Optional[str] = None) -> Dict:
+    """
+    Upload a file to the configured document library.
+
+    Files up to GRAPH_UPLOAD_SESSION_THRESHOLD go in a single PUT; larger files go
+    through a resumable upload session (see _lastOppIOkt).
+
+    Args:
+        kilde: Local file path, the file content as bytes, or a seekable binary stream
+        file_name: Name in SharePoint (required unless kilde is a path, which it defaults to)
+
+    Returns:
+        dict: The created drive item ('id', 'webUrl', ...)
+    """
+    if isinstance(kilde, str):
+        file_name = file_name or os.path.basename(kilde)
+        with open(kilde, 'rb') as f:
+            return lastOppFil(f, file_name)
+    if not file_name:
+        raise ValueError("file_name er påkrevd når kilden ikke er en filsti")
+    if isinstance(kilde, (bytes, bytearray)):
+        kilde = io.BytesIO(kilde)
+
+    graph = hent_graph_klient()
+    item_url = f"/sites/{graph.site_id()}/drives/{graph.drive_id()}/root:/{file_name}:"
+    start = kilde.tell()
+    storrelse = kilde.seek(0, io.SEEK_END) - start
+    kilde.seek(start)
+
+    start_time = time.time()
+    if storrelse > GRAPH_UPLOAD_SESSION_THRESHOLD:
+        item = _lastOppIOkt(graph, kilde, item_url, storrelse)
+    else:
+        response = graph.put(f"{item_url}/content", headers={'Content-Type': 'application/octet-stream'},
+                             data=kilde.read(storrelse))
+        response.raise_for_status()
+        item = response.json()
+
+    duration = time.time() - start_time
+    rate = storrelse / 1024 / 1024 / duration if duration > 0 else 0
+    logger.info(f"Uploaded {file_name} to SharePoint ({storrelse/1024/1024:.1f} MB, {rate:.1f} MB/s)")
+    return item
+
+
+def _lastOppIOkt(graph: GraphKlient, kilde: BinaryIO, item_url: str, storrelse: int) -> Dict:
+    """
+    Upload a stream in GRAPH_UPLOAD_CHUNK_SIZE pieces through a Graph upload session.
+
+    Graph requires the pieces of a session to arrive in order, so they are sent one at a
+    time over the pooled connection. After a failed or unanswered piece the session is
+    asked for nextExpectedRanges and the upload continues from the last byte Graph
+    acknowledged, instead of starting over.
+
+    Raises:
+        requests.HTTPError: If the session cannot be created, has expired, or a piece
+            keeps failing after GRAPH_UPLOAD_RETRIES attempts
+    """
+    response = graph.post(f"{item_url}/createUploadSession",
+                          json={'item': {'@microsoft.graph.conflictBehavior': 'replace'}})
+    response.raise_for_status()
+    upload_url = response.json()['uploadUrl']
+
+    start = kilde.tell()
+    offset = 0
+    feil = 0
+    while True:
+        kilde.seek(start + offset)
+        data = kilde.read(min(GRAPH_UPLOAD_CHUNK_SIZE, storrelse - offset))
+        # Opplastings-URL-en er forhåndsautentisert og skal ikke ha Authorization-header
+        headers = {'Content-Range': f"bytes {offset}-{offset + len(data) - 1}/{storrelse}"}
+        try:
+            # Ingen nye forsøk i HTTP-laget: etter en feil gjenopptas økta fra nextExpectedRanges
+            response = graph.http.request("PUT", upload_url, "upload-chunk", forsok=1, headers=headers, data=data)
+            graph._tell("upload-chunk")
+        except requests.RequestException as e:
+            response = None
+            logger.warning(f"Upload chunk at byte {offset} failed: {e}")
+
+        if response is not None and response.status_code in (200, 201):
+            return response.json()
+        if response is not None and response.status_code == 202:
+            offset = _nesteByte(response.json(), offset + len(data))
+            feil = 0
+            continue
+
+        feil += 1
+        if (response is not None and response.status_code == 404) or feil > GRAPH_UPLOAD_RETRIES:
+            graph.http.request("DELETE", upload_url, "upload-session", forsok=1)
+            if response is not None:
+                response.raise_for_status()
+            raise requests.HTTPError(f"Upload session for {item_url} gave up at byte {offset}")
+
+        time.sleep(ventetid(feil - 1))
+        # Spør økta hvor langt den faktisk har kommet og fortsett derfra
+        try:
+            status = graph.http.request("GET", upload_url, "upload-status")
+            graph._tell("upload-status")
+            if status.status_code == 200:
+                offset = _nesteByte(status.json(), offset)
+                logger.info(f"Resuming upload at byte {offset} of {storrelse}")
+        except requests.RequestException:
+            pass
+
+
+def _nesteByte(okt: Dict, standard: int) -> int:
+    """First missing byte from an upload session's nextExpectedRanges ('start-' or 'start-end')"""
+    omrader = okt.get('nextExpectedRanges') or []
+    if not omrader:
+        return standard
+    return int(omrader[0].split('-')[0])
+
+
+def delMedBruker(upn: str, elementer: List[Dict]) -> List[str]:
+    """
+    Grant one user read access to uploaded files and create sharing links, in one $batch.
+
+    Each file gets an invite and a createLink that depends on it, so the link is only
+    created once the permission is in place.
+
+    Args:
+        upn: User Principal Name to grant read access
+        elementer: Drive items returned by lastOppFil
+
+    Returns:
+        list: Sharing link per item, or the item's direct webUrl if the link could not be created
+    """
+    graph = hent_graph_klient()
+    items_url = f"/sites/{graph.site_id()}/drives/{graph.drive_id()}/items"
+    permission_data = {
+        'recipients': [{'email': upn}],
+        'roles': ['read'],
+        'requireSignIn': True,
+        'sendInvitation': False
+    }
+    sharing_data = {
+        'type': 'view',
+        'scope': 'users'  # Only users with permissions can access
+    }
+
+    foresporsler = []
+    for i, element in enumerate(elementer):
+        foresporsler.append({'id': f'invite-{i}', 'method': 'POST',
+                             'url': f"{items_url}/{element['id']}/invite", 'body': permission_data})
+        foresporsler.append({'id': f'link-{i}', 'method': 'POST', 'dependsOn': [f'invite-{i}'],
+                             'url': f"{items_url}/{element['id']}/createLink", 'body': sharing_data})
+    svar = graph.batch(foresporsler)
+
+    lenker = []
+    for i, element in enumerate(elementer):
+        invite = svar.get(f'invite-{i}', {})
+        if invite.get('status') in (200, 201):
+            logger.info(f"Granted exclusive access to: {upn}")
+        else:
+            logger.warning(f"Permission grant may have failed: {invite.get('status')}")
+
+        link = svar.get(f'link-{i}', {})
+        if link.get('status') in (200, 201):
+            logger.info("Secure sharing link created successfully")
+            lenker.append(link['body']['link']['webUrl'])
+        else:
+            logger.warning(f"Sharing link creation failed: {link.get('status')}, using direct URL")
+            lenker.append(element['webUrl'])
+    return lenker
+
+
+def slettFil(element: Dict):
+    """Delete an uploaded drive item, e.g. when a publish attempt fails halfway and will be retried"""
+    graph = hent_graph_klient()
+    response = graph.request("DELETE", f"/sites/{graph.site_id()}/drives/{graph.drive_id()}/items/{element['id']}")
+    if response.status_code != 404:
+        response.raise_for_status()
+
+
+def _epost(upn: str, subject: str, message: str) -> Dict:
+    return {
+        'message': {
+            'subject': subject,
+            'body': {
+                'contentType': 'Text',
+                'content': message
+            },
+            'toRecipients': [
+                {
+                    'emailAddress': {
+                        'address': upn
+                    }
+                }
+            ]
+        }
+    }
+
+
+def sendEpost(upn: str, subject: str, message: str) -> bool:
+    """
+    Send a plain-text email to a user through Graph sendMail.
+
+    Returns:
+        bool: True if Graph accepted the message
+    """
+    # Use application permissions to send mail
+    email_response = hent_graph_klient().post(f"/users/{upn}/sendMail", json=_epost(upn, subject, message))
+
+    if email_response.status_code == 202:
+        logger.info(f"Email sent via Graph API to {upn}")
+        return True
+    logger.error(f"Failed to send email via Graph API: {email_response.status_code} - {email_response.text}")
+    return False
+
+
+def sendEposter(eposter: List[tuple]) -> List[bool]:
+    """
+    Send several plain-text emails, in one $batch when there is more than one.
+
+    Args:
+        eposter: [(upn, subject, message), ...]
+
+    Returns:
+        list: True per email that Graph accepted
+    """
+    if not eposter:
+        return []
+    if len(eposter) == 1:
+        return [sendEpost(*eposter[0])]
+
+    foresporsler = [
+        {'id': str(i), 'method': 'POST', 'url': f"/users/{upn}/sendMail", 'body': _epost(upn, subject, message)}
+        for i, (upn, subject, message) in enumerate(eposter)
+    ]
+    svar = hent_graph_klient().batch(foresporsler, prov_igjen=_IKKE_SENDT)
+
+    resultater = []
+    for i, (upn, _, _) in enumerate(eposter):
+        status = svar.get(str(i), {}).get('status')
+        if status == 202:
+            logger.info(f"Email sent via Graph API to {upn}")
+        else:
+            logger.error(f"Failed to send email via Graph API to {upn}: {status}")
+        resultater.append(status == 202)
+    return resultater
+
+
 def _hentSiteId(token: str) -> Optional[str]:
     """Get SharePoint site ID from URL."""
     try:
@@ -62,7 +602,7 @@ def _hentSiteId(token: str) -> Optional[str]:
         headers = {'Authorization': f'Bearer {token}'}
         url = f"{GRAPH_URL}/sites/{hostname}:/{site_path}"
         
-        response = requests.get(url, headers=headers)
+        response = hent_graph_klient().http.request("GET", url, "site", headers=headers)
         response.raise_for_status()
         
         return response.json()['id']
@@ -89,7 +629,7 @@ def _settTilganger(token: str, site_id: str, drive_id: str, file_id: str, upn: s
         }
         
         invite_url = f"{GRAPH_URL}/sites/{site_id}/drives/{drive_id}/items/{file_id}/invite"
-        invite_response = requests.post(invite_url, headers=headers, json=permission_data)
+        invite_response = hent_graph_klient().http.request("POST", invite_url, "invite", headers=headers, json=permission_data)
         
         if invite_response.status_code in [200, 201]:
             return True
@@ -118,7 +658,7 @@ def _lagDelingslenke(token: str, site_id: str, drive_id: str, file_id: str) -> O
         }
         
         url = f"{GRAPH_URL}/sites/{site_id}/drives/{drive_id}/items/{file_id}/createLink"
-        response = requests.post(url, headers=headers, json=sharing_data)
+        response = hent_graph_klient().http.request("POST", url, "createLink", headers=headers, json=sharing_data)
         
         if response.status_code in [200, 201]:
             return response.json()['link']['webUrl']
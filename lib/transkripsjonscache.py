@@ -0,0 +1,207 @@
+"""
+Transcription Cache for Transcription Service
+Content-addressed cache of transcripts, segments and summaries, keyed on a hash of the
+decoded audio plus the model and parameters that produced them. A recording that is uploaded
+again (to get a new link, after a failed email, ...) is published from the cache instead of
+paying for Whisper and Ollama a second time.
+
+Entries live on disk as one JSON file each. The file's mtime is when the entry was created
+(used for the TTL), and its atime is when it was last used (used for LRU eviction).
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("HUGIN_CACHE_DIR", "./cache/transkripsjoner")
+CACHE_MAX_MB = float(os.getenv("HUGIN_CACHE_MAX_MB", "500"))
+# Transkripsjonene er personopplysninger og skal ikke ligge lenger enn oppbevaringsreglene tillater
+CACHE_TTL_DAYS = float(os.getenv("HUGIN_CACHE_TTL_DAYS", "7"))
+
+_cacher = {}
+_cacher_lock = threading.Lock()
+
+
+def innholdsnokkel(lyd: "np.ndarray", parametre: Dict) -> str:
+    """
+    Cache key for decoded audio transcribed with the given model and parameters.
+
+    Args:
+        lyd: Decoded 16 kHz mono samples
+        parametre: Everything that affects the transcript (backend, model, decoding settings)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    # numpy importeres her så tjenesten kan starte og sjekke cachen uten å laste det
+    import numpy as np
+
+    h = hashlib.sha256()
+    h.update(json.dumps(parametre, sort_keys=True).encode("utf-8"))
+    h.update(np.ascontiguousarray(lyd, dtype=np.float32))
+    return h.hexdigest()
+
+
+class Transkripsjonscache:
+    """
+    Size-bounded LRU cache with a TTL for transcripts and summaries.
+
+    Args:
+        mappe: Directory for cache entries
+        maks_mb: Maximum total size; least recently used entries are evicted beyond it.
+            0 disables the cache.
+        ttl_dager: Entries older than this are deleted regardless of use
+    """
+
+    def __init__(self, mappe: str = CACHE_DIR, maks_mb: float = CACHE_MAX_MB, ttl_dager: float = CACHE_TTL_DAYS):
+        self.mappe = mappe
+        self.maks_bytes = int(maks_mb * 1024 * 1024)
+        self.ttl = ttl_dager * 86400
+        self.aktiv = self.maks_bytes > 0
+        self.teller = collections.Counter()
+        self._lock = threading.Lock()
+        if self.aktiv:
+            os.makedirs(mappe, exist_ok=True)
+
+    def _sti(self, nokkel: str) -> str:
+        return os.path.join(self.mappe, f"{nokkel}.json")
+
+    def hent(self, nokkel: str) -> Optional[Dict]:
+        """
+        Return the cached entry for a key and mark it as recently used.
+
+        Returns:
+            dict: {'text', 'segments', 'summary', 'summary_model', 'created'} or None on a miss
+        """
+        if not self.aktiv:
+            return None
+
+        sti = self._sti(nokkel)
+        with self._lock:
+            try:
+                st = os.stat(sti)
+                if time.time() - st.st_mtime > self.ttl:
+                    os.remove(sti)
+                    self.teller["utlopt"] += 1
+                    raise FileNotFoundError(sti)
+                with open(sti, "r", encoding="utf-8") as f:
+                    oppforing = json.load(f)
+                # atime = sist brukt (LRU), mtime = opprettet (TTL)
+                os.utime(sti, (time.time(), st.st_mtime))
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.teller["bom"] += 1
+                return None
+
+            self.teller["treff"] += 1
+        return oppforing
+
+    def _skriv(self, nokkel: str, oppforing: Dict):
+        sti = self._sti(nokkel)
+        tmp = f"{sti}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(oppforing, f, ensure_ascii=False)
+        os.replace(tmp, sti)
+        naa = time.time()
+        os.utime(sti, (naa, oppforing["created"]))
+
+    def lagre_transkripsjon(self, nokkel: str, resultat: Dict):
+        """Store a transcript (the backend result with 'text' and 'segments')"""
+        if not self.aktiv:
+            return
+        segments = [
+            {"start": s.get("start"), "end": s.get("end"), "text": s.get("text", "")}
+            for s in resultat.get("segments") or []
+        ]
+        oppforing = {
+            "text": resultat.get("text", ""),
+            "segments": segments,
+            "summary": None,
+            "summary_model": None,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._skriv(nokkel, oppforing)
+            self.teller["lagret"] += 1
+        self.rydd()
+
+    def lagre_sammendrag(self, nokkel: str, sammendrag: str, modell: str):
+        """Add a summary to an existing entry (ignored if the transcript is no longer cached)"""
+        if not self.aktiv:
+            return
+        sti = self._sti(nokkel)
+        with self._lock:
+            try:
+                with open(sti, "r", encoding="utf-8") as f:
+                    oppforing = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return
+            oppforing["summary"] = sammendrag
+            oppforing["summary_model"] = modell
+            self._skriv(nokkel, oppforing)
+        self.rydd()
+
+    def rydd(self):
+        """Delete expired entries, then evict least recently used entries until under the size limit"""
+        if not self.aktiv:
+            return
+
+        naa = time.time()
+        with self._lock:
+            oppforinger = []
+            for navn in os.listdir(self.mappe):
+                if not navn.endswith(".json"):
+                    continue
+                sti = os.path.join(self.mappe, navn)
+                try:
+                    st = os.stat(sti)
+                except FileNotFoundError:
+                    continue
+                if naa - st.st_mtime > self.ttl:
+                    os.remove(sti)
+                    self.teller["utlopt"] += 1
+                    continue
+                oppforinger.append((st.st_atime, st.st_size, sti))
+
+            total = sum(storrelse for _, storrelse, _ in oppforinger)
+            for _, storrelse, sti in sorted(oppforinger):
+                if total <= self.maks_bytes:
+                    break
+                os.remove(sti)
+                total -= storrelse
+                self.teller["utkastet"] += 1
+
+    def nullstill_teller(self):
+        """Reset the hit/miss counters, e.g. at the start of a run"""
+        self.teller.clear()
+
+    def rapport(self) -> List[str]:
+        """Hit/miss counters as report lines"""
+        if not self.aktiv:
+            return ["🗄️  TRANSKRIPSJONSCACHE: av"]
+        oppslag = self.teller["treff"] + self.teller["bom"]
+        treffrate = self.teller["treff"] / oppslag if oppslag else 0.0
+        return [
+            "🗄️  TRANSKRIPSJONSCACHE:",
+            f"   • {self.teller['treff']} treff, {self.teller['bom']} bom (treffrate {treffrate:.0%})",
+            f"   • {self.teller['lagret']} lagret, {self.teller['utkastet']} utkastet (LRU), {self.teller['utlopt']} utløpt",
+        ]
+
+
+def hent_transkripsjonscache(mappe: str = CACHE_DIR) -> Transkripsjonscache:
+    """
+    Return the shared Transkripsjonscache for a directory, creating it on first use.
+    """
+    with _cacher_lock:
+        if mappe not in _cacher:
+            _cacher[mappe] = Transkripsjonscache(mappe)
+        return _cacher[mappe]
@@ -0,0 +1,141 @@
+"""
+Notification Aggregator for Transcription Service
+Collects finished jobs per recipient and sends one email per recipient for everything that
+finished within a window, instead of one email per recording. Whatever is still waiting
+when a run ends is sent together at the end of the run.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sekunder fra første ferdige jobb for en bruker til varselet sendes. Jobber som blir ferdige
+# i mellomtiden kommer med i samme e-post. 0 = ett varsel per bruker per runde.
+VARSEL_VINDU_SEKUNDER = float(os.getenv("HUGIN_NOTIFY_WINDOW_SECONDS", "600"))
+
+
+class Varselsamler:
+    """
+    Groups jobs per recipient and notifies each recipient once per window.
+
+    Args:
+        send: Callable taking {recipient: [job, ...]} and returning {recipient: bool}.
+            Several recipients may be passed at once so the emails can go in one request.
+        ferdig: Callable (job, ok, error) run for every job after its notification was sent
+            (ok=True) or failed (ok=False), e.g. to acknowledge or release it
+        vindu: Window in seconds (0 = only send when tom() is called)
+    """
+
+    def __init__(self, send: Callable[[Dict[str, List[Dict]]], Dict[str, bool]],
+                 ferdig: Callable[[Dict, bool, Optional[Exception]], None],
+                 vindu: float = VARSEL_VINDU_SEKUNDER):
+        self.send = send
+        self.ferdig = ferdig
+        self.vindu = vindu
+        self.ferdige = []
+        self.feilede = []
+        self.antall_varsler = 0
+
+        self._ventende = {}   # mottaker -> (frist, [jobb, ...])
+        self._lock = threading.Condition()
+        self._traad = None
+        self._stopp = False
+
+    def legg_til(self, mottaker: Optional[str], jobb: Dict):
+        """
+        Queue a finished job for its recipient's next notification.
+
+        Jobs without a recipient need no notification and are completed right away.
+        """
+        if not mottaker:
+            self._fullfor([jobb], True, None)
+            return
+
+        with self._lock:
+            if mottaker in self._ventende:
+                self._ventende[mottaker][1].append(jobb)
+            else:
+                self._ventende[mottaker] = (time.time() + self.vindu, [jobb])
+                logger.info(f"📬 Samler varsler til {mottaker} "
+                            + (f"i {self.vindu:.0f}s" if self.vindu > 0 else "til slutten av runden"))
+            if self.vindu > 0 and self._traad is None:
+                self._stopp = False
+                self._traad = threading.Thread(target=self._vakt, name="varselsamler", daemon=True)
+                self._traad.start()
+            self._lock.notify()
+
+    def _vakt(self):
+        """Sends notifications whose window has run out"""
+        while True:
+            with self._lock:
+                while not self._stopp:
+                    naa = time.time()
+                    forfalt = [m for m, (frist, _) in self._ventende.items() if frist <= naa]
+                    if forfalt:
+                        break
+                    neste = min((frist for frist, _ in self._ventende.values()), default=None)
+                    self._lock.wait(None if neste is None else neste - naa)
+                if self._stopp:
+                    return
+                grupper = {m: self._ventende.pop(m)[1] for m in forfalt}
+            self._send(grupper)
+
+    def tom(self) -> Tuple[List[Dict], List[Tuple[Dict, Exception]]]:
+        """
+        Send everything still waiting and stop the window timer, e.g. at the end of a run.
+
+        Returns:
+            tuple: (completed jobs, failed jobs as (job, error)) since the last nullstill()
+        """
+        with self._lock:
+            grupper = {m: jobber for m, (_, jobber) in self._ventende.items()}
+            self._ventende.clear()
+            self._stopp = True
+            self._lock.notify()
+            traad, self._traad = self._traad, None
+        if traad:
+            traad.join()
+        if grupper:
+            self._send(grupper)
+        return list(self.ferdige), list(self.feilede)
+
+    def _send(self, grupper: Dict[str, List[Dict]]):
+        try:
+            resultater = self.send(grupper)
+        except Exception as e:
+            logger.error(f"❌ Sending av varsler feilet: {e}")
+            resultater = {}
+
+        for mottaker, jobber in grupper.items():
+            if resultater.get(mottaker):
+                with self._lock:
+                    self.antall_varsler += 1
+                logger.info(f"📧 Ett varsel sendt til {mottaker} for {len(jobber)} opptak")
+                self._fullfor(jobber, True, None)
+            else:
+                self._fullfor(jobber, False, RuntimeError(f"Kunne ikke sende varsel til {mottaker}"))
+
+    def _fullfor(self, jobber: List[Dict], ok: bool, feil: Optional[Exception]):
+        for jobb in jobber:
+            jobb_ok, jobb_feil = ok, feil
+            try:
+                self.ferdig(jobb, ok, feil)
+            except Exception as e:
+                jobb_ok, jobb_feil = False, e
+                logger.error(f"❌ Fullføring etter varsel feilet: {e}")
+            with self._lock:
+                if jobb_ok:
+                    self.ferdige.append(jobb)
+                else:
+                    self.feilede.append((jobb, jobb_feil))
+
+    def nullstill(self):
+        """Forget completed and failed jobs from the previous run"""
+        with self._lock:
+            self.ferdige = []
+            self.feilede = []
+            self.antall_varsler = 0
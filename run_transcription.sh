@@ -6,4 +6,4 @@ cd "/Users/fuzzbin/Documents/GitHub_TFK/transkripsjonNB"
 
 # Activate virtual environment and run
 source .venv/bin/activate
-python HuginLokalTranskripsjon.py
+python HuginLokalTranskripsjon.py "$@"
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for chunked transcription of long recordings
+Runs on any machine with the stub ASR backend and synthetic audio (no model, no ffmpeg)
+"""
+
+import sys
+import time
+
+import numpy as np
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+from lyd import SAMPLE_RATE, del_i_biter
+from asr_backends import StubBackend, _fjern_gjentakelse, transkriber_i_biter
+
+TALE_SEKUNDER = 4.0
+PAUSE_SEKUNDER = 0.7
+
+
+def lag_opptak(minutter):
+    """Synthetic recording: 4 s of noise ('speech') followed by 0.7 s of near silence, repeated"""
+    rng = np.random.default_rng(0)
+    deler = []
+    for _ in range(int(minutter * 60 / (TALE_SEKUNDER + PAUSE_SEKUNDER))):
+        deler.append(rng.normal(0, 0.2, int(TALE_SEKUNDER * SAMPLE_RATE)).astype(np.float32))
+        deler.append(rng.normal(0, 0.002, int(PAUSE_SEKUNDER * SAMPLE_RATE)).astype(np.float32))
+    return np.concatenate(deler)
+
+
+def test_kutt_i_pauser():
+    """Every chunk boundary should land in a pause"""
+    print("✂️  Testing silence-based chunk boundaries")
+    lyd = lag_opptak(40)
+    biter = del_i_biter(lyd, 300)
+
+    assert biter[0][0] == 0 and biter[-1][1] == len(lyd), "Chunks must cover the whole recording"
+    for (_, slutt), (start, _) in zip(biter, biter[1:]):
+        assert slutt == start, "Chunks must not overlap or leave gaps"
+
+    periode = TALE_SEKUNDER + PAUSE_SEKUNDER
+    for _, slutt in biter[:-1]:
+        posisjon = (slutt / SAMPLE_RATE) % periode
+        assert posisjon >= TALE_SEKUNDER, f"Cut at {slutt / SAMPLE_RATE:.1f}s is inside speech"
+
+    print(f"✅ {len(biter)} chunks, all cuts in pauses")
+    return True
+
+
+def test_sammensying():
+    """Chunked and parallel decoding should give ordered, non-duplicated segments"""
+    print("🧵 Testing chunked transcription with the stub backend")
+    lyd = lag_opptak(40)
+    backend = StubBackend(sanntidsfaktor=0.001)
+
+    start_time = time.time()
+    hel = backend.transkriber(lyd)
+    hel_tid = time.time() - start_time
+
+    start_time = time.time()
+    resultat = transkriber_i_biter(backend, lyd, chunk_sekunder=300, arbeidere=4)
+    bit_tid = time.time() - start_time
+
+    starter = [s["start"] for s in resultat["segments"]]
+    assert starter == sorted(starter), "Segments must be in chronological order"
+    assert starter[-1] > len(lyd) / SAMPLE_RATE - 30, "Timestamps must be absolute, not per chunk"
+
+    # Sømmene kan flytte segmentgrensene litt, men antallet skal ligge nær én samlet dekoding
+    assert abs(len(resultat["segments"]) - len(hel["segments"])) <= len(resultat["segments"]) * 0.05
+
+    print(f"✅ {len(resultat['segments'])} segments (single pass: {len(hel['segments'])})")
+    print(f"   ⏱️  Single pass {hel_tid:.2f}s, chunked with 4 workers {bit_tid:.2f}s")
+    return True
+
+
+def test_gjentakelse_i_somm():
+    """Words repeated across a seam are removed once"""
+    print("🔁 Testing seam de-duplication")
+    assert _fjern_gjentakelse(" og så gikk vi hjem.", " Gikk vi hjem, og spiste.") == " og spiste."
+    assert _fjern_gjentakelse(" hei der", " noe helt annet") == " noe helt annet"
+    print("✅ Repeated words removed")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting chunked transkriber test...")
+    print()
+
+    resultater = []
+    for test in (test_kutt_i_pauser, test_sammensying, test_gjentakelse_i_somm):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script for event-driven intake in lib/hendelseko.py
+Checks that Event Grid BlobCreated messages are understood, and - against Azurite's queue
+service - long-polling, visibility timeouts and deleting handled messages.
+
+Start Azurite first for the queue test (it is skipped if nothing listens on port 10001):
+    docker run -p 10001:10001 mcr.microsoft.com/azure-storage/azurite azurite-queue --queueHost 0.0.0.0
+"""
+
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from hendelseko import Hendelseko, tolk_melding
+
+# Standard utviklingskonto for Azurite
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "QueueEndpoint=http://127.0.0.1:10001/devstoreaccount1;"
+)
+CONNECTION_STRING = os.getenv("TEST_QUEUE_CONNECTION_STRING", AZURITE_CONNECTION_STRING)
+CONTAINER = "opptak"
+
+
+def hendelse(blob_name, container=CONTAINER, event_type="Microsoft.Storage.BlobCreated", cloudevents=False):
+    """Queue message text as Event Grid writes it: base64-encoded JSON"""
+    innhold = {
+        "subject": f"/blobServices/default/containers/{container}/blobs/{blob_name}",
+        "data": {"api": "PutBlob", "url": f"https://konto.blob.core.windows.net/{container}/{blob_name}"},
+    }
+    innhold["type" if cloudevents else "eventType"] = event_type
+    return base64.b64encode(json.dumps(innhold).encode("utf-8")).decode("ascii")
+
+
+def test_tolk_melding():
+    """BlobCreated events for the container give the blob name; everything else is ignored"""
+    print("📨 Testing Event Grid message parsing")
+    assert tolk_melding(hendelse("møte 1.m4a"), CONTAINER) == "møte 1.m4a"
+    assert tolk_melding(hendelse("mappe/notat.mp3", cloudevents=True), CONTAINER) == "mappe/notat.mp3"
+    assert tolk_melding(base64.b64decode(hendelse("notat.mp3")).decode("utf-8"), CONTAINER) == "notat.mp3", \
+        "Plain JSON messages must be accepted too"
+    assert tolk_melding(hendelse("notat.mp3", container="annen"), CONTAINER) is None
+    assert tolk_melding(hendelse("notat.mp3", event_type="Microsoft.Storage.BlobDeleted"), CONTAINER) is None
+    assert tolk_melding(hendelse(""), CONTAINER) is None
+    assert tolk_melding("ikke json", CONTAINER) is None
+    print("✅ Event Grid and CloudEvents messages parsed, others ignored")
+    return True
+
+
+class FalskKo:
+    """Stand-in for QueueClient.delete_message: fails per message id as given"""
+
+    def __init__(self, feil):
+        self.feil = feil
+        self.slettet = []
+
+    def delete_message(self, melding):
+        if melding.id in self.feil:
+            raise self.feil[melding.id]
+        self.slettet.append(melding.id)
+
+
+def test_slett_utdaterte_meldinger():
+    """Deleting a message that was already deleted or re-delivered elsewhere does not stop the batch"""
+    print("🗑️  Testing delete with stale pop receipts")
+    utdatert = HttpResponseError(message="PopReceiptMismatch")
+    utdatert.status_code = 400
+    utdatert.error_code = "PopReceiptMismatch"
+    serverfeil = HttpResponseError(message="ServerBusy")
+    serverfeil.status_code = 503
+
+    ko = Hendelseko(AZURITE_CONNECTION_STRING, "hugin-test", CONTAINER)
+    ko.queue_client = FalskKo({"borte": ResourceNotFoundError("MessageNotFound"), "levert_igjen": utdatert})
+    ko.slett([SimpleNamespace(id=i) for i in ("a", "borte", "levert_igjen", "b")])
+    assert ko.queue_client.slettet == ["a", "b"], "The rest of the batch must still be deleted"
+    assert ko.teller["slettet"] == 2
+
+    ko.queue_client = FalskKo({"a": serverfeil})
+    try:
+        ko.slett([SimpleNamespace(id="a")])
+        assert False, "Other errors must still be raised"
+    except HttpResponseError as e:
+        assert e.status_code == 503
+    print("✅ Stale and missing messages skipped, other errors raised")
+    return True
+
+
+def azurite_kjorer():
+    try:
+        socket.create_connection(("127.0.0.1", 10001), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def test_ko_mot_azurite():
+    """Events arrive within seconds, stay hidden while handled, come back if not deleted"""
+    print("📬 Testing long-poll and visibility timeout against Azurite")
+    if CONNECTION_STRING == AZURITE_CONNECTION_STRING and not azurite_kjorer():
+        print("⏭️  Azurite queue service not running on 127.0.0.1:10001 - skipped")
+        return True
+
+    ko = Hendelseko(CONNECTION_STRING, f"hugin-test-{os.getpid()}", CONTAINER, synlighet=2)
+    ko.opprett()
+    try:
+        # Tom kø: vent() gir opp ved fristen, og stopper med en gang når stopp er satt
+        start = time.time()
+        assert ko.vent(1.5) == {}
+        assert 1.5 <= time.time() - start < 5
+        stopp = threading.Event()
+        stopp.set()
+        start = time.time()
+        assert ko.vent(30, stopp) == {}
+        assert time.time() - start < 5, "A set stop event must end the wait"
+
+        # En hendelse som kommer mens noden venter plukkes opp innen sekunder
+        def last_opp():
+            time.sleep(1)
+            ko.queue_client.send_message(hendelse("annen.mp3", container="annen"))
+            ko.queue_client.send_message(hendelse("møte.m4a"))
+        threading.Thread(target=last_opp).start()
+        start = time.time()
+        hendelser = ko.vent(30)
+        if not hendelser:
+            hendelser = ko.vent(5)  # de to meldingene kan komme i hvert sitt mottak
+        assert list(hendelser) == ["møte.m4a"], hendelser
+        assert time.time() - start < 10
+        assert ko.teller["ignorert"] == 1, "The event for another container must be deleted"
+
+        # Mottatt men ikke slettet: usynlig i synlighetstiden, deretter tilbake
+        assert ko.motta() == {}
+        time.sleep(2.5)
+        igjen = ko.motta()
+        assert list(igjen) == ["møte.m4a"]
+        assert igjen["møte.m4a"][0].dequeue_count == 2
+
+        # Slettet: kommer ikke tilbake
+        ko.slett(igjen["møte.m4a"])
+        time.sleep(2.5)
+        assert ko.motta() == {}
+    finally:
+        ko.queue_client.delete_queue()
+    print(f"✅ Queue behaves as expected ({ko.rapport()})")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting event queue test...")
+    print()
+
+    resultater = []
+    for test in (test_tolk_melding, test_slett_utdaterte_meldinger, test_ko_mot_azurite):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-job local file names
+Recordings with the same name (other file type, other folder, uploaded again) must not share
+download, transcript or summary files. Runs with the stub ASR backend in a temporary directory.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+BLOBS = ["møte.mp3", "møte.m4a", "a.1.mp3", "a.2.mp3", "mappe/notat.mp3", "mappenotat.mp3"]
+
+
+def i_tom_mappe(test):
+    """Runs the test in a fresh working directory (the service writes logs and output relative to it)"""
+    def kjor():
+        forrige, miljo = os.getcwd(), dict(os.environ)
+        os.chdir(tempfile.mkdtemp(prefix="hugin-lokale-filer-"))
+        os.environ["HUGIN_JOB_DB"] = os.path.abspath("jobber.db")
+        sys.path[:0] = [REPO]
+        try:
+            return test()
+        finally:
+            sys.path.remove(REPO)
+            os.chdir(forrige)
+            os.environ.clear()
+            os.environ.update(miljo)
+    kjor.__name__ = test.__name__
+    kjor.__doc__ = test.__doc__
+    return kjor
+
+
+@i_tom_mappe
+def test_unike_navn():
+    """Every blob version gets its own local base name"""
+    print("🗂️  Testing local file names for recordings with the same name")
+    import HuginLokalTranskripsjon as hugin
+
+    blobs = [{"name": navn, "size": 1024, "etag": '"0x1"', "metadata": {}} for navn in BLOBS]
+    jobber = hugin.lag_jobber(blobs)
+    navn = [jobb["base_name"] for jobb in jobber]
+    assert len(jobber) == len(BLOBS)
+    assert len(set(navn)) == len(navn), f"Local names collide: {navn}"
+    assert all(n.startswith(j["safe_filename"].rsplit(".", 1)[0] + "_") for n, j in zip(navn, jobber)), \
+        "The local name should still show which recording it belongs to"
+
+    ny_versjon = hugin.lokalt_navn("møte.mp3", '"0x2"', "møte.mp3")
+    assert ny_versjon not in navn, "A new upload of the same blob must not reuse the old files"
+    assert hugin.lokalt_navn("møte.mp3", '"0x1"', "møte.mp3") in navn, "The name must be stable across runs"
+    print(f"✅ {len(navn)} distinct local names")
+    return True
+
+
+@i_tom_mappe
+def test_transkripsjon_til_eget_navn():
+    """htl.transkriber writes to the given output name, not the file name up to the first dot"""
+    print("📝 Testing transcript output names")
+    os.environ["HUGIN_ASR_BACKEND"] = "stub"
+    from lib import hugintranskriptlib as htl
+
+    lyd = np.random.default_rng(0).normal(0, 0.2, 10 * 16000).astype(np.float32)
+    htl.transkriber("./blobber/", "a.1.mp3", lyd=lyd, utnavn="a.1_1111111111")
+    htl.transkriber("./blobber/", "a.2.mp3", lyd=lyd, utnavn="a.2_2222222222", word_timestamps=True)
+    assert os.path.exists("./ferdig_tekst/a.1_1111111111.txt")
+    assert os.path.exists("./ferdig_tekst/a.2_2222222222.txt")
+    assert os.path.exists("./ferdig_tekst/a.2_2222222222.srt")
+    assert not os.path.exists("./ferdig_tekst/a.txt"), "Output name must not be cut at the first dot"
+
+    htl.srt_til_tekst("a.2_2222222222.srt")
+    assert os.path.exists("./oppsummeringer/a.2_2222222222.txt")
+    print("✅ Transcripts written under the job's own name")
+    return True
+
+
+@i_tom_mappe
+def test_gjenoppta_uten_sammendrag():
+    """A resumed job whose summary file is gone goes back to summarizing instead of failing to publish"""
+    print("♻️  Testing resume after a lost summary file")
+    import HuginLokalTranskripsjon as hugin
+    from lib.jobbregister import NEW, SUMMARIZED, TRANSCRIBED
+
+    blob = {"name": "møte.mp3", "size": 1024, "etag": '"0x9"', "metadata": {}}
+    jobb = hugin.lag_jobber([blob])[0]
+    os.makedirs("ferdig_tekst")
+    jobb["txt_file_path"] = os.path.abspath(f"ferdig_tekst/{jobb['base_name']}.txt")
+    with open(jobb["txt_file_path"], "w", encoding="utf-8") as f:
+        f.write("tekst\n")
+    jobb["summary_files"] = {"txt": os.path.abspath(f"{jobb['base_name']}_ai_sammendrag.txt")}
+    hugin.hent_jobbregister().lagre(jobb, SUMMARIZED)
+
+    gjenopptatt = hugin.lag_jobber([blob])[0]
+    assert gjenopptatt["state"] == TRANSCRIBED, f"Resumed at '{gjenopptatt['state']}'"
+    assert "summary_files" not in gjenopptatt
+
+    with open(jobb["summary_files"]["txt"], "w", encoding="utf-8") as f:
+        f.write("sammendrag\n")
+    hugin.hent_jobbregister().lagre(jobb, SUMMARIZED)
+    assert hugin.lag_jobber([blob])[0]["state"] == SUMMARIZED, "With the summary present the job resumes as is"
+
+    jobb["summary_files"] = {}
+    os.remove(jobb["txt_file_path"])
+    hugin.hent_jobbregister().lagre(jobb, SUMMARIZED)
+    assert hugin.lag_jobber([blob])[0]["state"] == NEW, "Without the transcript the job starts over"
+    print("✅ Lost summary is regenerated, lost transcript starts the job over")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting local file name test...")
+    print()
+
+    resultater = []
+    for test in (test_unike_navn, test_transkripsjon_til_eget_navn, test_gjenoppta_uten_sammendrag):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the memory held by decoded audio in the pipeline
+Queues several long synthetic recordings behind a slow (stub) transcription stage and checks
+that peak RSS grows by about one decoded recording, not one per queued file
+(PIPELINE_DECODED_AUDIO). Needs ffmpeg and ffprobe on PATH; no model or storage.
+"""
+
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+ANTALL_FILER = 6
+MINUTTER = 10
+LYD_MB = MINUTTER * 60 * 16000 * 4 / 1024 / 1024  # float32, 16 kHz mono
+
+
+def lag_opptak(sti, nr):
+    """Synthetic recording: one tone per file (so the cache never hits) with a pause every 7 seconds"""
+    lyd = f"aevalsrc=0.3*sin(2*PI*{300 + nr}*t)*gt(mod(t\\,7)\\,1.5):s=16000:d={MINUTTER * 60}"
+    subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-f", "lavfi", "-i", lyd,
+                    "-c:a", "aac", "-b:a", "32k", sti], check=True)
+
+
+def topp_rss_mb():
+    # ru_maxrss er i bytes på macOS og i KB på Linux
+    faktor = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * faktor / 1024 / 1024
+
+
+def kjor_barn(arbeidsmappe):
+    """Runs in its own process: konvertering → transkripsjon for all files, prints peak RSS growth as JSON"""
+    os.chdir(arbeidsmappe)
+    sys.path[:0] = [REPO]
+
+    import HuginLokalTranskripsjon as hugin
+    from lib.jobbregister import NEW
+    from lib.pipeline import Pipeline, Steg
+
+    # Last numpy, backenden og ffmpeg-python før målingen starter
+    hugin.htl.last_modell()
+    hugin.htl.lydvarighet(os.path.join(arbeidsmappe, "opptak_0.m4a"))
+
+    jobber = []
+    for nr in range(ANTALL_FILER):
+        navn = f"opptak_{nr}.m4a"
+        jobber.append({"nr": nr + 1, "antall": ANTALL_FILER, "blob_name": navn, "etag": "e", "size": 0,
+                       "metadata": {}, "safe_filename": navn, "file_extension": "m4a",
+                       "base_name": navn.rsplit(".", 1)[0], "state": NEW,
+                       "local_file_path": os.path.join(arbeidsmappe, navn)})
+
+    pipeline = Pipeline([
+        Steg("konvertering", hugin.steg_konverter, hugin.PIPELINE_WORKERS["konvertering"]),
+        Steg("transkripsjon", hugin.steg_transkriber, hovedtraad=True),
+    ], kostorrelse=hugin.PIPELINE_QUEUE_SIZE, ved_feil=lambda jobb, steg, feil: hugin.slipp_lyd(jobb))
+
+    for_kjoring = topp_rss_mb()
+    ferdige, feilede = pipeline.kjor(jobber)
+    print(json.dumps({"ferdige": len(ferdige), "feilede": [(j["blob_name"], s, str(f)) for j, s, f in feilede],
+                      "okning_mb": topp_rss_mb() - for_kjoring}))
+
+
+def test_dekodet_lyd_i_minnet():
+    """Peak RSS grows by about one decoded recording however many files are queued"""
+    print(f"🧠 Testing memory for {ANTALL_FILER} queued {MINUTTER}-minute recordings "
+          f"({LYD_MB:.0f} MB decoded each)")
+    if not (shutil.which("ffmpeg") and shutil.which("ffprobe")):
+        print("⏭️  ffmpeg/ffprobe not on PATH - skipped")
+        return True
+
+    arbeidsmappe = tempfile.mkdtemp(prefix="hugin-lydminne-")
+    for nr in range(ANTALL_FILER):
+        lag_opptak(os.path.join(arbeidsmappe, f"opptak_{nr}.m4a"), nr)
+
+    # Transkripsjonen er tregere enn dekodingen, så køen foran den fylles
+    miljo = dict(os.environ, HUGIN_ASR_BACKEND="stub", HUGIN_STUB_RTF="0.005",
+                 HUGIN_JOB_DB=os.path.join(arbeidsmappe, "jobber.db"),
+                 HUGIN_CACHE_DIR=os.path.join(arbeidsmappe, "cache"))
+    prosess = subprocess.run([sys.executable, os.path.abspath(__file__), "--barn", arbeidsmappe], env=miljo,
+                             capture_output=True, text=True)
+    assert prosess.returncode == 0, f"Child process failed:\n{prosess.stderr[-3000:]}"
+    resultat = json.loads(prosess.stdout.strip().splitlines()[-1])
+
+    assert resultat["ferdige"] == ANTALL_FILER, f"Not all files transcribed: {resultat['feilede']}"
+    grense = 2.5 * LYD_MB
+    assert resultat["okning_mb"] <= grense, \
+        f"Peak RSS grew {resultat['okning_mb']:.0f} MB, limit {grense:.0f} MB (one recording is {LYD_MB:.0f} MB)"
+    shutil.rmtree(arbeidsmappe, ignore_errors=True)
+    print(f"✅ Peak RSS grew {resultat['okning_mb']:.0f} MB for {ANTALL_FILER} files")
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--barn":
+        kjor_barn(sys.argv[2])
+        sys.exit(0)
+
+    print("Starting decoded audio memory test...")
+    print()
+
+    resultater = []
+    for test in (test_dekodet_lyd_i_minnet,):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics in lib/metrikker.py
+Checks the text format, the /metrics endpoint and the textfile output
+"""
+
+import os
+import sys
+import tempfile
+import urllib.request
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+import metrikker
+from metrikker import Histogram, Maler, Teller
+
+
+def test_tekstformat():
+    """Counters, gauges and histograms are written in the Prometheus text format"""
+    print("📝 Testing the text exposition format")
+    teller = Teller("test_feil_total", "Failures")
+    teller.inc(steg="nedlasting")
+    teller.inc(2, steg="nedlasting")
+    teller.inc(steg='"rart"\nnavn')
+    linjer = teller.linjer()
+    assert linjer[:2] == ["# HELP test_feil_total Failures", "# TYPE test_feil_total counter"]
+    assert 'test_feil_total{steg="nedlasting"} 3' in linjer
+    assert 'test_feil_total{steg="\\"rart\\"\\nnavn"} 1' in linjer, "Label values must be escaped"
+
+    histogram = Histogram("test_sekunder", "Seconds", botter=(1, 5))
+    for verdi in (0.5, 2, 2, 10):
+        histogram.observer(verdi, endepunkt="upload")
+    linjer = histogram.linjer()
+    assert 'test_sekunder_bucket{endepunkt="upload",le="1"} 1' in linjer
+    assert 'test_sekunder_bucket{endepunkt="upload",le="5"} 3' in linjer
+    assert 'test_sekunder_bucket{endepunkt="upload",le="+Inf"} 4' in linjer
+    assert 'test_sekunder_sum{endepunkt="upload"} 14.5' in linjer
+    assert 'test_sekunder_count{endepunkt="upload"} 4' in linjer
+
+    maler = Maler("test_ko", "Queue depth", etikett="steg")
+    maler.sett_funksjon(lambda: {"transkripsjon": 2, "nedlasting": 0})
+    assert maler.linjer()[2:] == ['test_ko{steg="nedlasting"} 0', 'test_ko{steg="transkripsjon"} 2']
+    print("✅ Counter, histogram and callback gauge lines are valid")
+    return True
+
+
+def test_endepunkt_og_tekstfil():
+    """The service metrics are served on /metrics and written atomically to the textfile"""
+    print("🌐 Testing /metrics and the textfile collector output")
+    metrikker.STEG_FEIL.inc(steg="publisering")
+    server = metrikker.start_server(port=19464)
+    assert server is not None
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as svar:
+            assert svar.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            tekst = svar.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'hugin_stage_failures_total{steg="publisering"} 1' in tekst
+    assert "# TYPE hugin_graph_request_seconds histogram" in tekst
+
+    sti = os.path.join(tempfile.mkdtemp(), "textfile", "hugin.prom")
+    metrikker.skriv_tekstfil(sti)
+    with open(sti, "r", encoding="utf-8") as f:
+        assert f.read() == metrikker.eksponer()
+    assert os.listdir(os.path.dirname(sti)) == ["hugin.prom"], "No temporary file may be left behind"
+    print("✅ /metrics served and textfile written")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting metrics test...")
+    print()
+
+    resultater = []
+    for test in (test_tekstformat, test_endepunkt_og_tekstfil):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Test script for map-reduce summarization in lib/ai_tools.py
+Runs against a local stub Ollama server, so no model or GPU is needed
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_PORT = 11535
+SVARTID = 0.2  # sekunder per forespørsel i stub-serveren
+
+# Må settes før ollama importeres
+os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ["OLLAMA_HEALTH_TIMEOUT"] = "1"
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+import ai_tools
+from ai_tools import del_tekst, estimer_tokens, generate_meeting_summary, is_ollama_available, warm_up_model
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    """Answers /api/chat like Ollama (streamed); map requests get a short summary, the reduce request echoes its input"""
+
+    foresporsler = []
+    endepunkter = []
+    aktive = 0
+    maks_aktive = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubOllama.endepunkter.append((self.path, body))
+        if self.path == "/api/show":
+            if body["model"] == "henger":
+                time.sleep(3)
+            if body["model"] == "mangler":
+                return self._svar({"error": f"model '{body['model']}' not found"}, status=404)
+            return self._svar({"modelfile": f"FROM {body['model']}", "model_info": {}})
+        if self.path == "/api/generate":
+            return self._svar({"model": body["model"], "created_at": "2024-01-01T00:00:00Z", "response": "", "done": True})
+
+        system = body["messages"][0]["content"]
+        bruker = body["messages"][1]["content"]
+
+        with StubOllama.lock:
+            StubOllama.foresporsler.append((system, bruker))
+            StubOllama.aktive += 1
+            StubOllama.maks_aktive = max(StubOllama.maks_aktive, StubOllama.aktive)
+        time.sleep(SVARTID)
+        with StubOllama.lock:
+            StubOllama.aktive -= 1
+
+        if system.startswith("Du får én del"):
+            innhold = f"- stikkord for {len(bruker.split())} ord"
+        else:
+            innhold = f"REFERAT\n{bruker}"
+
+        # Strømmet svar: én JSON-linje per "token", tellinger i siste linje
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        if body["model"] == "henger":
+            time.sleep(2)
+        tokens = [innhold[i:i + 20] for i in range(0, len(innhold), 20)]
+        try:
+            for token in tokens:
+                if body["model"] == "langsom":
+                    time.sleep(0.3)
+                self._linje({"model": body["model"], "created_at": "2024-01-01T00:00:00Z",
+                             "message": {"role": "assistant", "content": token}, "done": False})
+            self._linje({"model": body["model"], "created_at": "2024-01-01T00:00:00Z",
+                         "message": {"role": "assistant", "content": ""}, "done": True,
+                         "prompt_eval_count": len(bruker.split()), "prompt_eval_duration": 100_000_000,
+                         "eval_count": len(tokens), "eval_duration": 500_000_000})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # klienten ga opp (frist), som i Ollama
+
+    def _linje(self, data):
+        self.wfile.write(json.dumps(data).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def _svar(self, data, status=200):
+        svar = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(svar)))
+        self.end_headers()
+        self.wfile.write(svar)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def start_stub():
+    """Start the stub Ollama server once per process"""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer(("127.0.0.1", STUB_PORT), StubOllama)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+def nullstill():
+    start_stub()
+    StubOllama.foresporsler = []
+    StubOllama.endepunkter = []
+    StubOllama.maks_aktive = 0
+
+
+def test_deling():
+    """Chunks stay within the token budget and keep every word in order"""
+    print("✂️  Testing token-aware chunking")
+    tekst = " ".join(f"Setning nummer {i} handler om sak {i % 7}." for i in range(3000))
+    biter = del_tekst(tekst, 1000)
+
+    assert len(biter) > 1, "Long text should be split"
+    assert all(estimer_tokens(b) <= 1001 for b in biter), "Chunk over token budget"
+    assert " ".join(biter).split() == tekst.split(), "Chunking must not lose or reorder words"
+    print(f"✅ {estimer_tokens(tekst)} estimated tokens split into {len(biter)} chunks")
+    return True
+
+
+def test_kort_transkripsjon():
+    """Short transcripts are summarized in a single request with the original prompt"""
+    print("📝 Testing single-pass summary")
+    nullstill()
+    resultat = generate_meeting_summary("Kort møte om budsjett. Alle var enige.", chunk_tokens=1000)
+
+    assert len(StubOllama.foresporsler) == 1, "Expected exactly one request"
+    assert StubOllama.foresporsler[0][0].startswith("Du er en språkmodell"), "Expected the meeting-minutes prompt"
+    assert resultat.startswith("REFERAT")
+    print("✅ One request")
+    return True
+
+
+def test_map_reduce():
+    """Long transcripts are split, chunks summarized concurrently and combined in one final request"""
+    print("🧩 Testing map-reduce summary")
+    nullstill()
+    tekst = " ".join(f"Setning nummer {i} handler om sak {i % 7}." for i in range(3000))
+    forventet_biter = len(del_tekst(tekst, 1000))
+
+    start_time = time.time()
+    resultat = generate_meeting_summary(tekst, chunk_tokens=1000, concurrency=4)
+    varighet = time.time() - start_time
+
+    map_kall = [f for f in StubOllama.foresporsler if f[0].startswith("Du får én del")]
+    reduce_kall = [f for f in StubOllama.foresporsler if not f[0].startswith("Du får én del")]
+
+    assert len(map_kall) == forventet_biter, f"Expected {forventet_biter} chunk requests, got {len(map_kall)}"
+    assert len(reduce_kall) == 1, "Expected exactly one reduce request"
+    assert "Merk: Du får ikke selve transkripsjonen" in reduce_kall[0][0]
+    assert f"Del {forventet_biter} av {forventet_biter}" in reduce_kall[0][1], "Reduce input must hold every chunk summary"
+    assert StubOllama.maks_aktive > 1, "Chunk requests should run concurrently"
+    assert resultat.startswith("REFERAT")
+
+    sekvensiell = (forventet_biter + 1) * SVARTID
+    print(f"✅ {forventet_biter} chunks + 1 reduce in {varighet:.2f}s (sequential would be {sekvensiell:.2f}s), "
+          f"max {StubOllama.maks_aktive} concurrent")
+    return True
+
+
+def test_tilgjengelighet_og_forvarming():
+    """The availability check uses /api/show once per TTL and warm-up preloads with keep_alive"""
+    print("🩺 Testing cached health probe and warm-up")
+    nullstill()
+    for _ in range(5):
+        assert is_ollama_available("stubmodell")
+    show_kall = [b for sti, b in StubOllama.endepunkter if sti == "/api/show"]
+    assert len(show_kall) == 1, f"Expected one show request, got {len(show_kall)}"
+    assert not StubOllama.foresporsler, "The health probe must not send chat requests"
+
+    assert warm_up_model("stubmodell", keep_alive="10m")
+    generate_kall = [b for sti, b in StubOllama.endepunkter if sti == "/api/generate"]
+    assert len(generate_kall) == 1 and generate_kall[0]["prompt"] == "" and generate_kall[0]["keep_alive"] == "10m"
+
+    assert not is_ollama_available("mangler"), "A missing model must be reported as unavailable"
+    start_time = time.time()
+    assert not is_ollama_available("henger"), "An Ollama that does not answer must be reported as unavailable"
+    assert time.time() - start_time < 2, "The availability check must give up after OLLAMA_HEALTH_TIMEOUT"
+    print("✅ One show request for five checks, warm-up sent an empty generate with keep_alive, hung probe timed out")
+    return True
+
+
+def test_strommet_til_fil():
+    """The summary is streamed into the output file and token counts are reported"""
+    print("📡 Testing streamed summary with token statistics")
+    nullstill()
+    sti = tempfile.mktemp(suffix=".txt")
+    stats = {}
+    resultat = generate_meeting_summary("Kort møte om budsjett. Alle var enige.", output_path=sti, stats=stats)
+
+    with open(sti, "r", encoding="utf-8") as f:
+        assert f.read() == resultat, "The file must hold exactly the streamed answer"
+    os.remove(sti)
+    assert stats["requests"] == 1 and stats["eval_tokens"] > 0 and stats["prompt_tokens"] > 0
+    assert stats["tokens_per_second"] == stats["eval_tokens"] / 0.5
+    assert stats["first_token_seconds"] is not None and "error" not in stats
+    print(f"✅ {stats['eval_tokens']} tokens at {stats['tokens_per_second']:.1f}/s, "
+          f"first token after {stats['first_token_seconds']:.2f}s")
+    return True
+
+
+def test_frister():
+    """No first token in time, or a summary that runs past the total deadline, is abandoned"""
+    print("⏱️  Testing first-token and total deadlines")
+    nullstill()
+    opprinnelig = ai_tools.OLLAMA_FIRST_TOKEN_TIMEOUT
+    ai_tools.OLLAMA_FIRST_TOKEN_TIMEOUT = 0.5
+    try:
+        stats = {}
+        start_time = time.time()
+        assert generate_meeting_summary("Møte.", model="henger", stats=stats) is None
+        assert time.time() - start_time < 1.5, "First-token deadline not enforced"
+        assert "No token" in stats["error"]
+    finally:
+        ai_tools.OLLAMA_FIRST_TOKEN_TIMEOUT = opprinnelig
+
+    stats = {}
+    start_time = time.time()
+    lang_tekst = " ".join(f"Punkt {i}." for i in range(100))
+    assert generate_meeting_summary(lang_tekst, model="langsom", stats=stats, timeout=1.0) is None
+    assert time.time() - start_time < 1.5, "Total deadline not enforced"
+    assert "total deadline" in stats["error"]
+    print("✅ Both deadlines abandon the request in time")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting map-reduce summary test...")
+    print()
+
+    resultater = []
+    for test in (test_deling, test_kort_transkripsjon, test_map_reduce, test_tilgjengelighet_og_forvarming,
+                 test_strommet_til_fil, test_frister):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for job scheduling in lib/planlegger.py
+Checks the duration estimate and the order each policy gives, no audio or storage needed
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+from jobbregister import DOWNLOADED, Jobbregister
+from planlegger import estimer_varighet, sorter_jobber
+
+NAA = 1_000_000.0
+
+
+def jobb(navn, minutter, venter_min=0, prioritet=None):
+    metadata = {"upn": "ola@tfk.no"}
+    if prioritet is not None:
+        metadata["priority"] = str(prioritet)
+    return {"safe_filename": navn, "estimated_duration": minutter * 60, "created": NAA - venter_min * 60,
+            "metadata": metadata}
+
+
+def rekkefolge(jobber, policy, **kwargs):
+    return [j["safe_filename"] for j in sorter_jobber(jobber, policy=policy, naa=NAA, **kwargs)]
+
+
+def test_estimat():
+    """Saved duration beats ffprobe, which beats blob size; learned rates beat the default table"""
+    print("📏 Testing the duration estimate")
+    assert estimer_varighet({"size": 16_000 * 600, "file_extension": "mp3"}) == 600
+    assert estimer_varighet({"size": 16_000 * 600, "file_extension": "mp3"}, lydrater={"mp3": 32_000}) == 300
+    assert estimer_varighet({"size": 1, "file_extension": "mp3", "audio_duration": 42.0}) == 42.0
+
+    sti = tempfile.mktemp(suffix=".mp3")
+    open(sti, "wb").close()
+    lokal = {"size": 1, "file_extension": "mp3", "local_file_path": sti}
+    assert estimer_varighet(lokal, probe=lambda s: 123.0) == 123.0
+    assert estimer_varighet(lokal, probe=lambda s: None) == 1 / 16_000, "A failed probe falls back to the size"
+    os.remove(sti)
+
+    register = Jobbregister(os.path.join(tempfile.mkdtemp(), "jobber.db"))
+    for i, (storrelse, varighet) in enumerate([(20_000_000, 1000), (30_000_000, 1000), (40_000_000, 1000)]):
+        register.lagre({"blob_name": f"opptak{i}.m4a", "etag": "e", "size": storrelse,
+                        "audio_duration": varighet}, DOWNLOADED)
+    assert register.lydrater() == {"m4a": 30_000}, "Expected the median bytes per second per file type"
+    print("✅ Estimate falls back from saved duration to ffprobe to size / learned rate")
+    return True
+
+
+def test_policyer():
+    """fifo keeps upload order, sjf puts short first, aging lets old long jobs catch up, priority goes first"""
+    print("🗂️  Testing scheduling policies")
+    jobber = [jobb("styremote", 180, venter_min=30), jobb("notat1", 5, venter_min=20),
+              jobb("gammelt_mote", 60, venter_min=120), jobb("notat2", 3, venter_min=1),
+              jobb("viktig", 90, venter_min=2, prioritet=5)]
+
+    assert rekkefolge(jobber, "fifo") == ["gammelt_mote", "styremote", "notat1", "viktig", "notat2"]
+    assert rekkefolge(jobber, "sjf") == ["notat2", "notat1", "gammelt_mote", "viktig", "styremote"]
+    assert rekkefolge(jobber, "aging") == ["gammelt_mote", "notat1", "notat2", "viktig", "styremote"]
+    assert rekkefolge(jobber, "aging", aldring=0) == rekkefolge(jobber, "sjf"), "No aging is plain SJF"
+    assert rekkefolge(jobber, "priority")[0] == "viktig"
+    assert rekkefolge(jobber, "priority")[1:] == [n for n in rekkefolge(jobber, "aging") if n != "viktig"]
+
+    try:
+        sorter_jobber(jobber, policy="tilfeldig")
+        assert False, "An unknown policy must be rejected"
+    except ValueError:
+        pass
+    print("✅ All four policies give the expected order")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting scheduler test...")
+    print()
+
+    resultater = []
+    for test in (test_estimat, test_policyer):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)
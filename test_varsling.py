@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-user notification aggregator in lib/varselsamler.py
+Uses a recording send function, so no Graph access is needed
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the lib directory to the Python path
+sys.path.append('./lib')
+
+from varselsamler import Varselsamler
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+class Postkasse:
+    """Records every send and completion; recipients in 'avvis' fail"""
+
+    def __init__(self, avvis=()):
+        self.utsendelser = []
+        self.fullforte = []
+        self.avvis = set(avvis)
+        self.lock = threading.Lock()
+
+    def send(self, grupper):
+        with self.lock:
+            self.utsendelser.append({m: [j["navn"] for j in jobber] for m, jobber in grupper.items()})
+        return {m: m not in self.avvis for m in grupper}
+
+    def ferdig(self, jobb, ok, feil):
+        with self.lock:
+            self.fullforte.append((jobb["navn"], ok))
+
+
+def test_ett_varsel_per_bruker_per_runde():
+    """With no window, every user's jobs are sent together when the run ends, in one send call"""
+    print("📬 Testing one notification per user per run")
+    postkasse = Postkasse()
+    samler = Varselsamler(postkasse.send, postkasse.ferdig, vindu=0)
+
+    for i in range(3):
+        samler.legg_til("ola@tfk.no", {"navn": f"ola{i}"})
+    samler.legg_til("kari@tfk.no", {"navn": "kari0"})
+    assert not postkasse.utsendelser, "Nothing may be sent before the run ends"
+
+    ferdige, feilede = samler.tom()
+    assert postkasse.utsendelser == [{"ola@tfk.no": ["ola0", "ola1", "ola2"], "kari@tfk.no": ["kari0"]}]
+    assert len(ferdige) == 4 and not feilede and samler.antall_varsler == 2
+    print("✅ 4 recordings, 2 emails in one send")
+    return True
+
+
+def test_vindu():
+    """A user is notified when the window from their first finished job runs out; later jobs start a new window"""
+    print("⏱️  Testing the notification window")
+    postkasse = Postkasse()
+    samler = Varselsamler(postkasse.send, postkasse.ferdig, vindu=0.3)
+
+    samler.legg_til("ola@tfk.no", {"navn": "a"})
+    time.sleep(0.1)
+    samler.legg_til("ola@tfk.no", {"navn": "b"})
+    time.sleep(0.4)
+    assert postkasse.utsendelser == [{"ola@tfk.no": ["a", "b"]}], f"Got {postkasse.utsendelser}"
+
+    samler.legg_til("ola@tfk.no", {"navn": "c"})
+    ferdige, _ = samler.tom()
+    assert postkasse.utsendelser[-1] == {"ola@tfk.no": ["c"]}, "Waiting jobs must be sent when the run ends"
+    assert [j["navn"] for j in ferdige] == ["a", "b", "c"]
+    print("✅ Window batched 2 recordings, the rest was sent at the end of the run")
+    return True
+
+
+def test_feil_og_uten_mottaker():
+    """Jobs for a failed email are reported as failed; jobs without a recipient complete at once"""
+    print("❌ Testing failed notifications and jobs without a recipient")
+    postkasse = Postkasse(avvis={"feil@tfk.no"})
+    samler = Varselsamler(postkasse.send, postkasse.ferdig, vindu=0)
+
+    samler.legg_til(None, {"navn": "ingen"})
+    assert postkasse.fullforte == [("ingen", True)], "A job without recipient needs no email"
+    samler.legg_til("feil@tfk.no", {"navn": "x"})
+    samler.legg_til("ola@tfk.no", {"navn": "y"})
+
+    ferdige, feilede = samler.tom()
+    assert [j["navn"] for j in ferdige] == ["ingen", "y"]
+    assert [j["navn"] for j, _ in feilede] == ["x"] and isinstance(feilede[0][1], RuntimeError)
+    assert ("x", False) in postkasse.fullforte
+
+    samler.nullstill()
+    assert samler.tom() == ([], []), "Results must not carry over to the next run"
+    print("✅ Failed email released its job, the other user was still notified")
+    return True
+
+
+class FalskLager:
+    """Stand-in for BlobLager that records released blobs"""
+
+    def __init__(self):
+        self.frigitt = []
+
+    def release(self, blob_name):
+        self.frigitt.append(blob_name)
+
+
+def test_kvittering_feiler():
+    """A failed acknowledgement after the email is recorded and releases the blob, like any failed stage"""
+    print("🗑️  Testing a failed blob delete after the notification was sent")
+    forrige, miljo = os.getcwd(), dict(os.environ)
+    os.chdir(tempfile.mkdtemp(prefix="hugin-varsling-"))
+    os.environ["HUGIN_JOB_DB"] = os.path.abspath("jobber.db")
+    sys.path[:0] = [REPO]
+    try:
+        import HuginLokalTranskripsjon as hugin
+        from lib.jobbregister import PUBLISHED, UPLOADED
+
+        def delete_blob(*args):
+            raise ConnectionError("Azure Storage svarte ikke")
+
+        lager = FalskLager()
+        hugin.htl.delete_blob, slett = delete_blob, hugin.htl.delete_blob
+        hugin.hent_blob_lager, hent = (lambda *args: lager), hugin.hent_blob_lager
+        try:
+            jobb = {"blob_name": "møte.mp3", "etag": '"0x1"', "safe_filename": "møte.mp3", "metadata": {},
+                    "attempts": 1}
+            hugin.hent_jobbregister().lagre(jobb, UPLOADED)
+            feil_for = dict(hugin.metrikker.STEG_FEIL._verdier)
+
+            samler = Varselsamler(lambda grupper: {m: True for m in grupper}, hugin.fullfor_varsel, vindu=0)
+            samler.legg_til("ola@tfk.no", jobb)
+            ferdige, feilede = samler.tom()
+        finally:
+            hugin.htl.delete_blob, hugin.hent_blob_lager = slett, hent
+
+        assert not ferdige and [j["blob_name"] for j, _ in feilede] == ["møte.mp3"]
+        assert lager.frigitt == ["møte.mp3"], "The blob must be released at once"
+        lagret = hugin.hent_jobbregister().hent("møte.mp3", '"0x1"')
+        assert lagret["state"] == PUBLISHED, "The email went out, so the next attempt only acknowledges"
+        assert lagret["error_stage"] == "kvittering" and "svarte ikke" in lagret["error"]
+        nokkel = (("steg", "kvittering"),)
+        assert hugin.metrikker.STEG_FEIL._verdier.get(nokkel, 0) == feil_for.get(nokkel, 0) + 1
+    finally:
+        sys.path.remove(REPO)
+        os.chdir(forrige)
+        os.environ.clear()
+        os.environ.update(miljo)
+    print("✅ Failure recorded in the register and the blob released")
+    return True
+
+
+if __name__ == "__main__":
+    print("Starting notification aggregator test...")
+    print()
+
+    resultater = []
+    for test in (test_ett_varsel_per_bruker_per_runde, test_vindu, test_feil_og_uten_mottaker,
+                 test_kvittering_feiler):
+        try:
+            resultater.append(test())
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            resultater.append(False)
+
+    print("\n" + "=" * 60)
+    if all(resultater):
+        print("🎉 All tests completed successfully!")
+    else:
+        print("💥 Some tests failed!")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultater) else 1)